@@ -0,0 +1,137 @@
+import logging
+
+import numpy as np
+
+from artifact_store import ArtifactStore
+from projection import classical_mds
+from rollups import TopicRollup, load_or_compute_rollup, publication_date
+from topic_similarity import topic_distances
+
+logger = logging.getLogger(__name__)
+
+# Enough top terms for a word cloud (WordCloud's default max_words); the heatmap uses the first few
+SUMMARY_TOP_TERMS = 200
+
+SUMMARY_SUFFIX = '.summary.npz'
+
+
+class TopicSummary:
+    """
+    Everything the topic-level charts need, as a handful of (k x n_top) and (k x k) arrays.
+
+    Computed once per model from its topic-term matrix: the top terms of every topic
+    (found with argpartition, no full sort of the vocabulary) with their raw weights
+    and probabilities, the overall weight of each topic, and the pairwise
+    Jensen-Shannon distances and MDS map of the topics.
+    """
+
+    def __init__(self, top_terms, top_words, top_weights, top_probabilities, topic_weights, distances,
+                 map_coordinates):
+        self.top_terms = np.asarray(top_terms)
+        self.top_words = np.asarray(top_words, dtype=object)
+        self.top_weights = np.asarray(top_weights)
+        self.top_probabilities = np.asarray(top_probabilities)
+        self.topic_weights = np.asarray(topic_weights)
+        self.distances = np.asarray(distances)
+        self.map_coordinates = np.asarray(map_coordinates)
+
+    @classmethod
+    def from_model(cls, components, feature_names, doc_topic=None, n_top=SUMMARY_TOP_TERMS) -> 'TopicSummary':
+        """
+        Args:
+        components (array): (k, V) topic-term weights of the fitted model
+        feature_names (array): The V terms
+        doc_topic (array): Document-topic matrix; topic weights are its column means,
+            or each topic's share of the total term weight when missing
+        n_top (int): Number of top terms kept per topic
+        """
+        components = np.asarray(components, dtype=np.float64)
+        feature_names = np.asarray(feature_names, dtype=object)
+        topic_term = components / np.maximum(components.sum(axis=1, keepdims=True), 1e-12)
+
+        n_top = min(n_top, components.shape[1])
+        top_terms = np.argpartition(-components, n_top - 1, axis=1)[:, :n_top]
+        order = np.argsort(-np.take_along_axis(components, top_terms, axis=1), axis=1)
+        top_terms = np.take_along_axis(top_terms, order, axis=1)
+
+        if doc_topic is not None:
+            topic_weights = np.asarray(doc_topic).mean(axis=0)
+        else:
+            topic_weights = components.sum(axis=1) / components.sum()
+
+        distances = topic_distances(topic_term, 'jensenshannon')
+        return cls(top_terms.astype(np.int32), feature_names[top_terms],
+                   np.take_along_axis(components, top_terms, axis=1).astype(np.float32),
+                   np.take_along_axis(topic_term, top_terms, axis=1).astype(np.float32),
+                   topic_weights, distances, classical_mds(distances))
+
+    @property
+    def n_components(self):
+        return self.top_terms.shape[0]
+
+    def save(self, path):
+        np.savez(path, top_terms=self.top_terms, top_words=self.top_words.astype(str), top_weights=self.top_weights,
+                 top_probabilities=self.top_probabilities, topic_weights=self.topic_weights,
+                 distances=self.distances, map_coordinates=self.map_coordinates)
+
+    @classmethod
+    def load(cls, path) -> 'TopicSummary':
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['top_terms'], data['top_words'], data['top_weights'], data['top_probabilities'],
+                       data['topic_weights'], data['distances'], data['map_coordinates'])
+
+
+def load_or_compute_summary(key, components, feature_names, doc_topic=None, store=None) -> TopicSummary:
+    """The stored summary of the model `key`, computing and storing it on first use."""
+    return (store or ArtifactStore()).load_or_compute(
+        key, SUMMARY_SUFFIX, TopicSummary.load, lambda: TopicSummary.from_model(components, feature_names, doc_topic))
+
+
+class TopicAnalysis:
+    """
+    Result of one analysis run, shared by every chart.
+
+    The document-topic matrix is inferred once here instead of once per chart, and
+    `articles` only holds the articles that survived preprocessing, so row i of
+    `doc_topic` always belongs to `articles[i]` (`article_index[i]` is its position in
+    the list that was passed in). `key` identifies the fitted model, so results derived
+    from it (the topic summary, time rollup, projection coordinates) are stored with its
+    artifact. A model that keeps its own rollup across runs passes it as `rollup`.
+    `topic_ids` are the persistent registry IDs of the topics of a daily model, if aligned.
+    """
+
+    def __init__(self, model, X, feature_names, articles, article_index=None, key=None, rollup=None,
+                 topic_ids=None):
+        if article_index is None:
+            article_index = np.arange(len(articles))
+        self.model = model
+        self.key = key
+        self.topic_ids = topic_ids
+        self.X = X
+        self.feature_names = np.asarray(feature_names, dtype=object)
+        self.article_index = np.asarray(article_index, dtype=np.int64)
+        self.articles = [articles[i] for i in self.article_index]
+        if len(self.articles) != X.shape[0]:
+            raise ValueError(f"{X.shape[0]} documents but {len(self.articles)} aligned articles")
+
+        self.doc_topic = model.transform(X)
+        if key is None:
+            self.summary = TopicSummary.from_model(model.components_, self.feature_names, self.doc_topic)
+        else:
+            self.summary = load_or_compute_summary(key, model.components_, self.feature_names, self.doc_topic)
+
+        if rollup is not None:
+            self.rollup = rollup
+        elif key is None:
+            self.rollup = TopicRollup.from_documents(self.doc_topic, [publication_date(a) for a in self.articles],
+                                                     [a.get('source_id') for a in self.articles])
+        else:
+            self.rollup = load_or_compute_rollup(key, self.doc_topic, self.articles)
+
+    @property
+    def n_components(self):
+        return self.summary.n_components
+
+    @property
+    def titles(self):
+        return [a.get('title') or '' for a in self.articles]
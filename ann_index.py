@@ -0,0 +1,216 @@
+import os
+import json
+import logging
+import tempfile
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.path.join('data', 'ann_index.npz')
+
+
+def exact_search(vectors: np.ndarray, queries: np.ndarray, k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Brute-force inner-product search, the reference the ANN index is measured against.
+
+    Returns:
+    tuple: (n_queries, k) row indices and scores, best match first
+    """
+    scores = np.atleast_2d(queries).astype(np.float32) @ np.asarray(vectors, dtype=np.float32).T
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+class ANNIndex:
+    """
+    Inverted-file (IVF) index for cosine similarity over normalized embeddings.
+
+    Vectors are assigned to their nearest k-means centroid; a query only scans the
+    lists of its `n_probe` nearest centroids, so the cost per query is roughly
+    `n_probe / n_lists` of an exact scan. Below `min_train_size` vectors the index
+    stays untrained and queries are answered exactly. Centroids are retrained once
+    the index has grown `retrain_growth` times past the size they were trained on.
+    """
+
+    def __init__(self, n_probe: int = 8, min_train_size: int = 2000, retrain_growth: float = 4.0,
+                 seed: int = 42):
+        self.n_probe = n_probe
+        self.min_train_size = min_train_size
+        self.retrain_growth = retrain_growth
+        self.seed = seed
+
+        self.article_ids: List[str] = []
+        self._row_by_id = {}
+        # float32 in memory: converting float16 candidates on every query would cost more than the scan
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._size = 0
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_size = 0
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._lists = None
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, article_id):
+        return article_id in self._row_by_id
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[:self._size]
+
+    @property
+    def n_lists(self) -> int:
+        return 0 if self.centroids is None else len(self.centroids)
+
+    def vector(self, article_id: str) -> np.ndarray:
+        return self._vectors[self._row_by_id[article_id]]
+
+    def add(self, article_ids: Sequence[str], vectors) -> int:
+        """
+        Insert vectors, skipping article ids already in the index.
+
+        Returns:
+        int: Number of vectors inserted
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        new = {}
+        for i, article_id in enumerate(article_ids):
+            if article_id not in self._row_by_id and article_id not in new:
+                new[article_id] = i
+        if not new:
+            return 0
+
+        block = vectors[list(new.values())]
+        block /= np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)
+        self._reserve(self._size + len(block), block.shape[1])
+        self._vectors[self._size:self._size + len(block)] = block
+        for row, article_id in enumerate(new, start=self._size):
+            self.article_ids.append(article_id)
+            self._row_by_id[article_id] = row
+        self._size += len(block)
+
+        if self.centroids is not None:
+            self._assignments = np.concatenate([self._assignments, self._assign(block)])
+            self._lists = None
+        if self._size >= self.min_train_size and (
+                self.centroids is None or self._size >= self.retrain_growth * self.trained_size):
+            self.train()
+        return len(block)
+
+    def train(self, n_lists: Optional[int] = None, points_per_list: int = 64):
+        """(Re)compute the centroids on a sample of the stored vectors and reassign every vector."""
+        vectors = self.vectors
+        n_lists = n_lists or max(1, min(4096, int(2 * np.sqrt(len(vectors)))))
+        # A few dozen points per centroid are enough, clustering everything would dominate build time
+        rng = np.random.RandomState(self.seed)
+        sample = vectors[rng.choice(len(vectors), min(points_per_list * n_lists, len(vectors)), replace=False)]
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, n_init=1, batch_size=4096, random_state=self.seed)
+        centroids = kmeans.fit(sample).cluster_centers_
+        self.centroids = (centroids / np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+                          ).astype(np.float32)
+        self._assignments = self._assign(vectors)
+        self.trained_size = len(vectors)
+        self._lists = None
+        logger.info(f"Trained {n_lists} lists on {len(sample)} of {len(vectors)} vectors")
+
+    def search(self, queries, k: int = 10, n_probe: Optional[int] = None) -> List[List[Tuple[str, float]]]:
+        """
+        The `k` most similar stored articles of each query vector.
+
+        Returns:
+        list: For each query, (article_id, cosine similarity) pairs, most similar first
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        if self._size == 0:
+            return [[] for _ in queries]
+        if self.centroids is None:
+            rows, scores = exact_search(self.vectors, queries, k)
+            return [self._results(r, s) for r, s in zip(rows, scores)]
+
+        order, offsets = self._inverted_lists()
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        probes = np.argpartition(-(queries @ self.centroids.T), n_probe - 1, axis=1)[:, :n_probe]
+        results = []
+        for query, probe in zip(queries, probes):
+            candidates = np.concatenate([order[offsets[l]:offsets[l + 1]] for l in probe])
+            if len(candidates) == 0:
+                results.append([])
+                continue
+            top, scores = exact_search(self._vectors[candidates], query, k)
+            results.append(self._results(candidates[top[0]], scores[0]))
+        return results
+
+    def related(self, article_id: str, k: int = 5, n_probe: Optional[int] = None) -> List[Tuple[str, float]]:
+        """The `k` stored articles most similar to an article of the index, excluding itself."""
+        neighbours = self.search(self.vector(article_id), k + 1, n_probe)[0]
+        return [(other, score) for other, score in neighbours if other != article_id][:k]
+
+    def save(self, path: str = DEFAULT_INDEX_PATH):
+        """Write the index atomically, readers never see a partial file."""
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.npz.tmp')
+        os.close(fd)
+        config = dict(n_probe=self.n_probe, min_train_size=self.min_train_size,
+                      retrain_growth=self.retrain_growth, seed=self.seed, trained_size=self.trained_size)
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, article_ids=np.array(self.article_ids, dtype=str), vectors=self.vectors.astype(np.float16),
+                         centroids=self.centroids if self.centroids is not None else np.empty((0, 0)),
+                         assignments=self._assignments, config=np.array(json.dumps(config)))
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_INDEX_PATH) -> 'ANNIndex':
+        with np.load(path, allow_pickle=False) as data:
+            config = json.loads(str(data['config']))
+            trained_size = config.pop('trained_size')
+            index = cls(**config)
+            index.article_ids = data['article_ids'].tolist()
+            index._row_by_id = {article_id: row for row, article_id in enumerate(index.article_ids)}
+            index._vectors = data['vectors'].astype(np.float32)
+            index._size = len(index._vectors)
+            if data['centroids'].size:
+                index.centroids = data['centroids']
+                index._assignments = data['assignments']
+                index.trained_size = trained_size
+        return index
+
+    def _reserve(self, size, dim):
+        # Grow geometrically so repeated small inserts stay amortized O(1)
+        if self._vectors.shape[1] != dim:
+            if self._size:
+                raise ValueError(f"Expected {self._vectors.shape[1]}-dimensional vectors, got {dim}")
+            self._vectors = np.empty((0, dim), dtype=np.float32)
+        if size > len(self._vectors):
+            grown = np.empty((max(size, 2 * len(self._vectors), 1024), dim), dtype=np.float32)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+
+    def _assign(self, vectors, batch_size=8192):
+        return np.concatenate([
+            np.argmax(vectors[i:i + batch_size] @ self.centroids.T, axis=1).astype(np.int32)
+            for i in range(0, len(vectors), batch_size)
+        ]) if len(vectors) else np.empty(0, dtype=np.int32)
+
+    def _inverted_lists(self):
+        # Rows grouped by list, rebuilt lazily after inserts
+        if self._lists is None:
+            order = np.argsort(self._assignments, kind='stable')
+            offsets = np.searchsorted(self._assignments[order], np.arange(self.n_lists + 1))
+            self._lists = (order, offsets)
+        return self._lists
+
+    def _results(self, rows, scores):
+        return [(self.article_ids[row], float(score)) for row, score in zip(rows, scores)]
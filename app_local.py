@@ -1,40 +1,313 @@
 import streamlit as st
-import json
-from datetime import datetime, timedelta
-from preprocessing import preprocess_articles
+from datetime import date, datetime, timedelta
+from preprocessing import preprocess_articles, preprocessing_config
+from article_store import stream_articles
+from deduplication import deduplicate_articles
+from token_cache import TokenCache
+from artifact_store import ArtifactStore, ModelArtifact, artifact_key
+from analysis import TopicAnalysis
+from rollups import TopicRollup, publication_date
+from topic_registry import TopicRegistry
+from trending import DEFAULT_TRENDS_PATH
 from visualization import (visualize_topics_sklearn, create_topic_document_map, 
                            create_topic_trends, create_topic_similarity_network, 
-                           display_top_articles, create_topic_proportion_chart)
+                           display_top_articles, create_topic_proportion_chart, display_related_articles,
+                           display_topic_lineage, display_emerging_terms)
 import nltk
 import os
+import time
 import logging
 import torch
-from torch.utils.data import DataLoader, Dataset
-from transformers import AutoTokenizer, AutoModel
-from topic_modeling import perform_topic_modeling
-from number_models import find_optimal_number_of_topics
+from embeddings import EMBEDDING_MODEL, load_encoder
+from embedding_store import EmbeddingStore, embed_articles
+from ann_index import ANNIndex, DEFAULT_INDEX_PATH
+from embedding_topics import EmbeddingTopicModel
+from coherence import CoherenceScorer
+from topic_modeling import (perform_topic_modeling, DocumentTermCorpus, IncrementalTopicModel, TOPIC_ENGINES,
+                            count_matrix, CORPUS_VERSION)
+from number_models import search_number_of_topics
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 USE_GPU = torch.cuda.is_available()
+# Dynamic int8 quantization roughly halves CPU inference time, and there is no GPU to use instead
+QUANTIZE_EMBEDDINGS = not USE_GPU
 
-def load_articles(date):
+INCREMENTAL_MODEL_PATH = os.path.join('data', 'incremental_lda.pkl')
+INCREMENTAL_ROLLUP_PATH = os.path.join('data', 'incremental_lda.rollup.npz')
+
+# Range and strategy of the search for the number of topics, also part of the artifact key
+TOPIC_SEARCH = {'start': 3, 'limit': 12, 'strategy': 'grid'}
+
+# Seconds before a cached date range is reloaded, so articles collected today show up
+ARTICLE_CACHE_TTL = 10 * 60
+# Date range x engine combinations whose fitted models stay in memory
+MODEL_CACHE_ENTRIES = 8
+
+# Stages shown in the cache status panel, in pipeline order
+CACHE_STAGES = ('embedding model', 'articles', 'tokens', 'topic model', 'chart data', 'related index')
+
+def _record_cache_miss(stage, started):
+    # Cached function bodies only run on a miss, so anything recorded here was recomputed this run
+    st.session_state.setdefault('cache_misses', {})[stage] = time.perf_counter() - started
+
+@st.cache_resource(show_spinner="Loading the sentence embedding model...")
+def load_embedding_model(model_name=EMBEDDING_MODEL):
+    """Load the transformer tokenizer and model once per server process."""
+    started = time.perf_counter()
+    tokenizer, model = load_encoder(model_name, quantize=QUANTIZE_EMBEDDINGS)
+    _record_cache_miss('embedding model', started)
+    return tokenizer, model
+
+@st.cache_data(ttl=ARTICLE_CACHE_TTL, show_spinner="Loading articles...")
+def cached_articles(start_date, end_date):
+    """
+    Articles of a date range with syndicated copies collapsed.
+    
+    Returns:
+    tuple: (number of articles loaded, deduplicated article dictionaries)
     """
-    Load articles from a JSON file for a specific date.
+    started = time.perf_counter()
+    # Streamed straight into the deduplication index, only one copy of each story is kept
+    stories = deduplicate_articles(stream_articles(start_date, end_date))
+    _record_cache_miss('articles', started)
+    return sum(len(story['syndicated_ids']) for story in stories), stories
+
+def articles_key(articles):
+    """Fingerprint of a set of articles, the cache key of every stage computed from them."""
+    return artifact_key([a['article_id'] for a in articles])
+
+# The stages below are keyed on the content of the articles rather than the date range,
+# so once cached_articles picks up new articles every stage is rebuilt from that same
+# snapshot. Parameters starting with an underscore are not hashed by Streamlit.
+
+@st.cache_data(show_spinner="Preprocessing articles...")
+def cached_tokens(key, config, _articles):
+    """
+    Token lists of the deduplicated articles fingerprinted by `key` (see articles_key).
+    
+    `config` is the preprocessing fingerprint: it is only part of the cache key, so a
+    change to the preprocessing settings invalidates the cached token lists.
+    
+    Returns:
+    tuple: (token lists, index of the article each token list belongs to)
+    """
+    started = time.perf_counter()
+    # Only articles not seen before are tokenized, the rest come from the on-disk cache
+    with TokenCache() as token_cache:
+        preprocessed_articles, article_index = preprocess_articles(_articles, n_jobs=-1, cache=token_cache,
+                                                                   return_indices=True)
+    _record_cache_miss('tokens', started)
+    return preprocessed_articles, article_index
+
+@st.cache_resource(max_entries=MODEL_CACHE_ENTRIES, show_spinner=False)
+def cached_topic_model(model_key, start_date, end_date, engine, incremental, _articles):
+    """
+    Fitted (or loaded) topic model of the articles behind `model_key` (see topic_model_key),
+    kept in memory across reruns.
+    
+    Returns:
+    tuple: (model, feature names, document-term matrix)
+    """
+    preprocessed_articles, article_index = cached_tokens(articles_key(_articles), preprocessing_config(), _articles)
+    started = time.perf_counter()
+    if incremental:
+        # Warm-started model: only articles it hasn't seen yet are folded in
+        with st.spinner("Updating the incremental topic model..."):
+            lda_model = update_incremental_model(start_date, end_date)
+        feature_names, X = lda_model.feature_names, lda_model.vectorize(preprocessed_articles)
+    else:
+        lda_model, X = fit_or_load_topic_model(_articles, preprocessed_articles, engine, article_index)
+        feature_names = lda_model.feature_names
+    _record_cache_miss('topic model', started)
+    return lda_model, feature_names, X
+
+@st.cache_resource(max_entries=MODEL_CACHE_ENTRIES, show_spinner="Inferring topic proportions...")
+def cached_topic_analysis(model_key, start_date, end_date, engine, incremental, _articles):
+    """Document-topic matrix and aligned articles shared by every chart."""
+    _, article_index = cached_tokens(articles_key(_articles), preprocessing_config(), _articles)
+    # Same key, so the model was fitted on exactly these token lists
+    lda_model, feature_names, X = cached_topic_model(model_key, start_date, end_date, engine, incremental, _articles)
+    started = time.perf_counter()
+    if incremental:
+        # The incremental model only changes when new articles are folded in
+        key = artifact_key(lda_model.folded_ids, preprocessing=preprocessing_config(), engine='incremental',
+                           num_topics=lda_model.n_components)
+        # Its rollup spans every folded day, the charts show the selected range
+        rollup = TopicRollup.load(INCREMENTAL_ROLLUP_PATH).between(start_date, end_date)
+    else:
+        key, rollup = model_key, None
+    analysis = TopicAnalysis(lda_model, X, feature_names, _articles, article_index, key=key, rollup=rollup)
+    if not incremental and start_date == end_date:
+        # A daily model numbers its topics arbitrarily, the registry gives them stable IDs
+        with TopicRegistry() as registry:
+            analysis.topic_ids = registry.align(start_date, key, analysis.summary.top_words,
+                                                analysis.summary.top_probabilities, engine=engine)
+    _record_cache_miss('chart data', started)
+    return analysis
+
+@st.cache_resource(max_entries=MODEL_CACHE_ENTRIES, show_spinner="Embedding articles...")
+def cached_related_index(key, _articles):
+    """
+    Nearest-neighbour index over every article embedded so far, extended with the
+    articles fingerprinted by `key`.
+    
+    Only articles missing from the embedding store are encoded, and the index on disk
+    only grows, so related stories can come from any previously analyzed day.
+    """
+    tokenizer, model = load_embedding_model()
+    started = time.perf_counter()
+    with EmbeddingStore(quantized=QUANTIZE_EMBEDDINGS) as store:
+        vectors = embed_articles(_articles, store, model, tokenizer)
+    index = ANNIndex.load(DEFAULT_INDEX_PATH) if os.path.exists(DEFAULT_INDEX_PATH) else ANNIndex()
+    if index.add([a['article_id'] for a in _articles], vectors):
+        index.save(DEFAULT_INDEX_PATH)
+    _record_cache_miss('related index', started)
+    return index
+
+def display_cache_status():
+    """Sidebar panel telling which pipeline stages were recomputed on this run."""
+    misses = st.session_state.get('cache_misses', {})
+    with st.sidebar.expander("Cache status"):
+        for stage in CACHE_STAGES:
+            if stage in misses:
+                st.write(f"**{stage}**: recomputed in {misses[stage]:.2f} s")
+            else:
+                st.write(f"**{stage}**: served from cache")
+        st.caption(f"Articles are reloaded after {ARTICLE_CACHE_TTL // 60} minutes, later stages are rebuilt "
+                   f"only if they changed; the last {MODEL_CACHE_ENTRIES} fitted models stay in memory.")
+        if st.button("Clear in-memory caches"):
+            st.cache_data.clear()
+            st.cache_resource.clear()
+            st.rerun()
+
+def update_incremental_model(start_date, end_date, num_topics=10):
+    """
+    Fold every article of the range that the persistent incremental model hasn't seen yet.
+    
+    Articles are tracked by id, so articles collected later in a day that was already
+    folded are still learned. Every article is merged into the model's topic rollup once,
+    when it is folded, so trend charts never have to revisit the documents of earlier
+    days. Rolled-up proportions are those of the model when the articles were folded and
+    are not recomputed as later updates shift the topics.
     
     Args:
-    date (str): Date string in the format 'YYYY-MM-DD'
+    start_date (str): Date string in the format 'YYYY-MM-DD'
+    end_date (str): Last date of the range
+    num_topics (int): Number of topics, only used when the model is created
     
     Returns:
-    list: List of article dictionaries
+    IncrementalTopicModel: The updated model, saved back to INCREMENTAL_MODEL_PATH
+        (and its rollup to INCREMENTAL_ROLLUP_PATH)
     """
-    try:
-        with open(f"data/articles_{date}.json", 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        st.error(f"No data file found for date: {date}")
-        return None
+    model = IncrementalTopicModel.load(INCREMENTAL_MODEL_PATH) if os.path.exists(INCREMENTAL_MODEL_PATH) else None
+    rebuilt = model is None or getattr(model, 'corpus_version', None) != CORPUS_VERSION
+    if rebuilt:
+        # Models saved with older vocabulary rules are rebuilt from scratch, with their rollup
+        model = IncrementalTopicModel(num_topics=num_topics)
+    rollup = TopicRollup.load(INCREMENTAL_ROLLUP_PATH) if os.path.exists(INCREMENTAL_ROLLUP_PATH) else None
+    if rebuilt or rollup is None or rollup.n_topics != model.n_components:
+        rollup = TopicRollup(model.n_components)
+    
+    day, last = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    with TokenCache() as token_cache:
+        while day <= last:
+            day_str = day.isoformat()
+            day_articles = deduplicate_articles(stream_articles(day_str))
+            new_ids = {a['article_id'] for a in model.unseen(day_articles)}
+            if new_ids:
+                texts, kept = preprocess_articles(day_articles, cache=token_cache, return_indices=True)
+                kept_articles = [day_articles[i] for i in kept]
+                new_texts = [texts[j] for j, a in enumerate(kept_articles) if a['article_id'] in new_ids]
+                new_article_ids = [i for a in day_articles if a['article_id'] in new_ids for i in a['syndicated_ids']]
+                model.partial_fit(new_texts, new_article_ids)
+                logger.info(f"Folded {len(new_ids)} new articles from {day_str} into the incremental model")
+                # Only the articles this call folded are rolled up: a story re-fetched on a
+                # later day was rolled up when it was first folded
+                rows = [j for j, a in enumerate(kept_articles) if a['article_id'] in new_ids and not model.unseen([a])]
+                if rows:
+                    rollup.merge(TopicRollup.from_documents(
+                        model.transform(model.vectorize([texts[j] for j in rows])),
+                        [publication_date(kept_articles[j]) for j in rows],
+                        [kept_articles[j].get('source_id') for j in rows], key=artifact_key(new_ids)))
+            day += timedelta(days=1)
+    
+    model.save(INCREMENTAL_MODEL_PATH)
+    rollup.save(INCREMENTAL_ROLLUP_PATH)
+    return model
+
+def fit_embedding_topic_model(articles, corpus):
+    """
+    Cluster the sentence embeddings of the articles (one per row of corpus.X).
+    
+    Embeddings come from the embedding store, only new articles are encoded.
+    """
+    tokenizer, model = load_embedding_model()
+    with EmbeddingStore(quantized=QUANTIZE_EMBEDDINGS) as store:
+        embeddings = embed_articles(articles, store, model, tokenizer)
+    return EmbeddingTopicModel().fit(corpus.X, embeddings)
+
+def topic_model_key(articles, engine):
+    """Artifact store key of the topic model fitted on these articles with `engine` ('incremental' included)."""
+    if engine == 'embedding':
+        settings = {'embedding_model': EMBEDDING_MODEL, 'quantized': QUANTIZE_EMBEDDINGS}
+    elif engine == 'incremental':
+        settings = {}
+    else:
+        settings = {'search': TOPIC_SEARCH}
+    return artifact_key([a['article_id'] for a in articles], preprocessing=preprocessing_config(),
+                        corpus=CORPUS_VERSION, engine=engine, **settings)
+
+def fit_or_load_topic_model(articles, preprocessed_articles, engine, article_index=None):
+    """
+    Return the topic model artifact for these articles, only fitting it on a cache miss.
+    
+    Args:
+    articles (list): The analyzed articles, their ids are part of the cache key
+    preprocessed_articles (list): Token lists of the articles
+    engine (str): Topic model engine, one of TOPIC_ENGINES
+    article_index (list): Position in `articles` of each token list, defaults to all of them
+    
+    Returns:
+    tuple: (ModelArtifact, document-term matrix over the artifact's vocabulary)
+    """
+    if article_index is None:
+        article_index = range(len(articles))
+    key = topic_model_key(articles, engine)
+    artifact_store = ArtifactStore()
+    artifact = artifact_store.get(key)
+    if artifact is not None:
+        logger.info(f"Loaded cached topic model {key}")
+        return artifact, count_matrix(preprocessed_articles, artifact.vocabulary)
+    
+    # One vocabulary and document-term matrix for the sweep, the final fit and the charts
+    corpus = DocumentTermCorpus(preprocessed_articles)
+    
+    if engine == 'embedding':
+        # Clustering picks its own number of topics, there is no coherence sweep to run
+        with st.spinner("Clustering article embeddings..."):
+            lda_model = fit_embedding_topic_model([articles[i] for i in article_index], corpus)
+        coherence_values = {lda_model.n_components: CoherenceScorer(corpus.X).score_model(lda_model.components_)}
+    else:
+        # Find the optimal number of topics, keeping the winning model from the sweep
+        with st.spinner("Finding optimal number of topics..."):
+            search_result = search_number_of_topics(preprocessed_articles, corpus=corpus, engine=engine,
+                                                    **TOPIC_SEARCH)
+        coherence_values = search_result.coherence_values
+        
+        lda_model = search_result.best_model
+        if lda_model is None:
+            # Every candidate failed, fall back to the previous default
+            with st.spinner("Performing topic modeling..."):
+                lda_model = perform_topic_modeling(preprocessed_articles, num_topics=5, corpus=corpus,
+                                                   engine=engine)[0]
+    
+    artifact = ModelArtifact.from_model(lda_model, corpus.feature_names, corpus.X,
+                                        coherence_values=coherence_values,
+                                        metadata={'engine': engine, **({} if engine == 'embedding' else TOPIC_SEARCH)})
+    artifact_store.put(key, artifact)
+    return artifact, corpus.X
 
 def download_nltk_data():
     try:
@@ -58,61 +331,49 @@ nltk.download('stopwords')
 nltk.download('punkt')
         """)
 
-class ArticleDataset(Dataset):
-    def __init__(self, articles, tokenizer, max_length=512):
-        self.articles = articles
-        self.tokenizer = tokenizer
-        self.max_length = max_length
-
-    def __len__(self):
-        return len(self.articles)
-
-    def __getitem__(self, idx):
-        return self.tokenizer(self.articles[idx], truncation=True, padding='max_length', max_length=self.max_length, return_tensors='pt')
-
-def encode_articles(articles, model, tokenizer, batch_size=32):
-    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    model.to(device)
-    model.eval()
-
-    dataset = ArticleDataset(articles, tokenizer)
-    dataloader = DataLoader(dataset, batch_size=batch_size, shuffle=False)
-
-    embeddings = []
-    with torch.no_grad():
-        for batch in dataloader:
-            input_ids = batch['input_ids'].squeeze(1).to(device)
-            attention_mask = batch['attention_mask'].squeeze(1).to(device)
-            outputs = model(input_ids, attention_mask=attention_mask)
-            embeddings.append(outputs.last_hidden_state[:, 0, :].cpu())
-
-    return torch.cat(embeddings, dim=0)
-
 def main():
     st.title('Italian News Topic Modeler')
     
     # Date selection
     today = datetime.now().date()
-    selected_date = st.date_input(
-        "Select date for analysis",
-        value=today,
+    selected_dates = st.date_input(
+        "Select date range for analysis",
+        value=(today, today),
         max_value=today,
         min_value=today - timedelta(days=30)
     )
+    # The range picker returns a single date while the end date is being chosen
+    start_str = selected_dates[0].strftime('%Y-%m-%d')
+    end_str = selected_dates[-1].strftime('%Y-%m-%d')
     
-    date_str = selected_date.strftime('%Y-%m-%d')
+    date_str = start_str if start_str == end_str else f"{start_str} - {end_str}"
     st.write(f"Analyzing data for: {date_str}")
     
+    incremental = st.sidebar.checkbox("Incremental daily model (skip the topic number search)")
+    engine = st.sidebar.selectbox("Topic model engine", TOPIC_ENGINES, disabled=incremental)
+    # The engine is ignored by the incremental model, so it must not split its cache entries
+    engine = None if incremental else engine
+    
+    # Every stage below is cached on the inputs it depends on, so a rerun only
+    # recomputes what the changed widget actually affects
+    st.session_state['cache_misses'] = {}
+    
     # Load data
-    articles = load_articles(date_str)
+    n_loaded, articles = cached_articles(start_str, end_str)
     
     if articles:
-        st.write(f"Loaded {len(articles)} articles")
-        logger.info(f"Loaded {len(articles)} articles")
+        st.write(f"Loaded {n_loaded} articles")
+        logger.info(f"Loaded {n_loaded} articles")
         
         try:
-            # Preprocess articles
-            preprocessed_articles = preprocess_articles(articles)
+            # Syndicated copies of the same story were collapsed when loading
+            st.write(f"{len(articles)} unique stories after removing syndicated copies")
+            
+            # Term bursts are kept up to date by the collector, independent of the topic model
+            display_emerging_terms(DEFAULT_TRENDS_PATH)
+            
+            key = articles_key(articles)
+            preprocessed_articles, _ = cached_tokens(key, preprocessing_config(), articles)
             logger.info(f"Preprocessed {len(preprocessed_articles)} articles")
             
             if not preprocessed_articles:
@@ -120,29 +381,29 @@ def main():
                 logger.error("No articles remained after preprocessing")
                 return
             
-            # Find the optimal number of topics
-            with st.spinner("Finding optimal number of topics..."):
-                optimal_num_topics = find_optimal_number_of_topics(preprocessed_articles)
-                st.write(f"Optimal number of topics: {optimal_num_topics}")
-                logger.info(f"Optimal number of topics: {optimal_num_topics}")
-            
-            # Perform topic modeling with the optimal number of topics
-            with st.spinner("Performing topic modeling..."):
-                lda_model, feature_names, X = perform_topic_modeling(preprocessed_articles, num_topics=optimal_num_topics)
+            # Keyed on this snapshot of the articles, so model and charts are always rebuilt together
+            model_key = topic_model_key(articles, 'incremental' if incremental else engine)
+            lda_model, feature_names, X = cached_topic_model(model_key, start_str, end_str, engine, incremental,
+                                                             articles)
             
             if lda_model and feature_names is not None and X is not None:
                 st.write(f"Performed topic modeling. Number of topics: {lda_model.n_components}")
                 logger.info(f"Performed topic modeling. Number of topics: {lda_model.n_components}")
                 
+                # Infer the document-topic matrix once and share it across every chart
+                analysis = cached_topic_analysis(model_key, start_str, end_str, engine, incremental, articles)
+                
                 # Create and display visualizations
-                visualize_topics_sklearn(lda_model, X, feature_names, articles)
+                visualize_topics_sklearn(analysis)
                 
                 # New visualizations
-                create_topic_document_map(lda_model, X, articles)
-                create_topic_trends(lda_model, articles)
-                create_topic_similarity_network(lda_model, feature_names)
-                display_top_articles(lda_model, articles)
-                create_topic_proportion_chart(lda_model, articles)
+                create_topic_document_map(analysis)
+                create_topic_trends(analysis)
+                create_topic_similarity_network(analysis)
+                display_top_articles(analysis)
+                create_topic_proportion_chart(analysis)
+                display_topic_lineage(analysis)
+                display_related_articles(analysis, cached_related_index(key, articles))
             else:
                 st.error("Topic modeling failed. Please check your data structure.")
                 logger.error("Topic modeling failed")
@@ -152,12 +413,13 @@ def main():
             st.error(f"An error occurred during processing: {str(e)}")
             st.error("Check the logs for more details.")
     else:
+        st.error(f"No articles found for: {date_str}")
         st.write(f"No data available for analysis on {date_str}.")
         logger.warning(f"No data available for analysis on {date_str}")
-        st.write("Please make sure you have a JSON file named "
-                 f"'articles_{date_str}.json' in the 'data/' directory.")
+        st.write("Please run the data collection for this date, or import the legacy "
+                 "'data/articles_*.json' files with `python article_store.py`.")
 
-    model = AutoModel.from_pretrained("sentence-transformers/all-MiniLM-L6-v2")
+    display_cache_status()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,304 @@
+import os
+import re
+import json
+import glob
+import sqlite3
+import logging
+from datetime import date, timedelta
+from typing import List, Dict, Optional, Iterable, Iterator, Sequence
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join('data', 'articles.db')
+
+# Columns of a NewsData.io article. List-valued fields are stored as compact JSON,
+# anything not listed here ends up in the `extra` column so nothing is lost.
+SCALAR_COLUMNS = (
+    'article_id', 'title', 'link', 'description', 'content', 'pubDate', 'pubDateTZ',
+    'image_url', 'video_url', 'source_id', 'source_priority', 'source_name', 'source_url',
+    'source_icon', 'language', 'ai_tag', 'sentiment', 'sentiment_stats', 'ai_region',
+    'ai_org', 'duplicate',
+)
+JSON_COLUMNS = ('keywords', 'creator', 'country', 'category')
+BOOL_COLUMNS = ('duplicate',)
+ARTICLE_COLUMNS = SCALAR_COLUMNS + JSON_COLUMNS
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS articles (
+    day TEXT NOT NULL,
+    {', '.join(f'"{c}"' for c in ARTICLE_COLUMNS)},
+    extra TEXT,
+    PRIMARY KEY (day, article_id)
+);
+CREATE INDEX IF NOT EXISTS idx_articles_article_id ON articles (article_id);
+CREATE INDEX IF NOT EXISTS idx_articles_source_day ON articles (source_id, day);
+"""
+
+# The only article fields the preprocessing/topic modeling pipeline reads
+PIPELINE_FIELDS = ('article_id', 'title', 'description', 'pubDate', 'source_id')
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+_JSON_FILE_PATTERN = re.compile(r'articles_(\d{4}-\d{2}-\d{2})\.json$')
+
+
+class ArticleStore:
+    """
+    SQLite-backed article store, partitioned by collection day and keyed by article_id.
+
+    The (day, article_id) primary key makes a date range a single index range scan,
+    and callers can ask for only the columns they need.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def append(self, articles: Iterable[Dict], day: str) -> int:
+        """
+        Insert (or replace) the articles collected on `day`.
+
+        Args:
+        articles (iterable): Article dictionaries as returned by the NewsData API
+        day (str): Collection date in the format 'YYYY-MM-DD'
+
+        Returns:
+        int: Number of rows written
+        """
+        rows = [_to_row(article, day) for article in articles if article.get('article_id')]
+        if not rows:
+            return 0
+
+        placeholders = ', '.join('?' * (len(ARTICLE_COLUMNS) + 2))
+        columns = ', '.join(_quote(c) for c in ('day',) + ARTICLE_COLUMNS + ('extra',))
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO articles ({columns}) VALUES ({placeholders})", rows
+            )
+        return len(rows)
+
+    def read_articles(self, start_date: str, end_date: Optional[str] = None,
+                      columns: Optional[Sequence[str]] = None) -> List[Dict]:
+        """
+        Read the articles collected between `start_date` and `end_date` (inclusive).
+
+        Args:
+        start_date (str): First day in the format 'YYYY-MM-DD'
+        end_date (str): Last day, defaults to `start_date`
+        columns (list): Article fields to return, defaults to all of them
+
+        Returns:
+        list: List of article dictionaries
+        """
+        cursor = self._select(start_date, end_date, columns)
+        names = [d[0] for d in cursor.description]
+        return [_from_row(names, row) for row in cursor]
+
+    def iter_articles(self, start_date: str, end_date: Optional[str] = None,
+                      columns: Optional[Sequence[str]] = None,
+                      batch_size: int = 500) -> Iterator[Dict]:
+        """
+        Lazily yield the articles collected between `start_date` and `end_date`,
+        fetching `batch_size` rows at a time instead of materializing the range.
+        """
+        cursor = self._select(start_date, end_date, columns)
+        names = [d[0] for d in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield _from_row(names, row)
+
+    def read_by_ids(self, article_ids: Sequence[str],
+                    columns: Optional[Sequence[str]] = None) -> Dict[str, Dict]:
+        """
+        Look articles up by article_id, whatever day they were collected on.
+
+        Returns:
+        dict: article_id -> article dictionary (the latest copy), for the ids found
+        """
+        selected = self._columns(columns)
+        if 'article_id' not in selected:
+            selected.append('article_id')
+        found = {}
+        unique = list(dict.fromkeys(article_ids))
+        for i in range(0, len(unique), _LOOKUP_BATCH):
+            batch = unique[i:i + _LOOKUP_BATCH]
+            cursor = self.conn.execute(
+                f"SELECT {', '.join(_quote(c) for c in selected)} FROM articles "
+                f"WHERE article_id IN ({', '.join('?' * len(batch))}) ORDER BY day", batch
+            )
+            names = [d[0] for d in cursor.description]
+            found.update((article['article_id'], article) for article in (_from_row(names, row) for row in cursor))
+        return found
+
+    def available_dates(self) -> List[str]:
+        """Return the sorted list of days that have at least one article."""
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT day FROM articles ORDER BY day")]
+
+    def count(self, start_date: str, end_date: Optional[str] = None) -> int:
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM articles WHERE day BETWEEN ? AND ?",
+            (start_date, end_date or start_date)
+        ).fetchone()[0]
+
+    def _columns(self, columns):
+        if columns is None:
+            return ['day'] + list(ARTICLE_COLUMNS) + ['extra']
+        unknown = [c for c in columns if c not in ARTICLE_COLUMNS and c != 'day']
+        if unknown:
+            raise ValueError(f"Unknown article columns: {unknown}")
+        return list(columns)
+
+    def _select(self, start_date, end_date, columns):
+        selected = self._columns(columns)
+        query = (f"SELECT {', '.join(_quote(c) for c in selected)} FROM articles "
+                 "WHERE day BETWEEN ? AND ? ORDER BY day, article_id")
+        return self.conn.execute(query, (start_date, end_date or start_date))
+
+
+def _quote(column: str) -> str:
+    # pubDate/pubDateTZ are mixed case, so always quote identifiers
+    return f'"{column}"'
+
+
+def _to_row(article: Dict, day: str) -> tuple:
+    values = []
+    for column in ARTICLE_COLUMNS:
+        value = article.get(column)
+        if column in JSON_COLUMNS and value is not None:
+            value = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        values.append(value)
+    extra = {k: v for k, v in article.items() if k not in ARTICLE_COLUMNS}
+    extra = json.dumps(extra, ensure_ascii=False, separators=(',', ':')) if extra else None
+    return (day, *values, extra)
+
+
+def _from_row(names: List[str], row: tuple) -> Dict:
+    article = {}
+    for name, value in zip(names, row):
+        if name == 'extra':
+            if value:
+                article.update(json.loads(value))
+            continue
+        if value is not None:
+            if name in JSON_COLUMNS:
+                value = json.loads(value)
+            elif name in BOOL_COLUMNS:
+                value = bool(value)
+        article[name] = value
+    return article
+
+
+def iter_json_articles(file_path: str, chunk_size: int = 1 << 16) -> Iterator[Dict]:
+    """
+    Incrementally parse a JSON array of articles, yielding one article at a time.
+
+    The file is read in `chunk_size` pieces, so memory use is bounded by the largest
+    single article rather than by the size of the file.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos = '', 0
+    with open(file_path, 'r', encoding='utf-8') as f:
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,[':
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                if pos >= len(buffer):
+                    raise json.JSONDecodeError("Buffer exhausted", buffer, pos)
+                article, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    if buffer[pos:].strip():
+                        raise
+                    return
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            yield article
+
+
+def stream_articles(start_date: str, end_date: Optional[str] = None,
+                    fields: Optional[Sequence[str]] = PIPELINE_FIELDS,
+                    db_path: str = DEFAULT_DB_PATH, data_dir: str = 'data') -> Iterator[Dict]:
+    """
+    Stream the articles of a date range, one projected dictionary at a time.
+
+    Days present in the article store are read from it; days that were never migrated
+    fall back to incrementally parsing `data/articles_YYYY-MM-DD.json`.
+
+    Args:
+    start_date (str): First day in the format 'YYYY-MM-DD'
+    end_date (str): Last day, defaults to `start_date`
+    fields (list): Article fields to keep, None keeps every field
+
+    Yields:
+    dict: Article dictionary restricted to `fields`
+    """
+    first = date.fromisoformat(start_date)
+    last = date.fromisoformat(end_date or start_date)
+
+    with ArticleStore(db_path) as store:
+        stored_days = {d for d in store.available_dates() if start_date <= d <= (end_date or start_date)}
+
+        day = first
+        while day <= last:
+            day_str = day.isoformat()
+            if day_str in stored_days:
+                yield from store.iter_articles(day_str, columns=fields)
+            else:
+                file_path = os.path.join(data_dir, f"articles_{day_str}.json")
+                if os.path.exists(file_path):
+                    for article in iter_json_articles(file_path):
+                        yield article if fields is None else {k: article.get(k) for k in fields}
+            day += timedelta(days=1)
+
+
+def migrate_json_files(data_dir: str = 'data', store: Optional[ArticleStore] = None) -> int:
+    """
+    One-shot import of the legacy `data/articles_YYYY-MM-DD.json` files into the store.
+
+    Returns:
+    int: Total number of rows written
+    """
+    owns_store = store is None
+    store = store or ArticleStore()
+    total = 0
+    try:
+        for file_path in sorted(glob.glob(os.path.join(data_dir, 'articles_*.json'))):
+            match = _JSON_FILE_PATTERN.search(os.path.basename(file_path))
+            if not match:
+                continue
+            with open(file_path, 'r', encoding='utf-8') as f:
+                articles = json.load(f)
+            written = store.append(articles, match.group(1))
+            logger.info(f"Migrated {written} articles from {file_path}")
+            total += written
+    finally:
+        if owns_store:
+            store.close()
+    return total
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    migrated = migrate_json_files()
+    print(f"Migrated {migrated} articles into {DEFAULT_DB_PATH}")
@@ -0,0 +1,213 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import numpy as np
+import scipy.sparse as sp
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARTIFACT_DIR = os.path.join('data', 'artifacts')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def artifact_key(article_ids: Iterable[str], **config) -> str:
+    """
+    Cache key of a fitted model: the exact set of articles plus every setting that
+    changes the result (preprocessing fingerprint, k or search settings, engine params).
+    """
+    payload = json.dumps({'articles': sorted(article_ids), 'config': config}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def matrix_fingerprint(X) -> np.ndarray:
+    """Digest of a sparse matrix's shape and contents, equal only for identical matrices."""
+    X = sp.csr_matrix(X, copy=True)
+    X.sum_duplicates()
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.array(X.shape, dtype=np.int64).tobytes())
+    for buffer in (X.indptr.astype(np.int64), X.indices.astype(np.int64), X.data.astype(np.float64)):
+        digest.update(buffer.tobytes())
+    return np.frombuffer(digest.digest(), dtype=np.uint8)
+
+
+class ModelArtifact:
+    """
+    Everything the dashboard needs from a fitted topic model, without the model itself.
+
+    Exposes `components_`, `n_components` and `transform`, so it can stand in for the
+    fitted model. `transform` on the training matrix returns the stored doc-topic matrix;
+    for LDA engines, other matrices are folded in with the torch engine's inference on
+    `components_`.
+    """
+
+    def __init__(self, feature_names, components, doc_topic, X_fingerprint=None,
+                 coherence_values: Optional[Dict[int, float]] = None, doc_topic_prior=None,
+                 metadata: Optional[Dict] = None):
+        self.feature_names = np.asarray(feature_names, dtype=object)
+        self.components_ = np.asarray(components)
+        self.doc_topic = np.asarray(doc_topic)
+        self.X_fingerprint = X_fingerprint
+        self.coherence_values = coherence_values or {}
+        self.doc_topic_prior = doc_topic_prior
+        self.metadata = metadata or {}
+        self._inference_model = None
+
+    @classmethod
+    def from_model(cls, model, feature_names, X, coherence_values=None, metadata=None):
+        return cls(feature_names, model.components_, model.transform(X), matrix_fingerprint(X),
+                   coherence_values=coherence_values,
+                   doc_topic_prior=getattr(model, 'doc_topic_prior_', None), metadata=metadata)
+
+    @property
+    def n_components(self):
+        return self.components_.shape[0]
+
+    @property
+    def vocabulary(self):
+        return {term: i for i, term in enumerate(self.feature_names)}
+
+    def transform(self, X):
+        if self.X_fingerprint is not None and np.array_equal(matrix_fingerprint(X), self.X_fingerprint):
+            return self.doc_topic
+        if self._inference_model is None:
+            from topic_modeling import LDA, LDA_ENGINES
+            engine = self.metadata.get('engine')
+            if engine not in LDA_ENGINES:
+                # c-TF-IDF weights and the like are not Dirichlet parameters, LDA inference would be meaningless
+                raise ValueError(f"Artifacts of the {engine!r} engine only hold the doc-topic matrix of their "
+                                 "training documents")
+            self._inference_model = LDA.from_components(self.components_, self.doc_topic_prior)
+        return self._inference_model.transform(X)
+
+    def save(self, path: str):
+        coherence_k = np.array(sorted(self.coherence_values), dtype=np.int64)
+        coherence_v = np.array([np.nan if self.coherence_values[k] is None else self.coherence_values[k]
+                                for k in coherence_k], dtype=np.float64)
+        meta = dict(self.metadata, doc_topic_prior=self.doc_topic_prior)
+        # Uncompressed npz: loading is a straight read of the arrays
+        np.savez(path, feature_names=self.feature_names.astype(str), components=self.components_,
+                 doc_topic=self.doc_topic, X_fingerprint=self.X_fingerprint if self.X_fingerprint is not None
+                 else np.empty(0), coherence_k=coherence_k, coherence_v=coherence_v,
+                 meta=np.array(json.dumps(meta, default=str)))
+
+    @classmethod
+    def load(cls, path: str) -> 'ModelArtifact':
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            coherence_values = {int(k): (None if np.isnan(v) else float(v))
+                                for k, v in zip(data['coherence_k'], data['coherence_v'])}
+            return cls(data['feature_names'], data['components'], data['doc_topic'],
+                       data['X_fingerprint'] if data['X_fingerprint'].size else None,
+                       coherence_values=coherence_values, doc_topic_prior=meta.pop('doc_topic_prior'),
+                       metadata=meta)
+
+
+class ArtifactStore:
+    """
+    Directory of `<key>.npz` model artifacts with least-recently-used eviction.
+
+    Files derived from a model (chart data, rendered images...) are stored next to it
+    as `<key><suffix>`, see `load_or_compute`. A key and its derived files are evicted
+    together: reads refresh a file's modification time, and after every write the keys
+    used least recently are removed until the directory fits in `max_bytes`.
+    """
+
+    def __init__(self, directory: str = DEFAULT_ARTIFACT_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, key: str, suffix: str = '.npz') -> str:
+        return os.path.join(self.directory, f"{key}{suffix}")
+
+    def get(self, key: str) -> Optional[ModelArtifact]:
+        path = self.path(key)
+        try:
+            artifact = ModelArtifact.load(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable model artifact {path}: {e}")
+            os.remove(path)
+            return None
+        os.utime(path)
+        return artifact
+
+    def put(self, key: str, artifact: ModelArtifact):
+        self.write(key, artifact.save)
+
+    def load_or_compute(self, key: str, suffix: str, load: Callable[[str], Any], compute: Callable[[], Any],
+                        save: Optional[Callable[[Any, Any], None]] = None) -> Any:
+        """
+        The file `<key><suffix>` derived from a model, computed and stored on first use.
+
+        Args:
+        load (callable): Reads the value from a path; returning None (e.g. when it was
+            built with other settings) or raising makes it recomputed
+        compute (callable): Builds the value
+        save (callable): Writes the value to a binary file object, `value.save(f)` by default
+        """
+        path = self.path(key, suffix)
+        if os.path.exists(path):
+            try:
+                value = load(path)
+            except Exception as e:
+                logger.warning(f"Discarding unreadable {path}: {e}")
+                value = None
+            if value is not None:
+                os.utime(path)
+                return value
+        value = compute()
+        save = save or (lambda value, f: value.save(f))
+        self.write(key, lambda f: save(value, f), suffix=suffix)
+        return value
+
+    def write(self, key: str, save: Callable, suffix: str = '.npz', evict: bool = True):
+        """
+        Store a file derived from a model (e.g. cached chart coordinates) under its key.
+
+        `save` is called with a binary file object. The file takes part in the same LRU
+        eviction as the artifacts; pass `evict=False` when writing several files in a
+        row and call `evict` once at the end.
+        """
+        # Write to a temporary file first so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=f'{suffix}.tmp')
+        os.close(fd)
+        try:
+            with open(tmp_path, 'wb') as f:
+                save(f)
+            os.replace(tmp_path, self.path(key, suffix))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        if evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """Remove the least recently used keys, with all their files, until the store fits its budget."""
+        # Keys never contain a dot and suffixes start with one
+        groups = {}
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isfile(path) and not name.endswith('.tmp'):
+                stat = os.stat(path)
+                key = name.partition('.')[0]
+                last_used, size, paths = groups.get(key, (0.0, 0, []))
+                groups[key] = (max(last_used, stat.st_mtime), size + stat.st_size, paths + [path])
+
+        total = sum(size for _, size, _ in groups.values())
+        removed = 0
+        for _, size, paths in sorted(groups.values()):
+            if total <= self.max_bytes:
+                break
+            for path in paths:
+                os.remove(path)
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"Evicted {removed} model artifacts and their files to stay under {self.max_bytes} bytes")
+        return removed
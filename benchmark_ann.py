@@ -0,0 +1,85 @@
+"""
+Recall and latency of the IVF index against exact search.
+
+Uses the embeddings already in the embedding store for a date range (run
+`python embedding_store.py --start ... --end ...` first), or random unit vectors
+with --synthetic to emulate months of articles.
+
+Usage:
+    python benchmark_ann.py --start 2024-09-01 --end 2024-10-30
+    python benchmark_ann.py --synthetic 200000 --dim 384
+"""
+import time
+import argparse
+import numpy as np
+from ann_index import ANNIndex, exact_search
+from embedding_store import EmbeddingStore
+from embeddings import EMBEDDING_MODEL
+
+
+def clustered_vectors(n, dim, seed):
+    # Articles cluster by topic and, within a topic, by story; uniform random vectors
+    # would have no neighbourhood structure for the index to exploit
+    rng = np.random.RandomState(seed)
+    topics = rng.normal(size=(max(1, n // 1000), dim))
+    stories = topics[rng.randint(len(topics), size=max(1, n // 20))] + 0.7 * rng.normal(size=(max(1, n // 20), dim))
+    vectors = stories[rng.randint(len(stories), size=n)] + 0.5 * rng.normal(size=(n, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--start', help="First day, YYYY-MM-DD")
+    parser.add_argument('--end', help="Last day, defaults to --start")
+    parser.add_argument('--model', default=EMBEDDING_MODEL)
+    parser.add_argument('--quantized', action='store_true', help="Read the int8-quantized model's embeddings")
+    parser.add_argument('--synthetic', type=int, help="Number of random clustered vectors instead of the store")
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--probes', default='1,4,8,16,32', help="Comma-separated n_probe values")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors = clustered_vectors(args.synthetic, args.dim, args.seed)
+        article_ids = [str(i) for i in range(len(vectors))]
+    else:
+        if not args.start:
+            parser.error("--start is required unless --synthetic is given")
+        with EmbeddingStore(model_name=args.model, quantized=args.quantized) as store:
+            article_ids, vectors = store.read_range(args.start, args.end)
+            vectors = np.asarray(vectors, dtype=np.float32)
+
+    rng = np.random.RandomState(args.seed)
+    queries = vectors[rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)]
+
+    index = ANNIndex(min_train_size=0, seed=args.seed)
+    started = time.perf_counter()
+    index.add(article_ids, vectors)
+    print(f"{len(index)} vectors, {index.n_lists} lists, built in {time.perf_counter() - started:.2f} s")
+
+    # One query at a time for both, as in interactive use
+    truth, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        rows, _ = exact_search(index.vectors, query, args.k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        truth.append({index.article_ids[row] for row in rows[0]})
+    print(f"{'search':<14}{f'recall@{args.k}':>12}{'ms/query':>10}{'p99 ms':>9}")
+    print(f"{'exact':<14}{1.0:>12.3f}{np.mean(latencies):>10.2f}{np.percentile(latencies, 99):>9.2f}")
+
+    for n_probe in (int(p) for p in args.probes.split(',')):
+        latencies, hits = [], 0
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            found = index.search(query, args.k, n_probe=n_probe)[0]
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += len(expected & {article_id for article_id, _ in found})
+        recall = hits / sum(len(expected) for expected in truth)
+        print(f"{f'n_probe={n_probe}':<14}{recall:>12.3f}{np.mean(latencies):>10.2f}"
+              f"{np.percentile(latencies, 99):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compare the async collector with the previous sequential `requests` loop against the
+local mock NewsData server (started in a background thread), on the same credit budget.
+
+Usage:
+    python benchmark_collector.py --domains 12 --latency 0.3 --fail-every 9
+"""
+import time
+import asyncio
+import argparse
+import threading
+
+import requests
+
+from collector import NewsCollector, MAX_CREDITS, CONCURRENCY, REQUESTS_PER_SECOND
+from mock_newsdata import MockNewsData, start_server
+
+
+def serve_in_background(mock):
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    state = {}
+
+    def run():
+        asyncio.set_event_loop(loop)
+        state['runner'], state['url'] = loop.run_until_complete(start_server(mock))
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return state['url']
+
+
+def sequential_fetch(base_url, domains, max_credits):
+    """The previous collector: one query for every domain, one page at a time, stop at the first error."""
+    articles, credits_used, params = [], 0, {'apikey': 'test', 'language': 'it', 'domain': ','.join(domains)}
+    while credits_used < max_credits:
+        try:
+            response = requests.get(base_url, params=params)
+            response.raise_for_status()
+        except requests.exceptions.RequestException:
+            break
+        data = response.json()
+        articles.extend(data['results'])
+        credits_used += 1
+        if not data.get('nextPage'):
+            break
+        params['page'] = data['nextPage']
+    return articles, credits_used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--domains', type=int, default=12)
+    parser.add_argument('--articles', type=int, default=100, help="Mock articles per domain")
+    parser.add_argument('--latency', type=float, default=0.3, help="Mock seconds per request")
+    parser.add_argument('--fail-every', type=int, default=0, help="Mock fails every n-th request")
+    parser.add_argument('--max-credits', type=int, default=MAX_CREDITS)
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--rate', type=float, default=REQUESTS_PER_SECOND,
+                        help="Requests per second, unlimited by default")
+    args = parser.parse_args()
+
+    domains = [f"source{i}" for i in range(args.domains)]
+    mock = MockNewsData(args.articles, args.latency, args.fail_every)
+    base_url = serve_in_background(mock)
+
+    started = time.perf_counter()
+    articles, credits_used = sequential_fetch(base_url, domains, args.max_credits)
+    print(f"sequential: {len(articles)} articles, {credits_used} credits in {time.perf_counter() - started:.2f} s")
+
+    collector = NewsCollector('test', base_url=base_url, max_credits=args.max_credits, concurrency=args.concurrency,
+                              requests_per_second=args.rate, backoff=0.1)
+    articles, report = asyncio.run(collector.collect(domains))
+    print(f"async:      {len(articles)} articles, {report.credits_used} credits in {report.wall_time:.2f} s")
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Measure sentence embedding throughput (articles per second) on CPU.
+
+Compares the former pipeline (every text padded to 512 tokens, CLS vector) with
+length-bucketed dynamic padding, with and without dynamic int8 quantization.
+
+Usage:
+    python benchmark_embeddings.py --start 2024-10-01 --end 2024-10-30 --threads 4 --limit 1000
+"""
+import time
+import argparse
+import numpy as np
+import torch
+from article_store import stream_articles
+from preprocessing import article_text
+from embeddings import EMBEDDING_MODEL, MAX_LENGTH, load_encoder, quantize_model, encode_articles, torch_threads
+
+
+def encode_padded(texts, model, tokenizer, batch_size, n_threads):
+    """The former encoding loop: fixed 512-token padding and the CLS slice."""
+    embeddings = []
+    with torch_threads(n_threads), torch.inference_mode():
+        for start in range(0, len(texts), batch_size):
+            features = tokenizer(texts[start:start + batch_size], truncation=True, padding='max_length',
+                                 max_length=MAX_LENGTH, return_tensors='pt')
+            embeddings.append(model(**features).last_hidden_state[:, 0, :])
+    return torch.cat(embeddings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--start', required=True, help="First day, YYYY-MM-DD")
+    parser.add_argument('--end', help="Last day, defaults to --start")
+    parser.add_argument('--model', default=EMBEDDING_MODEL)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--limit', type=int, default=1000, help="Articles to encode")
+    parser.add_argument('--skip-padded', action='store_true', help="Skip the slow 512-token baseline")
+    args = parser.parse_args()
+
+    texts = [article_text(a) for a in stream_articles(args.start, args.end)][:args.limit]
+    tokenizer, model = load_encoder(args.model)
+    quantized = quantize_model(load_encoder(args.model)[1])
+    lengths = [len(ids) for ids in tokenizer(texts, truncation=True, max_length=MAX_LENGTH)['input_ids']]
+
+    print(f"{len(texts)} articles, {np.mean(lengths):.1f} tokens on average (max {max(lengths)}), "
+          f"batch size {args.batch_size}, {args.threads} thread(s), torch {torch.__version__}")
+    print(f"{'pipeline':<28}{'seconds':>10}{'articles/s':>12}")
+
+    runs = {
+        'dynamic padding': lambda: encode_articles(texts, model, tokenizer, args.batch_size,
+                                                   n_threads=args.threads),
+        'dynamic padding + int8': lambda: encode_articles(texts, quantized, tokenizer, args.batch_size,
+                                                          n_threads=args.threads),
+    }
+    if not args.skip_padded:
+        runs = {'padded to 512 (CLS)': lambda: encode_padded(texts, model, tokenizer, args.batch_size,
+                                                             args.threads), **runs}
+
+    results = {}
+    for name, run in runs.items():
+        times = []
+        for _ in range(args.repeats):
+            started = time.perf_counter()
+            results[name] = run()
+            times.append(time.perf_counter() - started)
+        seconds = np.median(times)
+        print(f"{name:<28}{seconds:>10.2f}{len(texts) / seconds:>12.1f}")
+
+    # Both dynamic runs are normalized, so the row-wise dot product is the cosine similarity
+    agreement = (results['dynamic padding'] * results['dynamic padding + int8']).sum(dim=1)
+    print(f"int8 vs float32 cosine similarity: mean {agreement.mean():.4f}, min {agreement.min():.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Compare the torch LDA engine with sklearn's LatentDirichletAllocation on CPU.
+
+Usage:
+    python benchmark_lda.py --start 2024-09-01 --end 2024-10-30 --topics 10 --threads 4
+"""
+import time
+import argparse
+import numpy as np
+import torch
+from sklearn.decomposition import LatentDirichletAllocation
+from article_store import stream_articles
+from preprocessing import preprocess_articles
+from topic_modeling import DocumentTermCorpus, LDA, topic_model_perplexity
+
+
+def build_engines(num_topics, threads, seed):
+    return {
+        'sklearn batch': lambda: LatentDirichletAllocation(n_components=num_topics, random_state=seed,
+                                                           n_jobs=threads),
+        'sklearn online': lambda: LatentDirichletAllocation(n_components=num_topics, random_state=seed,
+                                                            n_jobs=threads, learning_method='online'),
+        'torch batch': lambda: LDA(n_components=num_topics, random_state=seed, n_threads=threads),
+        'torch online': lambda: LDA(n_components=num_topics, random_state=seed, n_threads=threads,
+                                    learning_method='online'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--start', required=True, help="First day, YYYY-MM-DD")
+    parser.add_argument('--end', help="Last day, defaults to --start")
+    parser.add_argument('--topics', type=int, default=10)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--holdout', type=float, default=0.1, help="Fraction of documents held out")
+    parser.add_argument('--tokenizer', default='regex', help="Preprocessing tokenizer")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    texts = preprocess_articles(stream_articles(args.start, args.end), tokenizer=args.tokenizer)
+    corpus = DocumentTermCorpus(texts)
+    order = np.random.RandomState(args.seed).permutation(corpus.n_documents)
+    n_test = max(1, int(len(order) * args.holdout))
+    X_train, X_test = corpus.X[order[n_test:]], corpus.X[order[:n_test]]
+
+    print(f"{X_train.shape[0]} training / {X_test.shape[0]} held-out documents, "
+          f"{corpus.n_terms} terms, {args.topics} topics, {args.threads} thread(s), torch {torch.__version__}")
+    print(f"{'engine':<16}{'fit (s)':>10}{'transform (s)':>15}{'train ppl':>12}{'held-out ppl':>14}")
+
+    for name, make_model in build_engines(args.topics, args.threads, args.seed).items():
+        fit_times, transform_times = [], []
+        for _ in range(args.repeats):
+            model = make_model()
+            started = time.perf_counter()
+            model.fit(X_train)
+            fit_times.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            model.transform(X_test)
+            transform_times.append(time.perf_counter() - started)
+
+        # Same point-estimate perplexity for both engines, so the numbers are comparable
+        print(f"{name:<16}{np.median(fit_times):>10.2f}{np.median(transform_times):>15.3f}"
+              f"{topic_model_perplexity(model, X_train):>12.1f}{topic_model_perplexity(model, X_test):>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Compare the embedding-clustering topic engine with LDA on wall time and coherence.
+
+LDA runs both the way the dashboard uses it (coherence sweep over the number of
+topics) and as a single `perform_topic_modeling` fit at the number of topics the
+clustering picked. Embeddings are read from the embedding store, encoding only
+missing articles; their encoding time is reported separately.
+
+Usage:
+    python benchmark_topic_engines.py --start 2024-10-24 --end 2024-10-26
+"""
+import time
+import argparse
+from article_store import stream_articles
+from deduplication import deduplicate_articles
+from preprocessing import preprocess_articles
+from topic_modeling import DocumentTermCorpus, perform_topic_modeling
+from number_models import search_number_of_topics
+from coherence import CoherenceScorer
+from embeddings import EMBEDDING_MODEL, load_encoder
+from embedding_store import EmbeddingStore, embed_articles
+from embedding_topics import EmbeddingTopicModel
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--start', required=True, help="First day, YYYY-MM-DD")
+    parser.add_argument('--end', help="Last day, defaults to --start")
+    parser.add_argument('--model', default=EMBEDDING_MODEL)
+    parser.add_argument('--tokenizer', default='regex', help="Preprocessing tokenizer")
+    parser.add_argument('--start-k', type=int, default=3)
+    parser.add_argument('--limit-k', type=int, default=12)
+    args = parser.parse_args()
+
+    articles = deduplicate_articles(stream_articles(args.start, args.end))
+    texts, article_index = preprocess_articles(articles, tokenizer=args.tokenizer, return_indices=True)
+    articles = [articles[i] for i in article_index]
+    corpus = DocumentTermCorpus(texts)
+    scorer = CoherenceScorer(corpus.X)
+
+    tokenizer, model = load_encoder(args.model, quantize=True)
+    started = time.perf_counter()
+    with EmbeddingStore(model_name=args.model, quantized=True) as store:
+        embeddings = embed_articles(articles, store, model, tokenizer)
+    print(f"{corpus.n_documents} articles, {corpus.n_terms} terms; "
+          f"embeddings ready in {time.perf_counter() - started:.2f} s (encoded only if missing from the store)")
+
+    def run(name, fit):
+        started = time.perf_counter()
+        topic_model = fit()
+        seconds = time.perf_counter() - started
+        print(f"{name:<28}{seconds:>10.2f}{topic_model.n_components:>8}"
+              f"{scorer.score_model(topic_model.components_, measure='c_v'):>8.3f}"
+              f"{scorer.score_model(topic_model.components_, measure='npmi'):>8.3f}")
+        return topic_model
+
+    print(f"{'engine':<28}{'fit (s)':>10}{'topics':>8}{'c_v':>8}{'npmi':>8}")
+    clusters = run('embedding k-means', lambda: EmbeddingTopicModel(k_range=(args.start_k, args.limit_k))
+                   .fit(corpus.X, embeddings))
+    run('embedding HDBSCAN', lambda: EmbeddingTopicModel(clusterer='hdbscan').fit(corpus.X, embeddings))
+    run(f'LDA, k={clusters.n_components}', lambda: perform_topic_modeling(
+        texts, num_topics=clusters.n_components, corpus=corpus)[0])
+    run('LDA, coherence sweep', lambda: search_number_of_topics(
+        texts, start=args.start_k, limit=args.limit_k, corpus=corpus).best_model)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import numpy as np
+import scipy.sparse as sp
+
+COHERENCE_MEASURES = ('c_v', 'npmi', 'umass')
+
+# Same smoothing constant gensim uses for its NPMI-based measures
+EPSILON = 1e-12
+
+
+class CoherenceScorer:
+    """
+    Topic coherence on a document-term matrix, with occurrence statistics computed once.
+
+    Every document is treated as one co-occurrence window (our texts are a title plus a
+    short description, well below gensim's 110-token c_v window). Document frequencies
+    and the term co-occurrence matrix are precomputed with sparse products, so scoring a
+    model afterwards is a lookup into a (top words x top words) block per topic.
+    """
+
+    def __init__(self, X):
+        presence = sp.csr_matrix(X, dtype=np.float64, copy=True)
+        presence.data[:] = 1
+        self.n_documents = presence.shape[0]
+        self.doc_freq = np.asarray(presence.sum(axis=0)).ravel()
+        self.co_doc_freq = (presence.T @ presence).tocsr()
+
+    def score_topics(self, top_term_ids, measure='c_v'):
+        """
+        Coherence of each topic given the vocabulary ids of its top words.
+
+        Args:
+        top_term_ids (array): (n_topics, n_top) term ids, most probable word first
+        measure (str): One of 'c_v', 'npmi' or 'umass'
+
+        Returns:
+        np.ndarray: One coherence value per topic
+        """
+        if measure not in COHERENCE_MEASURES:
+            raise ValueError(f"Unknown coherence measure {measure!r}, expected one of {COHERENCE_MEASURES}")
+
+        top_term_ids = np.asarray(top_term_ids)
+        # One sparse slice for every word used by any topic, then dense lookups
+        union, positions = np.unique(top_term_ids, return_inverse=True)
+        positions = positions.reshape(top_term_ids.shape)
+        joint_counts = self.co_doc_freq[union][:, union].toarray()
+        # Terms absent from X would divide by zero; count them as seen once
+        counts = np.maximum(self.doc_freq[union], 1)
+
+        scores = np.empty(len(top_term_ids))
+        for topic, pos in enumerate(positions):
+            joint = joint_counts[np.ix_(pos, pos)]
+            single = counts[pos]
+            if measure == 'umass':
+                scores[topic] = self._umass(joint, single)
+            else:
+                npmi = self._npmi(joint, single)
+                scores[topic] = self._mean_off_diagonal(npmi) if measure == 'npmi' else self._c_v(npmi)
+        return scores
+
+    def score_model(self, components, n_top=10, measure='c_v'):
+        """Mean coherence of a fitted model's topics, using its `n_top` words per topic."""
+        top_term_ids = np.argsort(-np.asarray(components), axis=1)[:, :n_top]
+        return float(self.score_topics(top_term_ids, measure).mean())
+
+    def _npmi(self, joint, single):
+        p_joint = joint / self.n_documents + EPSILON
+        p_single = single / self.n_documents
+        pmi = np.log(p_joint / np.outer(p_single, p_single))
+        return pmi / -np.log(p_joint)
+
+    def _c_v(self, npmi):
+        # Cosine between each word's NPMI context vector and the topic's summed vector
+        topic_vector = npmi.sum(axis=0)
+        norms = np.linalg.norm(npmi, axis=1) * np.linalg.norm(topic_vector)
+        cosine = np.divide(npmi @ topic_vector, norms, out=np.zeros(len(npmi)), where=norms > 0)
+        return float(cosine.mean())
+
+    @staticmethod
+    def _umass(joint, single):
+        # log((D(w_i, w_j) + 1) / D(w_j)) for every word w_i ranked below w_j
+        lower = np.tril_indices(len(single), k=-1)
+        return float(np.mean(np.log((joint[lower] + 1) / single[lower[1]])))
+
+    @staticmethod
+    def _mean_off_diagonal(matrix):
+        upper = np.triu_indices(len(matrix), k=1)
+        return float(matrix[upper].mean())
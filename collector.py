@@ -0,0 +1,289 @@
+"""
+Concurrent NewsData.io collector.
+
+The domain list is split into shards that follow their own `nextPage` cursors
+concurrently over one pooled HTTP session, sharing a credit budget and an optional
+rate limit.
+
+Usage:
+    python collector.py --base-url http://127.0.0.1:8765/api/1/news --api-key test
+    (against `python mock_newsdata.py`)
+"""
+import math
+import time
+import random
+import asyncio
+import logging
+import argparse
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = 'https://newsdata.io/api/1/news'
+MAX_CREDITS = 30
+
+# NewsData accepts at most this many domains in one query
+MAX_DOMAINS_PER_QUERY = 5
+
+CONCURRENCY = 4
+# No client-side rate limit by default: the connection pool already bounds the
+# requests in flight, and a 429 is retried after its Retry-After. Set a rate for
+# plans whose limit the pool alone would exceed.
+REQUESTS_PER_SECOND = None
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 0.5
+REQUEST_TIMEOUT = 30
+
+# Responses worth retrying: rate limited or a server-side failure
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class CreditBudget:
+    """API credits shared by every shard; a credit is only spent on a successful page."""
+
+    def __init__(self, max_credits: int):
+        self.remaining = max_credits
+        self.used = 0
+
+    def reserve(self) -> bool:
+        if self.remaining <= 0:
+            return False
+        self.remaining -= 1
+        return True
+
+    def commit(self):
+        self.used += 1
+
+    def refund(self):
+        self.remaining += 1
+
+
+class PageResult(NamedTuple):
+    shard: int
+    page: int
+    status: Optional[int]
+    attempts: int
+    latency: float
+    n_articles: int
+
+
+class CollectionReport:
+    """Per-page outcome and latency of one collection cycle."""
+
+    def __init__(self):
+        self.pages: List[PageResult] = []
+        self.started = time.perf_counter()
+        self.wall_time = None
+        self.credits_used = 0
+
+    def add(self, result: PageResult):
+        self.pages.append(result)
+
+    def finish(self, credits_used: int):
+        self.wall_time = time.perf_counter() - self.started
+        self.credits_used = credits_used
+
+    def summary(self) -> str:
+        latencies = sorted(page.latency for page in self.pages if page.status == 200)
+        failed = sum(1 for page in self.pages if page.status != 200)
+        retries = sum(page.attempts - 1 for page in self.pages)
+        lines = [f"{len(self.pages)} pages ({failed} failed, {retries} retries), {self.credits_used} credits, "
+                 f"{sum(page.n_articles for page in self.pages)} articles in {self.wall_time:.2f} s"]
+        if latencies:
+            def percentile(q):
+                return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+            lines.append(f"page latency: p50 {percentile(0.5) * 1000:.0f} ms, p95 {percentile(0.95) * 1000:.0f} ms, "
+                         f"max {latencies[-1] * 1000:.0f} ms")
+        for page in self.pages:
+            lines.append(f"  shard {page.shard} page {page.page}: status {page.status}, {page.attempts} attempt(s), "
+                         f"{page.latency * 1000:.0f} ms, {page.n_articles} articles")
+        return '\n'.join(lines)
+
+
+def shard_domains(domains: Sequence[str], n_shards: int) -> List[List[str]]:
+    """
+    Split the domains round-robin into at least `n_shards` queries (fewer if there are
+    fewer domains), each within the per-query domain limit.
+    """
+    domains = list(dict.fromkeys(domains))
+    if not domains:
+        return []
+    n_shards = max(min(n_shards, len(domains)), math.ceil(len(domains) / MAX_DOMAINS_PER_QUERY))
+    return [domains[i::n_shards] for i in range(n_shards)]
+
+
+class NewsCollector:
+    """
+    Fetches every page of a set of shards concurrently within a credit budget.
+
+    Requests go through one `aiohttp` session with a bounded connection pool and, when
+    `requests_per_second` is set, a token-bucket rate limit. A 429 or 5xx response, a timeout or a connection error is
+    retried with exponential backoff and jitter (honouring Retry-After); a shard whose
+    page still fails stops, the others carry on. The API key is only ever sent, never
+    logged.
+    """
+
+    def __init__(self, api_key: str, base_url: str = BASE_URL, max_credits: int = MAX_CREDITS,
+                 concurrency: int = CONCURRENCY, requests_per_second: Optional[float] = REQUESTS_PER_SECOND,
+                 max_retries: int = MAX_RETRIES, backoff: float = BACKOFF_SECONDS, timeout: float = REQUEST_TIMEOUT,
+                 params: Optional[Dict[str, str]] = None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_credits = max_credits
+        self.concurrency = concurrency
+        self.requests_per_second = requests_per_second
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.params = params if params is not None else {'language': 'it', 'country': 'it'}
+
+    async def collect(self, domains: Sequence[str]) -> Tuple[List[Dict], CollectionReport]:
+        """
+        Fetch the articles of `domains`.
+
+        Returns:
+        tuple: (articles without duplicates, in shard and page order; CollectionReport)
+        """
+        report = CollectionReport()
+        budget = CreditBudget(self.max_credits)
+        limiter = TokenBucket(self.requests_per_second, capacity=self.concurrency) if self.requests_per_second else None
+        shards = shard_domains(domains, self.concurrency)
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            results = await asyncio.gather(*(self._collect_shard(session, i, shard, budget, limiter, report)
+                                             for i, shard in enumerate(shards)))
+
+        articles, seen = [], set()
+        for shard_articles in results:
+            for article in shard_articles:
+                article_id = article.get('article_id')
+                if article_id not in seen:
+                    seen.add(article_id)
+                    articles.append(article)
+        report.finish(budget.used)
+        logger.info(report.summary().splitlines()[0])
+        return articles, report
+
+    async def _collect_shard(self, session, shard, domains, budget, limiter, report) -> List[Dict]:
+        articles = []
+        params = dict(self.params, domain=','.join(domains))
+        page = 0
+        while budget.reserve():
+            result, data = await self._fetch_page(session, shard, page, params, limiter)
+            report.add(result)
+            if result.status != 200 or data is None:
+                budget.refund()
+                break
+            budget.commit()
+            articles.extend(data.get('results') or [])
+
+            next_page = data.get('nextPage')
+            if not next_page:
+                break
+            params['page'] = next_page
+            page += 1
+        return articles
+
+    async def _fetch_page(self, session, shard, page, params, limiter):
+        query = dict(params, apikey=self.api_key)
+        status, latency = None, 0.0
+        for attempt in range(1, self.max_retries + 2):
+            if limiter:
+                await limiter.acquire()
+            retry_after = None
+            # Latency of the request itself, without rate limiting or backoff waits
+            started = time.perf_counter()
+            try:
+                async with session.get(self.base_url, params=query) as response:
+                    status = response.status
+                    if status == 200:
+                        try:
+                            data = await response.json(content_type=None)
+                        except ValueError:
+                            # e.g. a proxy or maintenance page served with a 200
+                            data = None
+                        latency = time.perf_counter() - started
+                        if not isinstance(data, dict):
+                            logger.error(f"Shard {shard} page {page}: response is not a JSON object")
+                            return PageResult(shard, page, None, attempt, latency, 0), None
+                        results = data.get('results')
+                        if data.get('status') == 'success' and isinstance(results, (list, type(None))):
+                            return PageResult(shard, page, status, attempt, latency, len(results or [])), data
+                        message = results.get('message') if isinstance(results, dict) else None
+                        logger.error(f"Shard {shard} page {page}: API error: {message or 'malformed response'}")
+                        return PageResult(shard, page, None, attempt, latency, 0), None
+                    if status not in RETRY_STATUSES:
+                        logger.error(f"Shard {shard} page {page}: HTTP {status}, not retrying")
+                        break
+                    retry_after = response.headers.get('Retry-After')
+                    latency = time.perf_counter() - started
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status = None
+                latency = time.perf_counter() - started
+                logger.warning(f"Shard {shard} page {page}: {type(e).__name__} on attempt {attempt}")
+
+            if attempt > self.max_retries:
+                break
+            delay = self.backoff * 2 ** (attempt - 1) * (1 + random.random())
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            logger.info(f"Shard {shard} page {page}: status {status}, retrying in {delay:.2f} s")
+            await asyncio.sleep(delay)
+
+        return PageResult(shard, page, status, attempt, latency, 0), None
+
+
+def fetch_news(domains: Sequence[str], api_key: str, **kwargs) -> Tuple[List[Dict], CollectionReport]:
+    """Synchronous entry point: run one collection cycle, see `NewsCollector`."""
+    return asyncio.run(NewsCollector(api_key, **kwargs).collect(domains))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default=BASE_URL)
+    parser.add_argument('--api-key', required=True)
+    parser.add_argument('--domains', nargs='+', help="Defaults to Utilities/list_sources")
+    parser.add_argument('--max-credits', type=int, default=MAX_CREDITS)
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--rate', type=float, default=REQUESTS_PER_SECOND,
+                        help="Requests per second, unlimited by default")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    domains = args.domains
+    if not domains:
+        with open('Utilities/list_sources', 'r') as f:
+            domains = [line.strip() for line in f if line.strip()]
+    _, report = fetch_news(domains, args.api_key, base_url=args.base_url, max_credits=args.max_credits,
+                           concurrency=args.concurrency, requests_per_second=args.rate)
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
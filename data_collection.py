@@ -1,8 +1,11 @@
 import os
-import json
-import requests
 from datetime import datetime
 from dotenv import load_dotenv
+import collector
+from article_store import ArticleStore
+from deduplication import deduplicate_articles
+from preprocessing import preprocess_articles
+from trending import update_trends
 
 # Load environment variables
 load_dotenv()
@@ -12,8 +15,8 @@ API_KEY = os.getenv('NEWSDATA_API_KEY')
 if not API_KEY:
     raise ValueError("API_KEY not found. Make sure it's set in your .env file.")
 
-BASE_URL = 'https://newsdata.io/api/1/news'
-MAX_CREDITS = 30
+BASE_URL = collector.BASE_URL
+MAX_CREDITS = collector.MAX_CREDITS
 
 def load_source_ids():
     """Load source IDs from the list_sources file."""
@@ -21,75 +24,32 @@ def load_source_ids():
         return [line.strip() for line in f if line.strip()]
 
 def fetch_news(domains):
-    """Fetch news articles from NewsData.io API for the specified domains."""
-    all_articles = []
-    credits_used = 0
-    next_page = None
-
-    # Join all domains with commas
-    domains_param = ','.join(domains)
-
-    params = {
-        'apikey': API_KEY,
-        'language': 'it',
-        'country': 'it',
-        'domain': domains_param,
-    }
-
-    while True:
-        if next_page:
-            params['page'] = next_page
-
-        try:
-            print(f"Fetching news articles (Credit {credits_used + 1})...")
-            print(f"Request URL: {BASE_URL}")
-            print(f"Request params: {params}")
-            response = requests.get(BASE_URL, params=params)
-            response.raise_for_status()
-            data = response.json()
-
-            if data['status'] == 'success':
-                articles = data['results']
-                all_articles.extend(articles)
-                print(f"Fetched {len(articles)} articles. Total: {len(all_articles)}")
-                credits_used += 1
-
-                next_page = data.get('nextPage')
-                if not next_page:
-                    print("No more pages available.")
-                    break
-            else:
-                print(f"Error in API response: {data.get('results', {}).get('message', 'Unknown error')}")
-                break
-
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching articles: {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                print(f"Response content: {e.response.text}")
-            break
-
-        if credits_used >= MAX_CREDITS:
-            print(f"Reached maximum credits limit ({MAX_CREDITS}).")
-            break
-
-    print(f"Total credits used: {credits_used}")
-    return all_articles
+    """Fetch news articles from NewsData.io for the specified domains, concurrently per shard of domains."""
+    articles, report = collector.fetch_news(domains, API_KEY, base_url=BASE_URL, max_credits=MAX_CREDITS)
+    print(report.summary())
+    return articles
 
 def save_articles(articles):
-    """Save articles to a JSON file only if there are articles to save."""
+    """Append articles to the article store only if there are articles to save."""
     if not articles:
         print("No articles to save. Skipping file creation.")
         return
 
     today = datetime(2024, 10, 24).strftime("%Y-%m-%d")
     # today = datetime.now().strftime("%Y-%m-%d")
-    filename = f"data/articles_{today}.json"
     
-    os.makedirs("data", exist_ok=True)
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(articles, f, ensure_ascii=False, indent=4)
+    with ArticleStore() as store:
+        # Articles re-fetched by an earlier cycle are replaced in the store but must not be counted twice
+        known = store.read_by_ids([a.get('article_id') for a in articles], columns=['article_id'])
+        saved = store.append(articles, today)
+    new_articles = list({a['article_id']: a for a in articles
+                         if a.get('article_id') and a['article_id'] not in known}.values())
+    
+    print(f"Saved {saved} articles ({len(new_articles)} new) to {store.path} for {today}")
     
-    print(f"Saved {len(articles)} articles to {filename}")
+    # Burst scores are updated on every collection cycle, no topic model needed
+    detector = update_trends(preprocess_articles(deduplicate_articles(new_articles)), today)
+    print(f"Emerging terms for {today}: {', '.join(t['term'] for t in detector.top(10)) or 'no baseline yet'}")
 
 def main():
     print("Starting data collection process")
@@ -0,0 +1,205 @@
+import zlib
+import pickle
+import logging
+from collections import defaultdict
+from typing import List, Dict, Iterable, Optional
+
+import numpy as np
+
+from preprocessing import remove_source_ending, simple_tokenize
+
+logger = logging.getLogger(__name__)
+
+# Prime just above 2**32, so (a * x + b) fits in uint64 for 32-bit shingle hashes
+_MERSENNE_PRIME = np.uint64((1 << 32) + 15)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def article_shingles(article: Dict, shingle_size: int = 3) -> np.ndarray:
+    """
+    Hash the word n-grams of an article's title and description.
+
+    The trailing "proviene da <source>" sentence is removed first, since it is the
+    only part that differs between syndicated copies of the same story.
+    """
+    title = article.get('title') or ''
+    description = article.get('description') or ''
+    tokens = simple_tokenize(remove_source_ending(f"{title} {description}"))
+    if not tokens:
+        return np.empty(0, dtype=np.uint64)
+    if len(tokens) < shingle_size:
+        grams = [' '.join(tokens)]
+    else:
+        grams = [' '.join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)]
+    return np.unique(np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams), dtype=np.uint64))
+
+
+class SyndicationIndex:
+    """
+    Incremental MinHash/LSH index grouping near-identical articles.
+
+    Each article gets a MinHash signature; the signature is cut into `bands` bands and
+    articles sharing any band bucket are candidates. Candidates are only merged when
+    their estimated Jaccard similarity reaches `threshold`, so grouping runs in time
+    proportional to the number of articles rather than the number of pairs.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 16, threshold: float = 0.8,
+                 shingle_size: int = 3, seed: int = 42):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self._a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+        self.article_ids: List[str] = []
+        self.signatures: List[np.ndarray] = []
+        self._row_by_id: Dict[str, int] = {}
+        self._buckets = [defaultdict(list) for _ in range(bands)]
+        self._parent: List[int] = []
+        self._group_size: Dict[int, int] = {}
+
+    def __len__(self):
+        return len(self.article_ids)
+
+    def signature(self, shingles: np.ndarray) -> np.ndarray:
+        if shingles.size == 0:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        hashes = (np.outer(self._a, shingles) + self._b[:, None]) % _MERSENNE_PRIME
+        return hashes.min(axis=1)
+
+    def add(self, articles: Iterable[Dict]) -> List[int]:
+        """
+        Insert articles into the index.
+
+        Articles already in the index (same article_id) are not inserted twice.
+
+        Returns:
+        list: The group id of every article, in input order
+        """
+        rows = []
+        for article in articles:
+            article_id = article.get('article_id')
+            if article_id in self._row_by_id:
+                rows.append(self._row_by_id[article_id])
+                continue
+
+            row = len(self.article_ids)
+            shingles = article_shingles(article, self.shingle_size)
+            signature = self.signature(shingles)
+            self.article_ids.append(article_id)
+            self.signatures.append(signature)
+            self._parent.append(row)
+            self._group_size[row] = 1
+            if article_id is not None:
+                self._row_by_id[article_id] = row
+
+            # Articles without text never match anything
+            if shingles.size:
+                for band, bucket in enumerate(self._band_keys(signature)):
+                    candidates = self._buckets[band][bucket]
+                    for other in candidates:
+                        if self._find(other) != self._find(row) and self._similarity(row, other) >= self.threshold:
+                            self._union(row, other)
+                    candidates.append(row)
+
+            rows.append(row)
+        # Resolve groups only at the end, since later articles can merge earlier groups
+        return [self._find(row) for row in rows]
+
+    def group_of(self, article_id: str) -> int:
+        return self._find(self._row_by_id[article_id])
+
+    def resolve(self, group: int) -> int:
+        """Current id of a group, which changes when a later article merges it into an older one."""
+        return self._find(group)
+
+    def group_size(self, group: int) -> int:
+        return self._group_size[self._find(group)]
+
+    def save(self, path: str):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path: str) -> 'SyndicationIndex':
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def _band_keys(self, signature: np.ndarray):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def _similarity(self, i: int, j: int) -> float:
+        return float(np.mean(self.signatures[i] == self.signatures[j]))
+
+    def _find(self, row: int) -> int:
+        root = row
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while self._parent[row] != root:
+            self._parent[row], row = root, self._parent[row]
+        return root
+
+    def _union(self, i: int, j: int):
+        # The older article stays the root, so a group keeps its first representative
+        root_i, root_j = self._find(i), self._find(j)
+        if root_i == root_j:
+            return
+        root, child = min(root_i, root_j), max(root_i, root_j)
+        self._parent[child] = root
+        self._group_size[root] += self._group_size.pop(child)
+
+
+def deduplicate_articles(articles: Iterable[Dict], index: Optional[SyndicationIndex] = None) -> List[Dict]:
+    """
+    Collapse syndicated copies of the same story into one representative article.
+
+    The first article of each group (in input order) is kept, annotated with
+    `syndication_count` (the size of the whole group in the index, so it includes
+    copies seen on earlier days when a persistent index is passed) and
+    `syndicated_ids` (the article ids of this batch merged into it).
+
+    Articles are consumed one at a time, so a generator such as
+    `article_store.stream_articles` is never materialized: only the representatives
+    and the MinHash signatures are kept in memory.
+
+    Args:
+    articles (iterable): Article dictionaries
+    index (SyndicationIndex): Optional index to extend across days
+
+    Returns:
+    list: Representative article dictionaries, in input order
+    """
+    if index is None:
+        index = SyndicationIndex()
+
+    # Keyed by the group's root when the article arrived; a later article can still merge two groups
+    representatives = {}
+    n_articles = 0
+    for article in articles:
+        n_articles += 1
+        group = index.add([article])[0]
+        if group not in representatives:
+            representatives[group] = dict(article, syndicated_ids=[])
+        representatives[group]['syndicated_ids'].append(article.get('article_id'))
+
+    # Resolve groups only at the end, merging representatives whose groups were joined
+    merged = {}
+    for group, article in representatives.items():
+        root = index.resolve(group)
+        if root in merged:
+            merged[root]['syndicated_ids'].extend(article['syndicated_ids'])
+        else:
+            merged[root] = article
+
+    deduplicated = list(merged.values())
+    for group, article in merged.items():
+        article['syndication_count'] = index.group_size(group)
+
+    logger.info(f"Deduplicated {n_articles} articles into {len(deduplicated)} stories")
+    return deduplicated
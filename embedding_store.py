@@ -0,0 +1,212 @@
+import os
+import sqlite3
+import logging
+import argparse
+from typing import List, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from article_store import DEFAULT_DB_PATH, stream_articles
+from preprocessing import article_text
+from embeddings import EMBEDDING_MODEL, encode_articles
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_DIR = os.path.join('data', 'embeddings')
+
+EMBEDDING_DTYPE = np.float16
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (
+    article_id TEXT PRIMARY KEY,
+    row INTEGER NOT NULL UNIQUE
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+
+class EmbeddingStore:
+    """
+    Append-only store of article embeddings, one directory per embedding model (and
+    per int8-quantized variant, since its vectors differ numerically).
+
+    Embeddings live in a flat float16 file read through a memory map, and a SQLite
+    table maps each article_id to its row. Rows are written and synced before the
+    index transaction that publishes them commits, so readers only ever see complete
+    rows; bytes left behind by an interrupted append are truncated by the next one.
+    """
+
+    def __init__(self, directory: str = DEFAULT_EMBEDDING_DIR, model_name: str = EMBEDDING_MODEL,
+                 quantized: bool = False):
+        self.directory = os.path.join(directory, model_name.replace('/', '__') + ('__int8' if quantized else ''))
+        os.makedirs(self.directory, exist_ok=True)
+        self.model_name = model_name
+        self.quantized = quantized
+        self.data_path = os.path.join(self.directory, 'embeddings.f16')
+        self.conn = sqlite3.connect(os.path.join(self.directory, 'index.db'), check_same_thread=False)
+        self.conn.executescript(_SCHEMA)
+        dim = self.conn.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        self.dim = int(dim[0]) if dim else None
+        self._matrix = None
+
+    def close(self):
+        self._matrix = None
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Read-only memory map of every committed row, remapped after appends."""
+        n_rows = len(self)
+        if self._matrix is None or self._matrix.shape[0] != n_rows:
+            if n_rows == 0:
+                self._matrix = np.empty((0, self.dim or 0), dtype=EMBEDDING_DTYPE)
+            else:
+                self._matrix = np.memmap(self.data_path, dtype=EMBEDDING_DTYPE, mode='r',
+                                         shape=(n_rows, self.dim))
+        return self._matrix
+
+    def rows(self, article_ids: Sequence[str]) -> np.ndarray:
+        """Row of every article id, -1 for ids that are not in the store."""
+        found = {}
+        unique = list(dict.fromkeys(article_ids))
+        for i in range(0, len(unique), _LOOKUP_BATCH):
+            batch = unique[i:i + _LOOKUP_BATCH]
+            placeholders = ', '.join('?' * len(batch))
+            found.update(self.conn.execute(
+                f"SELECT article_id, row FROM rows WHERE article_id IN ({placeholders})", batch
+            ))
+        return np.array([found.get(article_id, -1) for article_id in article_ids], dtype=np.int64)
+
+    def missing(self, article_ids: Sequence[str]) -> List[str]:
+        """The article ids (deduplicated, in input order) that have no embedding yet."""
+        unique = list(dict.fromkeys(article_ids))
+        return [article_id for article_id, row in zip(unique, self.rows(unique)) if row < 0]
+
+    def get(self, article_ids: Sequence[str]) -> np.ndarray:
+        """
+        Embeddings of `article_ids`, in order.
+
+        When the ids map to consecutive rows, which is the case for articles appended
+        together, the result is a view of the memory map and nothing is copied.
+
+        Raises:
+        KeyError: If some article ids have no embedding
+        """
+        rows = self.rows(article_ids)
+        if (rows < 0).any():
+            raise KeyError(f"{int((rows < 0).sum())} of {len(rows)} articles have no embedding")
+        matrix = self.matrix
+        if len(rows) and (np.diff(rows) == 1).all():
+            return matrix[rows[0]:rows[-1] + 1]
+        return matrix[rows]
+
+    def append(self, article_ids: Sequence[str], embeddings) -> int:
+        """
+        Atomically add the embeddings of new articles.
+
+        Articles already in the store (and repeated ids) are skipped, existing rows are
+        never rewritten.
+
+        Returns:
+        int: Number of rows written
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if len(article_ids) != len(embeddings):
+            raise ValueError(f"{len(article_ids)} article ids but {len(embeddings)} embeddings")
+        if self.dim is not None and len(embeddings) and embeddings.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dimensional embeddings, got {embeddings.shape[1]}")
+
+        keep = {}
+        for i, article_id in enumerate(article_ids):
+            keep.setdefault(article_id, i)
+        new_ids = self.missing(list(keep))
+        if not new_ids:
+            return 0
+        block = embeddings[[keep[article_id] for article_id in new_ids]].astype(EMBEDDING_DTYPE)
+
+        n_rows = len(self)
+        row_bytes = block.shape[1] * block.itemsize
+        with open(self.data_path, 'ab') as f:
+            # Drop whatever an interrupted append left after the last committed row
+            f.truncate(n_rows * row_bytes)
+            f.write(block.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        with self.conn:
+            self.conn.executemany("INSERT INTO rows (article_id, row) VALUES (?, ?)",
+                                  [(article_id, n_rows + i) for i, article_id in enumerate(new_ids)])
+            self.conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                                  [('dim', str(block.shape[1])), ('model', self.model_name)])
+        self.dim = block.shape[1]
+        return len(new_ids)
+
+    def read_range(self, start_date: str, end_date: Optional[str] = None,
+                   db_path: str = DEFAULT_DB_PATH) -> Tuple[List[str], np.ndarray]:
+        """
+        Embeddings of the articles collected between `start_date` and `end_date`.
+
+        Returns:
+        tuple: (article ids that have an embedding, their embeddings)
+        """
+        article_ids = [a['article_id'] for a in stream_articles(start_date, end_date, fields=('article_id',),
+                                                                db_path=db_path)]
+        rows = self.rows(article_ids)
+        article_ids = [article_id for article_id, row in zip(article_ids, rows) if row >= 0]
+        return article_ids, self.get(article_ids)
+
+
+def embed_articles(articles: Sequence[Dict], store: EmbeddingStore, model, tokenizer,
+                   **encode_kwargs) -> np.ndarray:
+    """
+    Embeddings of `articles`, in order, only encoding the ones not in the store yet.
+
+    Args:
+    articles (list): Article dictionaries with an `article_id`
+    store (EmbeddingStore): Store for the same model as `model`
+    encode_kwargs: Passed on to `embeddings.encode_articles`
+
+    Returns:
+    np.ndarray: (len(articles), dim) float16 embeddings
+    """
+    article_ids = [a['article_id'] for a in articles]
+    missing = set(store.missing(article_ids))
+    if missing:
+        new_articles = [a for a in articles if a['article_id'] in missing]
+        vectors = encode_articles([article_text(a) for a in new_articles], model, tokenizer, **encode_kwargs)
+        store.append([a['article_id'] for a in new_articles], vectors.numpy())
+    logger.info(f"Embedding store: {len(article_ids) - len(missing)} hits, {len(missing)} encoded")
+    return store.get(article_ids)
+
+
+if __name__ == "__main__":
+    from embeddings import load_encoder
+
+    parser = argparse.ArgumentParser(description="Encode the articles of a date range into the embedding store")
+    parser.add_argument('--start', required=True, help="First day, YYYY-MM-DD")
+    parser.add_argument('--end', help="Last day, defaults to --start")
+    parser.add_argument('--model', default=EMBEDDING_MODEL)
+    parser.add_argument('--threads', type=int)
+    parser.add_argument('--quantize', action='store_true', help="Dynamic int8 quantization")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    tokenizer, model = load_encoder(args.model, quantize=args.quantize)
+    with EmbeddingStore(model_name=args.model, quantized=args.quantize) as store:
+        embed_articles(list(stream_articles(args.start, args.end)), store, model, tokenizer, n_threads=args.threads)
+        print(f"{len(store)} articles in {store.directory}")
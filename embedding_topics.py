@@ -0,0 +1,156 @@
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.cluster import MiniBatchKMeans, HDBSCAN
+from sklearn.metrics import silhouette_score
+
+from artifact_store import matrix_fingerprint
+
+logger = logging.getLogger(__name__)
+
+CLUSTERERS = ('kmeans', 'hdbscan')
+
+# Articles the silhouette of a candidate k is estimated on; the exact score is
+# quadratic in the number of articles
+SILHOUETTE_SAMPLE_SIZE = 2000
+
+
+def class_tfidf(X, labels, n_classes: int) -> np.ndarray:
+    """
+    Class-based TF-IDF: every cluster is treated as one document made of its articles.
+
+    tf is the term's share of the cluster's words, idf is log(1 + A / f_t) with A the
+    average number of words per cluster and f_t the term's frequency over all clusters,
+    so terms frequent everywhere are damped. Rows with a negative label are ignored.
+
+    Returns:
+    np.ndarray: (n_classes, n_terms) term weights
+    """
+    labels = np.asarray(labels)
+    rows = np.flatnonzero(labels >= 0)
+    membership = sp.csr_matrix((np.ones(len(rows)), (labels[rows], rows)), shape=(n_classes, X.shape[0]))
+    counts = np.asarray((membership @ sp.csr_matrix(X, dtype=np.float64)).todense())
+
+    tf = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    average_words = counts.sum() / n_classes
+    idf = np.log1p(average_words / np.maximum(counts.sum(axis=0), 1))
+    return tf * idf
+
+
+class EmbeddingTopicModel:
+    """
+    Topics as clusters of sentence embeddings, described by class-based TF-IDF terms.
+
+    Articles are clustered on their L2-normalized embeddings, with mini-batch k-means
+    or HDBSCAN. With k-means and `n_components=None`, the number of topics in
+    `k_range` with the best cosine silhouette (estimated on a fixed-size sample of
+    articles) is used, which costs a k-means run per candidate instead of an LDA fit. HDBSCAN finds the number of topics itself and
+    leaves outliers out of the topic terms.
+
+    Exposes the same `components_`, `n_components` and `transform` as the LDA engines.
+    The document-topic matrix is a softmax over the cosine similarities between an
+    article and the cluster centroids, sharpened by `temperature`.
+    """
+
+    def __init__(self, n_components: Optional[int] = None, clusterer: str = 'kmeans',
+                 k_range: Tuple[int, int] = (3, 12), min_cluster_size: int = 10, temperature: float = 0.05,
+                 random_state: int = 42):
+        if clusterer not in CLUSTERERS:
+            raise ValueError(f"Unknown clusterer {clusterer!r}, expected one of {CLUSTERERS}")
+        self.n_components = n_components
+        self.clusterer = clusterer
+        self.k_range = k_range
+        self.min_cluster_size = min_cluster_size
+        self.temperature = temperature
+        self.random_state = random_state
+
+    def fit(self, X, embeddings):
+        """
+        Cluster the articles and derive the topic terms.
+
+        Args:
+        X (sparse matrix): Document-term counts, one row per article
+        embeddings (array): Sentence embeddings of the same articles, in the same order
+        """
+        embeddings = _normalize(embeddings)
+        if embeddings.shape[0] != X.shape[0]:
+            raise ValueError(f"{X.shape[0]} documents but {embeddings.shape[0]} embeddings")
+
+        labels = self._hdbscan(embeddings) if self.clusterer == 'hdbscan' else None
+        if labels is None:
+            n_clusters = self.n_components or self._select_num_topics(embeddings)
+            labels = self._kmeans(embeddings, n_clusters)
+
+        self.labels_ = labels
+        self.n_components = int(labels.max()) + 1
+        self.cluster_centers_ = _normalize(np.stack([embeddings[labels == topic].mean(axis=0)
+                                                     for topic in range(self.n_components)]))
+        self.components_ = class_tfidf(X, labels, self.n_components)
+        self.doc_topic_ = self._soft_assign(embeddings)
+        self._X_fingerprint = matrix_fingerprint(X)
+        return self
+
+    def fit_transform(self, X, embeddings):
+        return self.fit(X, embeddings).doc_topic_
+
+    def transform(self, X, embeddings=None):
+        """
+        Topic proportions of each article.
+
+        Without embeddings, the training matrix gets the fitted proportions back; other
+        documents fall back to the cosine between their terms and the topics' c-TF-IDF.
+        """
+        if embeddings is not None:
+            return self._soft_assign(_normalize(embeddings))
+        if np.array_equal(matrix_fingerprint(X), self._X_fingerprint):
+            return self.doc_topic_
+        X = sp.csr_matrix(X, dtype=np.float64)
+        row_norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1))).ravel()
+        topics = _normalize(self.components_)
+        similarity = np.asarray(X @ topics.T) / np.maximum(row_norms, 1e-12)[:, None]
+        return _softmax(similarity / self.temperature)
+
+    def _select_num_topics(self, embeddings):
+        low, high = self.k_range
+        high = min(high, len(embeddings) - 1)
+        if high < max(low, 2):
+            return max(1, min(low, len(embeddings)))
+        scores = {}
+        for k in range(max(low, 2), high + 1):
+            labels = self._kmeans(embeddings, k)
+            if len(np.unique(labels)) > 1:
+                scores[k] = silhouette_score(embeddings, labels, metric='cosine',
+                                             sample_size=min(SILHOUETTE_SAMPLE_SIZE, len(embeddings)),
+                                             random_state=self.random_state)
+        best = max(scores, key=scores.get) if scores else low
+        logger.info(f"Embedding clusters: best silhouette at {best} topics")
+        return best
+
+    def _kmeans(self, embeddings, n_clusters):
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, n_init=3, batch_size=1024, random_state=self.random_state)
+        labels = kmeans.fit_predict(embeddings)
+        # Relabel so topic ids are consecutive even if a cluster ended up empty
+        return np.unique(labels, return_inverse=True)[1]
+
+    def _hdbscan(self, embeddings):
+        # On unit vectors, euclidean distance is a monotone function of cosine distance
+        labels = HDBSCAN(min_cluster_size=self.min_cluster_size, copy=True).fit_predict(embeddings)
+        if labels.max() < 1:
+            logger.warning("HDBSCAN found fewer than two clusters, falling back to k-means")
+            return None
+        return labels
+
+    def _soft_assign(self, embeddings):
+        return _softmax(embeddings @ self.cluster_centers_.T / self.temperature)
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def _softmax(scores):
+    scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+    return scores / scores.sum(axis=1, keepdims=True)
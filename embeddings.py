@@ -0,0 +1,123 @@
+import logging
+from contextlib import contextmanager
+from typing import List, Optional, Sequence
+
+import numpy as np
+import torch
+from transformers import AutoTokenizer, AutoModel
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Truncation limit of MiniLM; with dynamic padding it only matters for unusually long texts
+MAX_LENGTH = 512
+
+
+def load_encoder(model_name: str = EMBEDDING_MODEL, quantize: bool = False):
+    """
+    Load a transformer tokenizer and model ready for inference.
+
+    Args:
+    model_name (str): Hugging Face model id
+    quantize (bool): Apply dynamic int8 quantization to the Linear layers (CPU only)
+
+    Returns:
+    tuple: (tokenizer, model)
+    """
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+    if quantize:
+        model = quantize_model(model)
+    return tokenizer, model
+
+
+def quantize_model(model):
+    """
+    Dynamic int8 quantization of every Linear layer.
+
+    Weights are stored as int8 and activations are quantized on the fly, which roughly
+    halves CPU inference time for MiniLM at a negligible cost in embedding quality.
+    The quantized model only runs on CPU.
+    """
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+@contextmanager
+def torch_threads(n_threads: Optional[int]):
+    """Temporarily set torch's intra-op thread count, None leaves it unchanged."""
+    previous = torch.get_num_threads()
+    if n_threads:
+        torch.set_num_threads(n_threads)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(previous)
+
+
+def length_batches(lengths: Sequence[int], batch_size: int) -> List[np.ndarray]:
+    """
+    Split indices into batches of similar length.
+
+    Indices are sorted by length (stably, so ties keep their order), so every batch
+    only has to be padded to its own longest text instead of to a global maximum.
+    """
+    order = np.argsort(np.asarray(lengths), kind='stable')
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def mean_pool(hidden_states: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+    """Average the token embeddings of each text, ignoring padding."""
+    mask = attention_mask.unsqueeze(-1).to(hidden_states.dtype)
+    return (hidden_states * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+
+
+def encode_articles(articles: Sequence[str], model, tokenizer, batch_size: int = 32,
+                    max_length: int = MAX_LENGTH, n_threads: Optional[int] = None,
+                    normalize: bool = True) -> torch.Tensor:
+    """
+    Sentence embeddings of a list of texts.
+
+    All texts are tokenized in one call, grouped into batches of similar length and
+    padded only to the longest text of their batch. Token embeddings are mean-pooled
+    over the attention mask, the pooling all-MiniLM-L6-v2 was trained with.
+
+    Args:
+    articles (list): Texts to embed, e.g. `preprocessing.article_text` of each article
+    model: Transformer model, optionally quantized with `quantize_model`
+    tokenizer: Matching tokenizer
+    batch_size (int): Texts per forward pass
+    max_length (int): Texts are truncated to this many tokens
+    n_threads (int): Intra-op threads for CPU inference, None keeps torch's setting
+    normalize (bool): L2-normalize the embeddings, so dot products are cosine similarities
+
+    Returns:
+    torch.Tensor: (len(articles), hidden size) float32 embeddings, in input order
+    """
+    articles = list(articles)
+    quantized = any(isinstance(m, torch.ao.nn.quantized.dynamic.Linear) for m in model.modules())
+    device = torch.device('cuda' if torch.cuda.is_available() and not quantized else 'cpu')
+    model.to(device)
+    model.eval()
+
+    if not articles:
+        return torch.empty((0, model.config.hidden_size))
+
+    encoded = tokenizer(articles, truncation=True, max_length=max_length)
+    lengths = [len(ids) for ids in encoded['input_ids']]
+
+    embeddings = torch.empty((len(articles), model.config.hidden_size))
+    with torch_threads(n_threads), torch.inference_mode():
+        for batch in length_batches(lengths, batch_size):
+            features = tokenizer.pad({key: [values[i] for i in batch] for key, values in encoded.items()},
+                                     padding='longest', return_tensors='pt')
+            features = {key: value.to(device) for key, value in features.items()}
+            outputs = model(**features)
+            pooled = mean_pool(outputs.last_hidden_state, features['attention_mask'])
+            if normalize:
+                pooled = torch.nn.functional.normalize(pooled, dim=1)
+            embeddings[torch.from_numpy(batch)] = pooled.float().cpu()
+
+    logger.info(f"Encoded {len(articles)} texts, mean length {np.mean(lengths):.1f} tokens")
+    return embeddings
@@ -0,0 +1,94 @@
+"""
+Local stand-in for the NewsData.io `news` endpoint, for exercising the collector.
+
+Like the real API, a query returns pages of 10 articles whatever the number of
+domains it names, following `nextPage` cursors until the `articles_per_domain`
+synthetic articles of each domain are exhausted. Every request takes `latency`
+seconds; every `fail_every`-th one is answered with 429 or 503 instead.
+
+Usage:
+    python mock_newsdata.py --port 8765 --latency 0.3 --fail-every 7
+"""
+import asyncio
+import hashlib
+import argparse
+from datetime import datetime, timedelta
+
+from aiohttp import web
+
+ARTICLES_PER_PAGE = 10
+
+
+def _article(domain: str, index: int) -> dict:
+    article_id = hashlib.md5(f"{domain}:{index}".encode('utf-8')).hexdigest()
+    published = datetime(2024, 10, 24, 8) + timedelta(minutes=7 * index)
+    return {
+        'article_id': article_id,
+        'title': f"Notizia {index} da {domain}",
+        'link': f"https://{domain}.example/{article_id}",
+        'description': f"Descrizione della notizia {index} di {domain}",
+        'pubDate': published.strftime('%Y-%m-%d %H:%M:%S'),
+        'source_id': domain,
+        'language': 'italian',
+        'country': ['italy'],
+        'category': ['top'],
+    }
+
+
+class MockNewsData:
+    def __init__(self, articles_per_domain: int = 100, latency: float = 0.3, fail_every: int = 0):
+        self.articles_per_domain = articles_per_domain
+        self.latency = latency
+        self.fail_every = fail_every
+        self.requests = 0
+
+    async def news(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        if not request.query.get('apikey'):
+            return web.json_response({'status': 'error', 'results': {'message': 'API key missing'}}, status=401)
+        if self.fail_every and self.requests % self.fail_every == 0:
+            if (self.requests // self.fail_every) % 2:
+                return web.json_response({'status': 'error'}, status=429, headers={'Retry-After': '0'})
+            return web.json_response({'status': 'error'}, status=503)
+
+        # Articles of the queried domains interleaved, 10 per page
+        domains = [d for d in request.query.get('domain', '').split(',') if d]
+        total = len(domains) * self.articles_per_domain
+        start = int(request.query.get('page', 0)) * ARTICLES_PER_PAGE
+        results = [_article(domains[i % len(domains)], i // len(domains))
+                   for i in range(start, min(start + ARTICLES_PER_PAGE, total))]
+        next_page = str(start // ARTICLES_PER_PAGE + 1) if start + ARTICLES_PER_PAGE < total else None
+        return web.json_response({'status': 'success', 'totalResults': total, 'results': results,
+                                  'nextPage': next_page})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/api/1/news', self.news)
+        return app
+
+
+async def start_server(mock: MockNewsData, host: str = '127.0.0.1', port: int = 0):
+    """Serve `mock` in the running event loop; returns (runner, base URL). Port 0 picks a free one."""
+    runner = web.AppRunner(mock.app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://{host}:{port}/api/1/news"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--articles', type=int, default=100, help="Articles per domain")
+    parser.add_argument('--latency', type=float, default=0.3, help="Seconds per request")
+    parser.add_argument('--fail-every', type=int, default=0, help="Fail every n-th request, 0 never")
+    args = parser.parse_args()
+    mock = MockNewsData(args.articles, args.latency, args.fail_every)
+    web.run_app(mock.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
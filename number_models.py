@@ -1,56 +1,188 @@
-import numpy as np
-from gensim import corpora
-from gensim.models.coherencemodel import CoherenceModel
-from topic_modeling import perform_topic_modeling
+import os
+import math
+from concurrent.futures import ProcessPoolExecutor
+from threadpoolctl import threadpool_limits
+from topic_modeling import DocumentTermCorpus, make_topic_model, LDA_ENGINES
+from coherence import CoherenceScorer
 import logging
-import torch
 
 logger = logging.getLogger(__name__)
 
-# Check if CUDA is available
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-logger.info(f"Using device: {device}")
+SEARCH_STRATEGIES = ('grid', 'coarse_to_fine', 'golden')
 
-def compute_coherence_values(texts, start=3, limit=12, step=1):
-    coherence_values = []
-    model_list = []
-    
-    # Create dictionary from the original texts
-    dictionary = corpora.Dictionary(texts)
-    
-    # Create corpus
-    corpus = [dictionary.doc2bow(text) for text in texts]
-    
-    for num_topics in range(start, limit + 1, step):
-        try:
-            # Pass the device to perform_topic_modeling
-            model, feature_names, X = perform_topic_modeling(texts, num_topics=num_topics, device=device)
-            model_list.append(model)
-            
-            # Ensure the model has the correct format for coherence calculation
-            topics = model.components_
-            topic_words = [[feature_names[i] for i in topic.argsort()[:-10 - 1:-1]] for topic in topics]
-            
-            coherencemodel = CoherenceModel(topics=topic_words, texts=texts, dictionary=dictionary, coherence='c_v')
-            coherence_value = coherencemodel.get_coherence()
-            coherence_values.append(coherence_value)
-            
-            logger.info(f"Num Topics: {num_topics}, Coherence Score: {coherence_value}")
-        except Exception as e:
-            logger.error(f"Error computing coherence for {num_topics} topics: {str(e)}")
-            coherence_values.append(None)
-
-    return model_list, coherence_values
-
-def find_optimal_number_of_topics(texts):
-    model_list, coherence_values = compute_coherence_values(texts)
-    
-    # Filter out None values
-    valid_coherence_values = [v for v in coherence_values if v is not None]
+# Per-process state for the sweep workers, set once by _init_worker
+_worker_state = {}
+
+def _init_worker(X, scorer, coherence, threads_per_worker, engine):
+    _worker_state.update(X=X, scorer=scorer, coherence=coherence, threads_per_worker=threads_per_worker,
+                         engine=engine)
+
+def _evaluate_num_topics(num_topics):
+    state = _worker_state
+    try:
+        # One thread per fit by default: several small fits in parallel beat one
+        # fit oversubscribing every core
+        with threadpool_limits(limits=state['threads_per_worker']):
+            # sklearn's n_jobs would start joblib workers, torch takes the thread budget directly
+            n_threads = 1 if state['engine'] == 'sklearn' else state['threads_per_worker']
+            model = make_topic_model(state['engine'], num_topics, n_threads=n_threads)
+            model.fit(state['X'])
+
+        # Word statistics were precomputed once, scoring is just lookups
+        coherence_value = state['scorer'].score_model(model.components_, n_top=10, measure=state['coherence'])
+        return num_topics, model, coherence_value
+    except Exception as e:
+        logger.error(f"Error computing coherence for {num_topics} topics: {str(e)}")
+        return num_topics, None, None
+
+class TopicSearchResult:
+    """Every fitted candidate of a topic-number search, with the winner already fitted."""
+
+    def __init__(self, models, coherence_values):
+        self.models = models
+        self.coherence_values = coherence_values
+        valid = {k: v for k, v in coherence_values.items() if v is not None}
+        self.best_num_topics = max(valid, key=valid.get) if valid else None
+
+    @property
+    def best_model(self):
+        return self.models.get(self.best_num_topics)
+
+class _Sweep:
+    """Evaluates batches of candidate k concurrently, never fitting the same k twice."""
+
+    def __init__(self, corpus, n_workers, threads_per_worker, coherence='c_v', engine='sklearn'):
+        initargs = (corpus.X, CoherenceScorer(corpus.X), coherence, threads_per_worker, engine)
+        self.models, self.scores = {}, {}
+        if n_workers > 1:
+            self.executor = ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=initargs)
+        else:
+            self.executor = None
+            _init_worker(*initargs)
+
+    def evaluate(self, candidates):
+        todo = [k for k in dict.fromkeys(candidates) if k not in self.scores]
+        results = self.executor.map(_evaluate_num_topics, todo) if self.executor else map(_evaluate_num_topics, todo)
+        for num_topics, model, score in results:
+            self.models[num_topics], self.scores[num_topics] = model, score
+            logger.info(f"Num Topics: {num_topics}, Coherence Score: {score}")
+        return [self.score(k) for k in candidates]
+
+    def score(self, num_topics):
+        score = self.scores.get(num_topics)
+        return -math.inf if score is None else score
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown()
+
+def search_number_of_topics(texts, start=3, limit=12, corpus=None, strategy='grid', n_workers=None,
+                            threads_per_worker=None, patience=3, tol=1e-3, coherence='c_v', engine='sklearn'):
+    """
+    Search k in [start, limit] for the most coherent LDA model.
+
+    Args:
+    texts (list): Preprocessed token lists
+    corpus (DocumentTermCorpus): Shared document-term matrix, built from texts if missing
+    strategy (str): 'grid' tries every k in order and stops early once coherence has not
+        improved by more than `tol` for `patience` consecutive k; 'coarse_to_fine' tries
+        a coarse grid then the neighbours of its best k; 'golden' runs a golden-section
+        search, assuming coherence is roughly unimodal in k
+    n_workers (int): Concurrent fits, defaults to one per core (at most patience + 1 for 'grid')
+    threads_per_worker (int): BLAS/OpenMP threads per fit, defaults to cores // workers
+    coherence (str): Coherence measure, one of coherence.COHERENCE_MEASURES
+    engine (str): Topic model engine, one of topic_modeling.LDA_ENGINES
+
+    Returns:
+    TopicSearchResult: Fitted models and coherence per evaluated k
+    """
+    if strategy not in SEARCH_STRATEGIES:
+        raise ValueError(f"Unknown search strategy {strategy!r}, expected one of {SEARCH_STRATEGIES}")
+    if engine not in LDA_ENGINES:
+        raise ValueError(f"Only {LDA_ENGINES} can be swept, the {engine!r} engine picks its own number of topics")
+    if corpus is None:
+        corpus = DocumentTermCorpus(texts)
+
+    n_cores = os.cpu_count() or 1
+    n_workers = min(n_workers or n_cores, limit - start + 1)
+    if strategy == 'grid' and patience:
+        # A batch is fitted as a whole, so batches wider than patience + 1 would fit
+        # candidates the early stop could have skipped; give the spare cores to each fit
+        n_workers = min(n_workers, patience + 1)
+    threads_per_worker = threads_per_worker or max(1, n_cores // n_workers)
+
+    sweep = _Sweep(corpus, n_workers, threads_per_worker, coherence, engine)
+    try:
+        if strategy == 'grid':
+            _grid_search(sweep, start, limit, n_workers, patience, tol)
+        elif strategy == 'coarse_to_fine':
+            _coarse_to_fine_search(sweep, start, limit)
+        else:
+            _golden_section_search(sweep, start, limit)
+    finally:
+        sweep.close()
+
+    return TopicSearchResult(sweep.models, sweep.scores)
+
+def _grid_search(sweep, start, limit, batch_size, patience, tol):
+    best, since_best = -math.inf, 0
+    candidates = list(range(start, limit + 1))
+    for i in range(0, len(candidates), batch_size):
+        batch = candidates[i:i + batch_size]
+        for score in sweep.evaluate(batch):
+            if score > best + tol:
+                best, since_best = score, 0
+            else:
+                since_best += 1
+        if patience and since_best >= patience:
+            logger.info(f"Coherence plateaued, stopping the sweep at {batch[-1]} topics")
+            break
+
+def _coarse_to_fine_search(sweep, start, limit):
+    step = max(2, (limit - start) // 4)
+    coarse = list(range(start, limit + 1, step))
+    if coarse[-1] != limit:
+        # Otherwise the top of the range could never win
+        coarse.append(limit)
+    sweep.evaluate(coarse)
+    best = max(coarse, key=sweep.score)
+    sweep.evaluate(list(range(max(start, best - step + 1), min(limit, best + step - 1) + 1)))
+
+def _golden_section_search(sweep, start, limit):
+    ratio = (math.sqrt(5) - 1) / 2
+    lo, hi = start, limit
+    while hi - lo > 2:
+        offset = max(1, round((hi - lo) * (1 - ratio)))
+        left, right = lo + offset, hi - offset
+        if left >= right:
+            break
+        left_score, right_score = sweep.evaluate([left, right])
+        if left_score < right_score:
+            lo = left
+        else:
+            hi = right
+    sweep.evaluate(list(range(lo, hi + 1)))
+
+def compute_coherence_values(texts, start=3, limit=12, step=1, corpus=None, n_workers=None, coherence='c_v',
+                             engine='sklearn'):
+    if corpus is None:
+        corpus = DocumentTermCorpus(texts)
+    candidates = list(range(start, limit + 1, step))
+    n_workers = min(n_workers or os.cpu_count() or 1, len(candidates))
     
-    if not valid_coherence_values:
+    sweep = _Sweep(corpus, n_workers, max(1, (os.cpu_count() or 1) // n_workers), coherence, engine)
+    try:
+        sweep.evaluate(candidates)
+    finally:
+        sweep.close()
+
+    return [sweep.models[k] for k in candidates], [sweep.scores[k] for k in candidates]
+
+def find_optimal_number_of_topics(texts, corpus=None, **search_kwargs):
+    result = search_number_of_topics(texts, corpus=corpus, **search_kwargs)
+
+    if result.best_num_topics is None:
         logger.warning("No valid coherence values found. Defaulting to 5 topics.")
         return 5
-    
-    optimal_num_topics = coherence_values.index(max(valid_coherence_values)) + 3  # +3 because we start from 3
-    return optimal_num_topics
+
+    return result.best_num_topics
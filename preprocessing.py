@@ -1,5 +1,9 @@
+import os
+import hashlib
 import logging
-from typing import List, Dict, Optional
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import List, Dict, FrozenSet, Iterable, Optional, Sequence
 import nltk
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
@@ -17,71 +21,137 @@ def download_nltk_data():
         print(f"Error downloading NLTK data: {e}")
         return False
 
+# Compiled once at import time instead of on every call
+_TOKEN_PATTERN = re.compile(r'\b\w+\b')
+_SOURCE_ENDING_PATTERN = re.compile(r'\s*proviene da.*$', flags=re.IGNORECASE)
+
+TOKENIZERS = ('nltk', 'regex', 'whitespace')
+
+# Bump whenever preprocess_text changes behaviour, so cached token lists are invalidated
+PREPROCESSING_VERSION = 1
+
 def simple_tokenize(text):
     # Simple tokenization by splitting on whitespace and punctuation
-    return re.findall(r'\b\w+\b', text.lower())
+    return _TOKEN_PATTERN.findall(text.lower())
 
 def remove_source_ending(text: str) -> str:
     # Pattern to match "proviene da" followed by any source name
-    pattern = r'\s*proviene da.*$'
-    return re.sub(pattern, '', text, flags=re.IGNORECASE)
+    return _SOURCE_ENDING_PATTERN.sub('', text)
+
+@lru_cache(maxsize=1)
+def get_stop_words() -> FrozenSet[str]:
+    """Italian stopwords, built once per process."""
+    return frozenset(stopwords.words('italian'))
+
+def preprocessing_config(tokenizer: str = 'nltk') -> str:
+    """
+    Fingerprint of everything that affects the output of preprocess_text.
+    """
+    parts = [str(PREPROCESSING_VERSION), tokenizer, _TOKEN_PATTERN.pattern,
+             _SOURCE_ENDING_PATTERN.pattern, ' '.join(sorted(get_stop_words()))]
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+def tokenize(text: str, tokenizer: str = 'nltk') -> List[str]:
+    if tokenizer == 'regex':
+        return simple_tokenize(text)
+    if tokenizer == 'nltk':
+        try:
+            return word_tokenize(text)
+        except Exception as e:
+            logger.error(f"NLTK tokenization failed: {e}")
+    return text.split()
 
-def preprocess_text(text: str, use_nltk: bool = True) -> List[str]:
+def preprocess_text(text: str, use_nltk: bool = True, tokenizer: Optional[str] = None) -> List[str]:
     if not isinstance(text, str):
         logger.warning(f"Expected string, got {type(text)}. Converting to string.")
         text = str(text)
     
+    if tokenizer is None:
+        tokenizer = 'nltk' if use_nltk else 'whitespace'
+    
     # Remove the source ending
     text = remove_source_ending(text)
     
     text = text.lower()
     
-    if use_nltk:
-        try:
-            tokens = word_tokenize(text)
-        except Exception as e:
-            logger.error(f"NLTK tokenization failed: {e}")
-            tokens = text.split()
-    else:
-        tokens = text.split()
+    tokens = tokenize(text, tokenizer)
     
-    stop_words = set(stopwords.words('italian'))
+    stop_words = get_stop_words()
     tokens = [token for token in tokens if token.isalpha() and token not in stop_words]
     
     return tokens
 
-def preprocess_articles(articles: List[Dict]) -> List[List[str]]:
-    preprocessed_articles = []
+def article_text(article: Dict) -> str:
+    """Combine the title and description of an article into a single string."""
+    title = article.get('title') or ''
+    description = article.get('description') or ''
+    if not isinstance(title, str):
+        title = str(title)
+    if not isinstance(description, str):
+        description = str(description)
+    return f"{title} {description}".strip()
+
+def _preprocess_chunk(texts: List[str], tokenizer: str) -> List[List[str]]:
+    return [preprocess_text(text, tokenizer=tokenizer) if text else [] for text in texts]
+
+def preprocess_texts(texts: Sequence[str], tokenizer: str = 'nltk', n_jobs: Optional[int] = 1,
+                     chunk_size: int = 2000) -> List[List[str]]:
+    """
+    Preprocess a batch of texts, returning one token list per text in input order.
+
+    Args:
+    texts (list): Texts to preprocess
+    tokenizer (str): One of 'nltk', 'regex' (fast, no punkt needed) or 'whitespace'
+    n_jobs (int): Worker processes, None or -1 for one per core
+    chunk_size (int): Texts sent to a worker at a time
+
+    Returns:
+    list: Token lists, empty for texts with no usable tokens
+    """
+    if tokenizer not in TOKENIZERS:
+        raise ValueError(f"Unknown tokenizer {tokenizer!r}, expected one of {TOKENIZERS}")
     
-    for i, article in enumerate(articles):
-        try:
-            title = article.get('title', '')
-            description = article.get('description', '')
-            
-            if not isinstance(title, str):
-                logger.warning(f"Article {i}: title is not a string. Type: {type(title)}")
-                title = str(title) if title is not None else ''
-            
-            if not isinstance(description, str):
-                logger.warning(f"Article {i}: description is not a string. Type: {type(description)}")
-                description = str(description) if description is not None else ''
-            
-            text = f"{title} {description}".strip()
-            
-            if not text:
-                logger.warning(f"Article {i}: Empty text after combining title and description")
-                continue
-            
-            tokens = preprocess_text(text, use_nltk=True)
-            
-            if tokens:
-                preprocessed_articles.append(tokens)
-            else:
-                logger.warning(f"Article {i}: No tokens after preprocessing")
-        
-        except Exception as e:
-            logger.error(f"Error processing article {i}: {e}")
+    texts = list(texts)
+    if n_jobs is None or n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+    
+    # Build the stopword set in the parent, so forked workers inherit it
+    get_stop_words()
+    
+    if n_jobs == 1 or len(texts) <= chunk_size:
+        return _preprocess_chunk(texts, tokenizer)
+    
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    with ProcessPoolExecutor(max_workers=min(n_jobs, len(chunks))) as executor:
+        results = executor.map(_preprocess_chunk, chunks, [tokenizer] * len(chunks))
+        return [tokens for chunk in results for tokens in chunk]
+
+def preprocess_articles(articles: Iterable[Dict], tokenizer: str = 'nltk', n_jobs: Optional[int] = 1,
+                        chunk_size: int = 2000, cache=None, return_indices: bool = False):
+    """
+    Preprocess the title and description of every article.
+
+    Articles with no text or no tokens left after preprocessing are dropped; with
+    `return_indices=True` the positions of the kept articles are returned as well, as
+    `(token_lists, indices)`, so results can be aligned back to the articles.
+    See `preprocess_texts` for the batching arguments; pass a `token_cache.TokenCache`
+    as `cache` to only tokenize articles that were not preprocessed before.
+    """
+    texts = [article_text(article) for article in articles]
+    if cache is not None:
+        token_lists = cache.preprocess_texts(texts, tokenizer=tokenizer, n_jobs=n_jobs, chunk_size=chunk_size)
+    else:
+        token_lists = preprocess_texts(texts, tokenizer=tokenizer, n_jobs=n_jobs, chunk_size=chunk_size)
+    
+    indices = [i for i, tokens in enumerate(token_lists) if tokens]
+    preprocessed_articles = [token_lists[i] for i in indices]
+    
+    dropped = len(texts) - len(preprocessed_articles)
+    if dropped:
+        logger.warning(f"{dropped} of {len(texts)} articles had no tokens after preprocessing")
     
+    if return_indices:
+        return preprocessed_articles, indices
     return preprocessed_articles
 
 if __name__ == "__main__":
@@ -0,0 +1,145 @@
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from sklearn.decomposition import PCA
+from sklearn.manifold import TSNE
+from sklearn.neighbors import NearestNeighbors
+
+from artifact_store import ArtifactStore
+
+logger = logging.getLogger(__name__)
+
+# Barnes-Hut t-SNE runs on at most this many documents; larger sets embed a random
+# sample of landmarks and place every other document relative to them
+TSNE_MAX_POINTS = 2000
+
+PROJECTION_SUFFIX = '.projection.npz'
+
+
+def hellinger_features(doc_topic: np.ndarray) -> np.ndarray:
+    """Square roots of the topic proportions: euclidean distance on them is the Hellinger distance."""
+    doc_topic = np.asarray(doc_topic, dtype=np.float64)
+    return np.sqrt(doc_topic / np.maximum(doc_topic.sum(axis=1, keepdims=True), 1e-12))
+
+
+def classical_mds(distances: np.ndarray, n_components: int = 2) -> np.ndarray:
+    """Classical (Torgerson) MDS: coordinates whose euclidean distances approximate `distances`."""
+    n = len(distances)
+    centering = np.eye(n) - np.full((n, n), 1.0 / n)
+    gram = -0.5 * centering @ (np.asarray(distances) ** 2) @ centering
+    eigenvalues, eigenvectors = np.linalg.eigh(gram)
+    top = np.argsort(eigenvalues)[::-1][:n_components]
+    coordinates = eigenvectors[:, top] * np.sqrt(np.maximum(eigenvalues[top], 0))
+    if coordinates.shape[1] < n_components:
+        coordinates = np.pad(coordinates, ((0, 0), (0, n_components - coordinates.shape[1])))
+    return coordinates
+
+
+def embed_points(features: np.ndarray, random_state: int = 42) -> np.ndarray:
+    """Barnes-Hut t-SNE with PCA initialization; PCA alone for sets too small for t-SNE."""
+    n = len(features)
+    if n < 5:
+        n_components = min(2, n, features.shape[1])
+        coordinates = PCA(n_components=n_components).fit_transform(features) if n > 1 else np.zeros((n, 0))
+        return np.pad(coordinates, ((0, 0), (0, 2 - coordinates.shape[1])))
+    tsne = TSNE(n_components=2, perplexity=min(30.0, (n - 1) / 3), init='pca', learning_rate='auto',
+                method='barnes_hut', random_state=random_state)
+    return tsne.fit_transform(features)
+
+
+class DocumentProjection:
+    """
+    2-D coordinates of documents in doc-topic space, extendable without refitting.
+
+    A fitted set of reference documents (every document, or landmarks for large sets)
+    keeps its t-SNE coordinates; any other document is placed at the distance-weighted
+    mean of its nearest references in Hellinger space.
+    """
+
+    def __init__(self, article_ids: Sequence[str], coordinates: np.ndarray, reference_features: np.ndarray,
+                 reference_coordinates: np.ndarray, n_neighbors: int = 10):
+        self.article_ids: List[str] = list(article_ids)
+        self._row_by_id = {article_id: row for row, article_id in enumerate(self.article_ids)}
+        self.coordinates = np.asarray(coordinates, dtype=np.float32)
+        self.reference_features = np.asarray(reference_features, dtype=np.float32)
+        self.reference_coordinates = np.asarray(reference_coordinates, dtype=np.float32)
+        self.n_neighbors = n_neighbors
+        self._neighbors = None
+
+    @classmethod
+    def fit(cls, article_ids: Sequence[str], doc_topic: np.ndarray, max_tsne_points: int = TSNE_MAX_POINTS,
+            random_state: int = 42) -> 'DocumentProjection':
+        features = hellinger_features(doc_topic)
+        n = len(features)
+        if n <= max_tsne_points:
+            coordinates = embed_points(features, random_state)
+            return cls(article_ids, coordinates, features, coordinates)
+
+        landmarks = np.random.RandomState(random_state).choice(n, max_tsne_points, replace=False)
+        reference_coordinates = embed_points(features[landmarks], random_state)
+        projection = cls([], np.empty((0, 2)), features[landmarks], reference_coordinates)
+        coordinates = projection.place(doc_topic)
+        coordinates[landmarks] = reference_coordinates
+        logger.info(f"Projected {n} documents through {max_tsne_points} t-SNE landmarks")
+        return cls(article_ids, coordinates, features[landmarks], reference_coordinates)
+
+    def place(self, doc_topic: np.ndarray) -> np.ndarray:
+        """Coordinates of new documents, interpolated from their nearest reference documents."""
+        if self._neighbors is None:
+            n_neighbors = min(self.n_neighbors, len(self.reference_features))
+            self._neighbors = NearestNeighbors(n_neighbors=n_neighbors).fit(self.reference_features)
+        distances, neighbours = self._neighbors.kneighbors(hellinger_features(doc_topic))
+        weights = 1.0 / (distances + 1e-6)
+        weights /= weights.sum(axis=1, keepdims=True)
+        return np.einsum('nk,nkd->nd', weights, self.reference_coordinates[neighbours]).astype(np.float32)
+
+    def coordinates_for(self, article_ids: Sequence[str], doc_topic: np.ndarray) -> Tuple[np.ndarray, int]:
+        """
+        Coordinates of `article_ids`, placing (and remembering) the ones not seen yet.
+
+        Returns:
+        tuple: (coordinates in input order, number of newly placed documents)
+        """
+        rows = np.array([self._row_by_id.get(article_id, -1) for article_id in article_ids], dtype=np.int64)
+        new = np.flatnonzero(rows < 0)
+        if len(new):
+            placed = self.place(np.asarray(doc_topic)[new])
+            start = len(self.article_ids)
+            for offset, i in enumerate(new):
+                self._row_by_id[article_ids[i]] = start + offset
+                self.article_ids.append(article_ids[i])
+            self.coordinates = np.vstack([self.coordinates, placed])
+            rows[new] = np.arange(start, start + len(new))
+        return self.coordinates[rows], len(new)
+
+    def save(self, path):
+        np.savez(path, article_ids=np.array(self.article_ids, dtype=str), coordinates=self.coordinates,
+                 reference_features=self.reference_features, reference_coordinates=self.reference_coordinates)
+
+    @classmethod
+    def load(cls, path) -> 'DocumentProjection':
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['article_ids'].tolist(), data['coordinates'], data['reference_features'],
+                       data['reference_coordinates'])
+
+
+def document_coordinates(analysis, store: Optional[ArtifactStore] = None) -> np.ndarray:
+    """
+    2-D coordinates of the analyzed articles, cached per model in the artifact store.
+
+    The first call for a model fits the projection. Later calls reuse it and only
+    place articles it has not seen, e.g. a wider date range analyzed with the same
+    incremental model. Analyses without a model key are projected without caching.
+    """
+    article_ids = [a.get('article_id') for a in analysis.articles]
+    if analysis.key is None:
+        return DocumentProjection.fit(article_ids, analysis.doc_topic).coordinates
+
+    store = store or ArtifactStore()
+    projection = store.load_or_compute(analysis.key, PROJECTION_SUFFIX, DocumentProjection.load,
+                                       lambda: DocumentProjection.fit(article_ids, analysis.doc_topic))
+    coordinates, n_new = projection.coordinates_for(article_ids, analysis.doc_topic)
+    if n_new:
+        store.write(analysis.key, projection.save, suffix=PROJECTION_SUFFIX)
+    return coordinates
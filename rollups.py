@@ -0,0 +1,207 @@
+import logging
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from artifact_store import ArtifactStore
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_SUFFIX = '.rollup.npz'
+
+# Bucket widths in seconds; bucket ids are whole buckets since the epoch
+BUCKET_SECONDS = {'hour': 3600, 'day': 86400}
+
+
+def publication_date(article):
+    """The article's publication timestamp, older NewsAPI-style articles call it publishedAt."""
+    return article.get('pubDate') or article.get('publishedAt')
+
+
+def _bucket_ids(timestamps: pd.DatetimeIndex, freq: str) -> np.ndarray:
+    return timestamps.values.astype('datetime64[s]').astype(np.int64) // BUCKET_SECONDS[freq]
+
+
+def _sum_by_bucket(bucket_ids, values):
+    """Unique bucket ids and the sum of `values` rows per bucket."""
+    buckets, inverse = np.unique(bucket_ids, return_inverse=True)
+    sums = np.zeros((len(buckets),) + values.shape[1:], dtype=np.float64)
+    np.add.at(sums, inverse, values)
+    return buckets, sums
+
+
+def _merge_buckets(buckets_a, values_a, buckets_b, values_b):
+    """Union of two sorted bucket series, adding the values of shared buckets."""
+    buckets = np.union1d(buckets_a, buckets_b)
+    values = np.zeros((len(buckets),) + values_a.shape[1:], dtype=np.float64)
+    values[np.searchsorted(buckets, buckets_a)] += values_a
+    values[np.searchsorted(buckets, buckets_b)] += values_b
+    return buckets, values
+
+
+class TopicRollup:
+    """
+    Topic prevalence pre-aggregated into hourly and daily buckets, with per-source counts.
+
+    For every bucket of publication time it keeps the sum of the documents' topic
+    proportions and the number of documents, so rollups of disjoint batches merge by
+    addition and the prevalence of a bucket is sum / count. Per-source article counts
+    are kept per day. `merged_keys` records the batches (e.g. collection days) already
+    added, so merging a day twice is a no-op. Trend charts over weeks read a few
+    hundred rows from here instead of every document.
+    """
+
+    def __init__(self, n_topics: int, hours=None, hourly_sums=None, hourly_counts=None, days=None,
+                 daily_sums=None, daily_counts=None, sources: Sequence[str] = (), source_counts=None,
+                 merged_keys: Iterable[str] = ()):
+        self.n_topics = n_topics
+        self.hours = np.asarray(hours if hours is not None else [], dtype=np.int64)
+        self.hourly_sums = np.asarray(hourly_sums if hourly_sums is not None else np.zeros((0, n_topics)),
+                                      dtype=np.float64)
+        self.hourly_counts = np.asarray(hourly_counts if hourly_counts is not None else [], dtype=np.float64)
+        self.days = np.asarray(days if days is not None else [], dtype=np.int64)
+        self.daily_sums = np.asarray(daily_sums if daily_sums is not None else np.zeros((0, n_topics)),
+                                     dtype=np.float64)
+        self.daily_counts = np.asarray(daily_counts if daily_counts is not None else [], dtype=np.float64)
+        self.sources = list(sources)
+        self.source_counts = np.asarray(source_counts if source_counts is not None
+                                        else np.zeros((len(self.days), len(self.sources))), dtype=np.float64)
+        self.merged_keys = set(merged_keys)
+
+    @classmethod
+    def from_documents(cls, doc_topic, pub_dates: Sequence, sources: Sequence, key: Optional[str] = None) -> 'TopicRollup':
+        """
+        Aggregate a batch of documents.
+
+        Args:
+        doc_topic (array): (n_documents, n_topics) topic proportions
+        pub_dates (list): Publication timestamp of each document (any format, naive ones are
+            taken as UTC); unparsable ones are skipped
+        sources (list): Source id of each document
+        key (str): Optional batch identifier recorded in `merged_keys`
+        """
+        doc_topic = np.asarray(doc_topic, dtype=np.float64)
+        # Sources mix formats and time zones: parse each date on its own and compare them in UTC
+        timestamps = pd.DatetimeIndex(pd.to_datetime(pd.Series(list(pub_dates), dtype=object), errors='coerce',
+                                                     format='mixed', utc=True))
+        valid = ~timestamps.isna()
+        if not valid.all():
+            logger.info(f"Rollup skipped {int((~valid).sum())} documents without a publication date")
+        doc_topic, timestamps = doc_topic[valid], timestamps[valid]
+        sources = np.array([source or 'unknown' for source in sources], dtype=object)[valid]
+        rollup = cls(doc_topic.shape[1], merged_keys=[key] if key is not None else ())
+        if not len(doc_topic):
+            return rollup
+
+        # One extra column counts the documents, so both sums come from one pass
+        values = np.column_stack([doc_topic, np.ones(len(doc_topic))])
+        hours, hourly = _sum_by_bucket(_bucket_ids(timestamps, 'hour'), values)
+        day_ids = _bucket_ids(timestamps, 'day')
+        days, daily = _sum_by_bucket(day_ids, values)
+        rollup.hours, rollup.hourly_sums, rollup.hourly_counts = hours, hourly[:, :-1], hourly[:, -1]
+        rollup.days, rollup.daily_sums, rollup.daily_counts = days, daily[:, :-1], daily[:, -1]
+
+        source_names, source_index = np.unique(sources, return_inverse=True)
+        rollup.sources = source_names.tolist()
+        rollup.source_counts = np.zeros((len(days), len(source_names)))
+        np.add.at(rollup.source_counts, (np.searchsorted(days, day_ids), source_index), 1)
+        return rollup
+
+    def merge(self, other: 'TopicRollup') -> 'TopicRollup':
+        """Add another rollup into this one, unless every batch it holds was merged already."""
+        if other.n_topics != self.n_topics:
+            raise ValueError(f"Cannot merge a {other.n_topics}-topic rollup into a {self.n_topics}-topic one")
+        if other.merged_keys and other.merged_keys <= self.merged_keys:
+            return self
+
+        hourly_a = np.column_stack([self.hourly_sums, self.hourly_counts])
+        hourly_b = np.column_stack([other.hourly_sums, other.hourly_counts])
+        self.hours, hourly = _merge_buckets(self.hours, hourly_a, other.hours, hourly_b)
+        self.hourly_sums, self.hourly_counts = hourly[:, :-1], hourly[:, -1]
+
+        sources = sorted(set(self.sources) | set(other.sources))
+        columns_a = np.searchsorted(sources, self.sources).astype(np.int64)
+        columns_b = np.searchsorted(sources, other.sources).astype(np.int64)
+        daily_a = np.column_stack([self.daily_sums, self.daily_counts, _scatter_columns(self.source_counts, columns_a, len(sources))])
+        daily_b = np.column_stack([other.daily_sums, other.daily_counts, _scatter_columns(other.source_counts, columns_b, len(sources))])
+        self.days, daily = _merge_buckets(self.days, daily_a, other.days, daily_b)
+        k = self.n_topics
+        self.daily_sums, self.daily_counts, self.source_counts = daily[:, :k], daily[:, k], daily[:, k + 1:]
+        self.sources = sources
+        self.merged_keys |= other.merged_keys
+        return self
+
+    def between(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> 'TopicRollup':
+        """The buckets published between `start_date` and `end_date` ('YYYY-MM-DD', inclusive, open if None)."""
+        first = _day_id(start_date) if start_date else np.iinfo(np.int64).min
+        last = _day_id(end_date) if end_date else np.iinfo(np.int64).max
+        hour_days = self.hours * BUCKET_SECONDS['hour'] // BUCKET_SECONDS['day']
+        hours = (hour_days >= first) & (hour_days <= last)
+        days = (self.days >= first) & (self.days <= last)
+        return TopicRollup(self.n_topics, self.hours[hours], self.hourly_sums[hours], self.hourly_counts[hours],
+                           self.days[days], self.daily_sums[days], self.daily_counts[days], self.sources,
+                           self.source_counts[days], self.merged_keys)
+
+    @property
+    def n_documents(self) -> int:
+        return int(self.daily_counts.sum())
+
+    def prevalence(self, freq: str = 'day') -> pd.DataFrame:
+        """Mean topic proportion per bucket, indexed by bucket start time."""
+        buckets, sums, counts = self._series(freq)
+        return pd.DataFrame(sums / np.maximum(counts, 1)[:, None], index=self._index(buckets, freq),
+                            columns=[f"Topic {i+1}" for i in range(self.n_topics)])
+
+    def volume(self, freq: str = 'day') -> pd.DataFrame:
+        """Expected number of articles per topic and bucket (sums of topic proportions)."""
+        buckets, sums, _ = self._series(freq)
+        return pd.DataFrame(sums, index=self._index(buckets, freq),
+                            columns=[f"Topic {i+1}" for i in range(self.n_topics)])
+
+    def source_volume(self) -> pd.DataFrame:
+        """Articles per day and source."""
+        return pd.DataFrame(self.source_counts, index=self._index(self.days, 'day'), columns=self.sources)
+
+    def save(self, path):
+        np.savez(path, n_topics=self.n_topics, hours=self.hours, hourly_sums=self.hourly_sums.astype(np.float32),
+                 hourly_counts=self.hourly_counts.astype(np.int32), days=self.days,
+                 daily_sums=self.daily_sums.astype(np.float32), daily_counts=self.daily_counts.astype(np.int32),
+                 sources=np.array(self.sources, dtype=str), source_counts=self.source_counts.astype(np.int32),
+                 merged_keys=np.array(sorted(self.merged_keys), dtype=str))
+
+    @classmethod
+    def load(cls, path) -> 'TopicRollup':
+        with np.load(path, allow_pickle=False) as data:
+            return cls(int(data['n_topics']), data['hours'], data['hourly_sums'], data['hourly_counts'],
+                       data['days'], data['daily_sums'], data['daily_counts'], data['sources'].tolist(),
+                       data['source_counts'], data['merged_keys'].tolist())
+
+    def _series(self, freq):
+        if freq == 'hour':
+            return self.hours, self.hourly_sums, self.hourly_counts
+        if freq == 'day':
+            return self.days, self.daily_sums, self.daily_counts
+        raise ValueError(f"Unknown bucket frequency {freq!r}, expected one of {tuple(BUCKET_SECONDS)}")
+
+    @staticmethod
+    def _index(buckets, freq):
+        return pd.to_datetime(buckets * BUCKET_SECONDS[freq], unit='s')
+
+
+def _scatter_columns(values, columns, n_columns):
+    out = np.zeros((values.shape[0], n_columns))
+    out[:, columns] = values
+    return out
+
+
+def _day_id(day: str) -> int:
+    return int(_bucket_ids(pd.DatetimeIndex([pd.Timestamp(day)]), 'day')[0])
+
+
+def load_or_compute_rollup(key, doc_topic, articles, store: Optional[ArtifactStore] = None) -> TopicRollup:
+    """The stored rollup of the model `key` over `articles`, computing and storing it on first use."""
+    return (store or ArtifactStore()).load_or_compute(
+        key, ROLLUP_SUFFIX, TopicRollup.load,
+        lambda: TopicRollup.from_documents(doc_topic, [publication_date(a) for a in articles],
+                                           [a.get('source_id') for a in articles]))
@@ -0,0 +1,101 @@
+import os
+import hashlib
+import sqlite3
+import logging
+from typing import List, Dict, Optional, Sequence
+
+from preprocessing import preprocess_texts, preprocessing_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join('data', 'token_cache.db')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tokens (
+    config TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    tokens TEXT NOT NULL,
+    PRIMARY KEY (config, text_hash)
+) WITHOUT ROWID;
+"""
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class TokenCache:
+    """
+    Persistent cache of preprocessed token lists.
+
+    Entries are keyed by (preprocessing config fingerprint, hash of the article text),
+    so a change to the preprocessing settings or to an article's title/description
+    simply misses the cache instead of returning stale tokens.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def get_many(self, hashes: Sequence[str], config: str) -> Dict[str, List[str]]:
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        for i in range(0, len(unique), _LOOKUP_BATCH):
+            batch = unique[i:i + _LOOKUP_BATCH]
+            placeholders = ', '.join('?' * len(batch))
+            rows = self.conn.execute(
+                f"SELECT text_hash, tokens FROM tokens WHERE config = ? AND text_hash IN ({placeholders})",
+                [config, *batch]
+            )
+            # Tokens are alphabetic, so a space-joined string round-trips exactly
+            found.update((key, tokens.split()) for key, tokens in rows)
+        return found
+
+    def put_many(self, items: Dict[str, List[str]], config: str):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO tokens (config, text_hash, tokens) VALUES (?, ?, ?)",
+                [(config, key, ' '.join(tokens)) for key, tokens in items.items()]
+            )
+
+    def purge_stale(self, config: str) -> int:
+        """Delete the entries written with any other preprocessing config."""
+        with self.conn:
+            return self.conn.execute("DELETE FROM tokens WHERE config != ?", (config,)).rowcount
+
+    def preprocess_texts(self, texts: Sequence[str], tokenizer: str = 'nltk',
+                         n_jobs: Optional[int] = 1, chunk_size: int = 2000) -> List[List[str]]:
+        """
+        Same contract as `preprocessing.preprocess_texts`, but only texts missing from
+        the cache are tokenized; their results are written back in one transaction.
+        """
+        config = preprocessing_config(tokenizer)
+        hashes = [text_hash(text) for text in texts]
+        cached = self.get_many(hashes, config)
+
+        missing = {key: text for key, text in zip(hashes, texts) if key not in cached}
+        if missing:
+            token_lists = preprocess_texts(list(missing.values()), tokenizer=tokenizer,
+                                           n_jobs=n_jobs, chunk_size=chunk_size)
+            computed = dict(zip(missing.keys(), token_lists))
+            self.put_many(computed, config)
+            cached.update(computed)
+
+        logger.info(f"Token cache: {len(texts) - len(missing)} hits, {len(missing)} misses")
+        return [cached[key] for key in hashes]
@@ -1,55 +1,411 @@
 import torch
-from torch.utils.data import DataLoader, TensorDataset
-from sklearn.feature_extraction.text import CountVectorizer
 from sklearn.decomposition import LatentDirichletAllocation
+import pickle
+import logging
+import warnings
+from contextlib import contextmanager
 import numpy as np
-from gensim.models.coherencemodel import CoherenceModel
+import scipy.sparse as sp
+from scipy.special import digamma
+from embedding_topics import EmbeddingTopicModel
 
-def compute_coherence_values(dictionary, corpus, texts, limit, start=2, step=1):
-    coherence_values = []
-    model_list = []
-    for num_topics in range(start, limit, step):
-        model = perform_topic_modeling(texts, num_topics=num_topics)[0]
-        model_list.append(model)
-        coherencemodel = CoherenceModel(model=model, texts=texts, dictionary=dictionary, coherence='c_v')
-        coherence_values.append(coherencemodel.get_coherence())
+logger = logging.getLogger(__name__)
 
-    return model_list, coherence_values
+# Bump whenever DocumentTermCorpus builds a different vocabulary, so cached models are refitted
+CORPUS_VERSION = 2
 
-def perform_topic_modeling(preprocessed_articles, num_topics=10):
-    # Use CountVectorizer for document-term matrix creation
-    vectorizer = CountVectorizer(max_df=0.95, min_df=2, stop_words='english')
-    X = vectorizer.fit_transform([' '.join(doc) for doc in preprocessed_articles])
+def document_frequencies(texts, exclude=()):
+    """Number of token lists each term occurs in, skipping single-character tokens and `exclude`."""
+    doc_freq = {}
+    for doc in texts:
+        for term in set(doc):
+            if len(term) > 1 and term not in exclude:
+                doc_freq[term] = doc_freq.get(term, 0) + 1
+    return doc_freq
 
-    # Use scikit-learn's LatentDirichletAllocation
-    lda_model = LatentDirichletAllocation(n_components=num_topics, random_state=42, n_jobs=-1)
-    lda_model.fit(X)
+class DocumentTermCorpus:
+    """
+    One vocabulary and one CSR document-term matrix built straight from token lists.
 
-    # Get feature names (words)
-    feature_names = vectorizer.get_feature_names_out()
+    Stopwords are already removed by preprocessing, so only the document frequency
+    filters of the old CountVectorizer are applied, and like its default token_pattern
+    single-character tokens are not terms. Build it once and pass it to every topic
+    model fit, the coherence sweep and the visualizations.
+    """
 
-    return lda_model, feature_names, X
+    def __init__(self, texts, min_df=2, max_df=0.95):
+        self.texts = texts
+        n_docs = len(texts)
 
-class LDA(torch.nn.Module):
-    def __init__(self, n_components, vocab_size, random_state, device):
-        super(LDA, self).__init__()
+        doc_freq = document_frequencies(texts)
+
+        # Same semantics as CountVectorizer: ints are counts, floats are proportions
+        min_count = min_df if isinstance(min_df, int) else int(np.ceil(min_df * n_docs))
+        max_count = max_df if isinstance(max_df, int) else int(max_df * n_docs)
+        terms = sorted(t for t, df in doc_freq.items() if min_count <= df <= max_count)
+        if not terms:
+            raise ValueError("After pruning, no terms remain. Try a lower min_df or a higher max_df.")
+
+        self.feature_names = np.array(terms, dtype=object)
+        self.vocabulary_ = {term: i for i, term in enumerate(terms)}
+        self.doc_freq = np.array([doc_freq[t] for t in terms], dtype=np.int64)
+        self.X = self.transform(texts)
+
+    @property
+    def n_documents(self):
+        return self.X.shape[0]
+
+    @property
+    def n_terms(self):
+        return len(self.feature_names)
+
+    def transform(self, texts):
+        """Count matrix of new token lists over this corpus' vocabulary."""
+        return count_matrix(texts, self.vocabulary_)
+
+def count_matrix(texts, vocabulary):
+    """CSR count matrix of token lists, ignoring tokens missing from `vocabulary`."""
+    rows, cols = [], []
+    for i, doc in enumerate(texts):
+        ids = [vocabulary[t] for t in doc if t in vocabulary]
+        cols.extend(ids)
+        rows.extend([i] * len(ids))
+    data = np.ones(len(cols), dtype=np.int64)
+    X = sp.csr_matrix((data, (rows, cols)), shape=(len(texts), len(vocabulary)))
+    X.sum_duplicates()
+    return X
+
+# Engines fitted on the document-term matrix alone, the ones the topic number search can sweep
+LDA_ENGINES = ('sklearn', 'torch')
+TOPIC_ENGINES = LDA_ENGINES + ('embedding',)
+
+def make_topic_model(engine='sklearn', num_topics=10, n_threads=None, random_state=42):
+    """
+    Unfitted topic model for one of TOPIC_ENGINES.
+
+    `n_threads` is the parallelism of a single fit: joblib workers for sklearn,
+    intra-op threads for torch (None lets each library decide). The 'embedding'
+    engine clusters sentence embeddings, so its `fit` also takes them.
+    """
+    if engine == 'sklearn':
+        return LatentDirichletAllocation(n_components=num_topics, random_state=random_state, n_jobs=n_threads or -1)
+    if engine == 'torch':
+        return LDA(n_components=num_topics, random_state=random_state, n_threads=n_threads)
+    if engine == 'embedding':
+        return EmbeddingTopicModel(n_components=num_topics, random_state=random_state)
+    raise ValueError(f"Unknown topic engine {engine!r}, expected one of {TOPIC_ENGINES}")
+
+def perform_topic_modeling(preprocessed_articles, num_topics=10, corpus=None, engine='sklearn', embeddings=None):
+    # Reuse the caller's document-term matrix when one is given
+    if corpus is None:
+        corpus = DocumentTermCorpus(preprocessed_articles)
+    X = corpus.X
+
+    if engine == 'embedding' and embeddings is None:
+        raise ValueError("The 'embedding' engine clusters article embeddings, pass one per row of the corpus")
+
+    lda_model = make_topic_model(engine, num_topics)
+    if engine == 'embedding':
+        lda_model.fit(X, embeddings)
+    else:
+        lda_model.fit(X)
+
+    return lda_model, corpus.feature_names, X
+
+class IncrementalTopicModel:
+    """
+    Online LDA that folds in new articles as they are collected instead of refitting.
+
+    `folded_ids` records every article folded in so far, so a batch can be restricted
+    to the articles collected since the last update. The vocabulary grows as new terms
+    show up (a term is added once it appears in at least `min_df` documents of a batch),
+    and before every update the learned topic-word weights are shrunk towards the prior
+    by `decay`, so older news gradually fades out. An update costs time proportional to
+    the new documents only.
+    """
+
+    def __init__(self, num_topics=10, decay=0.9, min_df=2, batch_size=128, passes=1, random_state=42):
+        self.decay = decay
+        self.min_df = min_df
+        self.passes = passes
+        self.vocabulary_ = {}
+        self.corpus_version = CORPUS_VERSION
+        self.folded_ids = set()
+        self.n_documents_ = 0.0
+        self.lda = LatentDirichletAllocation(n_components=num_topics, learning_method='online',
+                                             batch_size=batch_size, random_state=random_state)
+        self._rng = np.random.RandomState(random_state)
+
+    @property
+    def n_components(self):
+        return self.lda.n_components
+
+    @property
+    def components_(self):
+        return self.lda.components_
+
+    @property
+    def feature_names(self):
+        return np.array(list(self.vocabulary_), dtype=object)
+
+    def vectorize(self, texts):
+        return count_matrix(texts, self.vocabulary_)
+
+    def transform(self, X):
+        return self.lda.transform(X)
+
+    def unseen(self, articles):
+        """The articles none of whose syndicated copies were folded in yet."""
+        return [a for a in articles
+                if self.folded_ids.isdisjoint(a.get('syndicated_ids') or [a['article_id']])]
+
+    def partial_fit(self, texts, article_ids=()):
+        """
+        Fold a batch of token lists into the model.
+
+        Args:
+        texts (list): Preprocessed token lists of the new articles
+        article_ids (list): Ids of the batch's articles (including those without tokens),
+            recorded in `folded_ids` once the batch is learned
+
+        Returns:
+        IncrementalTopicModel: self
+        """
+        self._grow_vocabulary(texts)
+        if not self.vocabulary_:
+            # sklearn can't fit an empty vocabulary; the articles stay unseen and are
+            # retried with the next batch
+            logger.warning(f"No term of {len(texts)} articles reaches min_df={self.min_df}, skipping the batch")
+            return self
+
+        if texts:
+            X = self.vectorize(texts)
+
+            if hasattr(self.lda, 'components_'):
+                self._fade()
+
+            self.n_documents_ = self.decay * self.n_documents_ + X.shape[0]
+            self.lda.total_samples = max(self.n_documents_, X.shape[0])
+            for _ in range(self.passes):
+                self.lda.partial_fit(X)
+
+        self.folded_ids.update(article_ids)
+        return self
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def _grow_vocabulary(self, texts):
+        doc_freq = document_frequencies(texts, exclude=self.vocabulary_)
+        new_terms = sorted(t for t, df in doc_freq.items() if df >= self.min_df)
+        if not new_terms:
+            return
+
+        for term in new_terms:
+            self.vocabulary_[term] = len(self.vocabulary_)
+
+        if hasattr(self.lda, 'components_'):
+            # New columns start like sklearn's own random initialization
+            new_columns = self._rng.gamma(100.0, 0.01, (self.n_components, len(new_terms)))
+            self.lda.components_ = np.hstack([self.lda.components_, new_columns])
+            self.lda.n_features_in_ = len(self.vocabulary_)
+            self._refresh_dirichlet_component()
+
+    def _fade(self):
+        prior = self.lda.topic_word_prior_
+        self.lda.components_ = prior + self.decay * (self.lda.components_ - prior)
+        self._refresh_dirichlet_component()
+
+    def _refresh_dirichlet_component(self):
+        components = self.lda.components_
+        self.lda.exp_dirichlet_component_ = np.exp(
+            digamma(components) - digamma(components.sum(axis=1))[:, np.newaxis]
+        )
+
+class LDA:
+    """
+    Variational Bayes LDA in torch, a drop-in alternative to sklearn's
+    LatentDirichletAllocation on CPU.
+
+    Implements the same updates as sklearn (Hoffman et al., online VB), but the E-step
+    works on a whole mini-batch at once and only touches the non-zero entries of the
+    sparse document-term matrix. Exposes `components_`, `n_components`, `transform` and
+    `perplexity`, so the rest of the pipeline can use either engine.
+    """
+
+    def __init__(self, n_components=10, doc_topic_prior=None, topic_word_prior=None,
+                 learning_method='batch', learning_decay=0.7, learning_offset=10.0,
+                 max_iter=10, batch_size=128, inference_batch_size=4096, max_doc_update_iter=100,
+                 mean_change_tol=1e-3, n_threads=None, random_state=None, device='cpu', dtype=torch.float32):
         self.n_components = n_components
-        self.vocab_size = vocab_size
+        self.doc_topic_prior = doc_topic_prior
+        self.topic_word_prior = topic_word_prior
+        self.learning_method = learning_method
+        self.learning_decay = learning_decay
+        self.learning_offset = learning_offset
+        self.max_iter = max_iter
+        self.batch_size = batch_size
+        # Batch-mode E-steps and transform don't update the model between chunks, so they
+        # use much larger chunks to amortize per-operation overhead
+        self.inference_batch_size = inference_batch_size
+        self.max_doc_update_iter = max_doc_update_iter
+        self.mean_change_tol = mean_change_tol
+        self.n_threads = n_threads
         self.random_state = random_state
-        self.device = device
-        self.beta = torch.nn.Parameter(torch.randn(n_components, vocab_size, device=device))
-        self.theta = None
-        self.components_ = None
-
-    def forward(self, X):
-        batch_size = X.shape[0]
-        self.theta = torch.softmax(torch.randn(batch_size, self.n_components, device=self.device), dim=1)
-        for _ in range(10):  # You can adjust the number of iterations
-            phi = torch.softmax(self.beta, dim=1)
-            self.theta = torch.softmax(X @ phi.T, dim=1)
-        self.components_ = phi.T
-        return X @ phi.T
-
-    def fit(self, X):
-        self(X)
-        return self
\ No newline at end of file
+        self.device = torch.device(device)
+        self.dtype = dtype
+
+    @property
+    def components_(self):
+        return self._lambda.cpu().numpy()
+
+    @classmethod
+    def from_components(cls, components, doc_topic_prior=None, **kwargs):
+        """Inference-only model around topic-word weights fitted elsewhere (either engine)."""
+        model = cls(n_components=components.shape[0], doc_topic_prior=doc_topic_prior, **kwargs)
+        model.doc_topic_prior_ = doc_topic_prior or 1.0 / model.n_components
+        model.random_state_ = np.random.RandomState(model.random_state)
+        model._lambda = torch.as_tensor(components, dtype=model.dtype, device=model.device)
+        return model
+
+    def fit(self, X, y=None):
+        X = sp.csr_matrix(X)
+        n_samples, n_features = X.shape
+        self.random_state_ = np.random.RandomState(self.random_state)
+        self.doc_topic_prior_ = self.doc_topic_prior or 1.0 / self.n_components
+        self.topic_word_prior_ = self.topic_word_prior or 1.0 / self.n_components
+
+        with self._threads():
+            # Same initialization as sklearn, drawn from numpy so seeding is deterministic
+            init = self.random_state_.gamma(100.0, 0.01, (self.n_components, n_features))
+            self._lambda = torch.as_tensor(init, dtype=self.dtype, device=self.device)
+            self.n_batch_iter_ = 1
+
+            for _ in range(self.max_iter):
+                if self.learning_method == 'online':
+                    for start in range(0, n_samples, self.batch_size):
+                        batch = X[start:start + self.batch_size]
+                        _, sstats = self._e_step(batch, compute_sstats=True)
+                        self._online_m_step(sstats, n_samples, batch.shape[0])
+                else:
+                    sstats = torch.zeros_like(self._lambda)
+                    for start in range(0, n_samples, self.inference_batch_size):
+                        sstats += self._e_step(X[start:start + self.inference_batch_size], compute_sstats=True)[1]
+                    self._lambda = self.topic_word_prior_ + sstats
+            self.n_iter_ = self.max_iter
+        return self
+
+    def transform(self, X):
+        """Normalized document-topic distribution of every row of X."""
+        X = sp.csr_matrix(X)
+        with self._threads():
+            gammas = [self._e_step(X[start:start + self.inference_batch_size])[0]
+                      for start in range(0, X.shape[0], self.inference_batch_size)]
+        gamma = torch.cat(gammas).cpu().numpy() if gammas else np.empty((0, self.n_components))
+        return gamma / gamma.sum(axis=1, keepdims=True)
+
+    def fit_transform(self, X, y=None):
+        return self.fit(X).transform(X)
+
+    def perplexity(self, X):
+        return topic_model_perplexity(self, X)
+
+    def _e_step(self, X, compute_sstats=False):
+        n_docs = X.shape[0]
+        tiny = torch.finfo(self.dtype).tiny
+        exp_elog_beta = self._exp_dirichlet_expectation(self._lambda)
+        exp_elog_beta_t = exp_elog_beta.T.contiguous()
+
+        if compute_sstats:
+            init = self.random_state_.gamma(100.0, 0.01, (n_docs, self.n_components))
+            gamma = torch.as_tensor(init, dtype=self.dtype, device=self.device)
+        else:
+            # Like sklearn, inference starts from a flat distribution so transform is deterministic
+            gamma = torch.ones((n_docs, self.n_components), dtype=self.dtype, device=self.device)
+        exp_elog_theta = self._exp_dirichlet_expectation(gamma)
+
+        # Documents whose gamma has converged are dropped from the following iterations
+        active = np.arange(n_docs)
+        X_active = X
+        for _ in range(self.max_doc_update_iter):
+            pattern = self._to_csr_tensor(X_active, np.ones_like(X_active.data))
+            theta = exp_elog_theta[active]
+            # phi normalizer, only for the (doc, word) pairs that actually occur (SDDMM)
+            phinorm = torch.sparse.sampled_addmm(pattern, theta, exp_elog_beta, beta=0.0).values() + tiny
+            counts = torch.as_tensor(X_active.data, dtype=self.dtype, device=self.device)
+            weighted = self._to_csr_tensor(X_active, counts / phinorm)
+            new_gamma = self.doc_topic_prior_ + theta * (weighted @ exp_elog_beta_t)
+
+            change = torch.mean(torch.abs(new_gamma - gamma[active]), dim=1).cpu().numpy()
+            gamma[active] = new_gamma
+            exp_elog_theta[active] = self._exp_dirichlet_expectation(new_gamma)
+
+            converged = change < self.mean_change_tol
+            if converged.all():
+                break
+            if converged.any():
+                active = active[~converged]
+                X_active = X[active]
+
+        if not compute_sstats:
+            return gamma, None
+
+        coo = X.tocoo()
+        rows = torch.as_tensor(coo.row, dtype=torch.long, device=self.device)
+        cols = torch.as_tensor(coo.col, dtype=torch.long, device=self.device)
+        counts = torch.as_tensor(coo.data, dtype=self.dtype, device=self.device)
+        theta_nz = exp_elog_theta[rows]
+        phinorm = (theta_nz * exp_elog_beta_t[cols]).sum(dim=1) + tiny
+        sstats = torch.zeros_like(self._lambda)
+        sstats.index_add_(1, cols, (theta_nz * (counts / phinorm)[:, None]).T)
+        return gamma, sstats * exp_elog_beta
+
+    def _to_csr_tensor(self, X, values):
+        values = torch.as_tensor(values, dtype=self.dtype, device=self.device)
+        # The E-step relies on sparse CSR kernels, which torch still flags as beta
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', message='Sparse CSR tensor support is in beta')
+            return torch.sparse_csr_tensor(
+                torch.as_tensor(X.indptr, dtype=torch.long, device=self.device),
+                torch.as_tensor(X.indices, dtype=torch.long, device=self.device),
+                values, size=X.shape, check_invariants=False
+            )
+
+    def _online_m_step(self, sstats, total_samples, batch_size):
+        weight = np.power(self.learning_offset + self.n_batch_iter_, -self.learning_decay)
+        self._lambda = (1 - weight) * self._lambda + weight * (
+            self.topic_word_prior_ + sstats * (total_samples / batch_size)
+        )
+        self.n_batch_iter_ += 1
+
+    @staticmethod
+    def _exp_dirichlet_expectation(alpha):
+        return torch.exp(torch.digamma(alpha) - torch.digamma(alpha.sum(dim=1, keepdim=True)))
+
+    @contextmanager
+    def _threads(self):
+        previous = torch.get_num_threads()
+        if self.n_threads:
+            torch.set_num_threads(self.n_threads)
+        try:
+            yield
+        finally:
+            torch.set_num_threads(previous)
+
+def topic_model_perplexity(model, X):
+    """
+    Per-word perplexity of X under a fitted model's point estimates, comparable across
+    engines: exp(-sum(x_dw * log(theta_d . beta_w)) / sum(x)).
+    """
+    X = sp.csr_matrix(X)
+    theta = model.transform(X)
+    beta = model.components_ / model.components_.sum(axis=1, keepdims=True)
+    coo = X.tocoo()
+    word_prob = np.einsum('ij,ij->i', theta[coo.row], beta[:, coo.col].T)
+    return float(np.exp(-np.sum(coo.data * np.log(word_prob + 1e-100)) / coo.data.sum()))
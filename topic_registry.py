@@ -0,0 +1,237 @@
+import os
+import json
+import sqlite3
+import logging
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import linear_sum_assignment
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGISTRY_PATH = os.path.join('data', 'topic_registry.db')
+
+# Terms kept in the sparse vector of a topic
+REGISTRY_TOP_TERMS = 30
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS topics (
+    topic_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    first_day TEXT NOT NULL,
+    last_day TEXT NOT NULL,
+    days_seen INTEGER NOT NULL DEFAULT 1,
+    parent_id INTEGER,
+    terms TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lineage (
+    day TEXT NOT NULL,
+    model_key TEXT NOT NULL,
+    topic_index INTEGER NOT NULL,
+    topic_id INTEGER NOT NULL REFERENCES topics (topic_id),
+    similarity REAL,
+    event TEXT NOT NULL,
+    engine TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (day, model_key, topic_index)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_lineage_topic ON lineage (topic_id, day);
+"""
+
+# Registries created before lineage was scoped by engine
+_ADD_ENGINE = "ALTER TABLE lineage ADD COLUMN engine TEXT NOT NULL DEFAULT ''"
+_ENGINE_INDEX = "CREATE INDEX IF NOT EXISTS idx_lineage_day_engine ON lineage (day, engine)"
+
+
+def _term_vectors(term_weights: Sequence[Dict[str, float]], vocabulary: Dict[str, int]) -> sp.csr_matrix:
+    """L2-normalized sparse rows over `vocabulary`."""
+    rows, cols, values = [], [], []
+    for row, weights in enumerate(term_weights):
+        for term, weight in weights.items():
+            rows.append(row)
+            cols.append(vocabulary[term])
+            values.append(weight)
+    matrix = sp.csr_matrix((values, (rows, cols)), shape=(len(term_weights), len(vocabulary)))
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1))).ravel()
+    return sp.diags(1.0 / np.maximum(norms, 1e-12)) @ matrix
+
+
+def _top_terms(weights: Dict[str, float], n_top: int) -> Dict[str, float]:
+    top = sorted(weights.items(), key=lambda item: -item[1])[:n_top]
+    total = sum(weight for _, weight in top) or 1.0
+    return {term: weight / total for term, weight in top}
+
+
+class TopicRegistry:
+    """
+    Persistent topic IDs across independently fitted daily models.
+
+    Each registered topic keeps a sparse vector of its top terms. Aligning a day
+    compares only that day's topics with the topics active around it, i.e. seen within
+    `retire_after_days` of it (cosine over the top-term vectors), and solves the
+    Hungarian assignment, so the cost depends on the number of topics of a few days,
+    never on the length of the history. Days can be aligned in any order. Matches below
+    `min_similarity` get a new ID; the closest active topic above `parent_similarity`
+    is recorded as its parent. A matched topic's vector moves towards the day's terms
+    by `update_rate`, once per day. Every assignment is written to the `lineage` table,
+    and a topic's `first_day`, `last_day` and `days_seen` are derived from it.
+
+    A day has one authoritative model per engine: aligning a new model for the same
+    (day, engine), e.g. refitted after more articles were collected, replaces the
+    lineage of the previous one.
+    """
+
+    def __init__(self, path: str = DEFAULT_REGISTRY_PATH, min_similarity: float = 0.3,
+                 parent_similarity: float = 0.1, update_rate: float = 0.5, retire_after_days: int = 7,
+                 n_top: int = REGISTRY_TOP_TERMS):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.min_similarity = min_similarity
+        self.parent_similarity = parent_similarity
+        self.update_rate = update_rate
+        self.retire_after_days = retire_after_days
+        self.n_top = n_top
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(_SCHEMA)
+        if 'engine' not in [column[1] for column in self.conn.execute("PRAGMA table_info(lineage)")]:
+            self.conn.execute(_ADD_ENGINE)
+        self.conn.execute(_ENGINE_INDEX)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def align(self, day: str, model_key: str, top_words, top_weights, engine: str = '') -> List[int]:
+        """
+        Map the topics of the model fitted on `day` to registry IDs, registering new ones.
+
+        Aligning the same (day, model) again returns the stored mapping. Aligning another
+        model of the same (day, engine) supersedes the previous one: its lineage is
+        replaced, and the topics it registered that nothing else refers to are dropped.
+
+        Args:
+        day (str): Day the model was fitted on, 'YYYY-MM-DD'
+        model_key (str): Artifact key of the model
+        top_words (array): (k, n) top terms of each topic, best first
+        top_weights (array): (k, n) their weights
+        engine (str): Topic model engine the model was fitted with
+
+        Returns:
+        list: Registry topic ID of each of the k topics
+        """
+        stored = self.topic_ids(day, model_key)
+        if stored is not None:
+            return stored
+
+        # Topics already matched on this day (by another engine or a superseded model) keep their terms
+        seen_today = {topic_id for topic_id, in self.conn.execute(
+            "SELECT topic_id FROM lineage WHERE day = ?", (day,))}
+        # The superseded topics stay matchable, so a refit of the day keeps its IDs
+        superseded = [topic_id for topic_id, in self.conn.execute(
+            "SELECT topic_id FROM lineage WHERE day = ? AND engine = ?", (day, engine))]
+        with self.conn:
+            self.conn.execute("DELETE FROM lineage WHERE day = ? AND engine = ?", (day, engine))
+
+        day_topics = [_top_terms(dict(zip(words[:self.n_top], map(float, weights[:self.n_top]))), self.n_top)
+                      for words, weights in zip(top_words, top_weights)]
+        active = self._active(day, superseded)
+        active_ids = [topic_id for topic_id, _ in active]
+        active_terms = [json.loads(terms) for _, terms in active]
+
+        similarity = np.zeros((len(day_topics), len(active)))
+        assigned = {}
+        if active:
+            terms = {term for weights in day_topics + active_terms for term in weights}
+            vocabulary = {term: i for i, term in enumerate(sorted(terms))}
+            similarity = (_term_vectors(day_topics, vocabulary) @ _term_vectors(active_terms, vocabulary).T).toarray()
+            rows, cols = linear_sum_assignment(similarity, maximize=True)
+            assigned = {row: col for row, col in zip(rows, cols) if similarity[row, col] >= self.min_similarity}
+
+        topic_ids, lineage = [], []
+        with self.conn:
+            for index, terms in enumerate(day_topics):
+                if index in assigned:
+                    col = assigned[index]
+                    topic_id = active_ids[col]
+                    if topic_id not in seen_today:
+                        merged = {term: (1 - self.update_rate) * weight for term, weight in active_terms[col].items()}
+                        for term, weight in terms.items():
+                            merged[term] = merged.get(term, 0.0) + self.update_rate * weight
+                        self.conn.execute("UPDATE topics SET terms = ? WHERE topic_id = ?",
+                                          (json.dumps(_top_terms(merged, self.n_top)), topic_id))
+                    lineage.append((day, model_key, index, topic_id, float(similarity[index, col]), 'matched'))
+                else:
+                    parent_id = None
+                    if active and similarity[index].max() >= self.parent_similarity:
+                        parent_id = active_ids[int(similarity[index].argmax())]
+                    cursor = self.conn.execute(
+                        "INSERT INTO topics (first_day, last_day, parent_id, terms) VALUES (?, ?, ?, ?)",
+                        (day, day, parent_id, json.dumps(terms)))
+                    topic_id = cursor.lastrowid
+                    best = float(similarity[index].max()) if active else None
+                    lineage.append((day, model_key, index, topic_id, best, 'new'))
+                topic_ids.append(topic_id)
+            self.conn.executemany(
+                "INSERT INTO lineage (day, model_key, topic_index, topic_id, similarity, event, engine) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", [row + (engine,) for row in lineage])
+            self._refresh(set(topic_ids) | set(superseded))
+            self.conn.execute("DELETE FROM topics WHERE topic_id NOT IN (SELECT topic_id FROM lineage)")
+            self.conn.execute("UPDATE topics SET parent_id = NULL WHERE parent_id NOT IN (SELECT topic_id FROM topics)")
+
+        n_new = sum(1 for row in lineage if row[-1] == 'new')
+        logger.info(f"Aligned {len(topic_ids)} topics of {day}: {len(topic_ids) - n_new} matched, "
+                    f"{n_new} new, {len(active)} active around it")
+        return topic_ids
+
+    def topic_ids(self, day: str, model_key: str) -> Optional[List[int]]:
+        """The registry IDs assigned to a model's topics, or None if it was never aligned."""
+        rows = self.conn.execute("SELECT topic_id FROM lineage WHERE day = ? AND model_key = ? ORDER BY topic_index",
+                                 (day, model_key)).fetchall()
+        return [topic_id for topic_id, in rows] if rows else None
+
+    def describe(self, topic_ids: Sequence[int]) -> List[Dict]:
+        """Registry entries of `topic_ids`, in order, with their top terms."""
+        placeholders = ', '.join('?' * len(topic_ids))
+        cursor = self.conn.execute(
+            f"SELECT topic_id, first_day, last_day, days_seen, parent_id, terms FROM topics "
+            f"WHERE topic_id IN ({placeholders})", list(topic_ids))
+        names = [d[0] for d in cursor.description]
+        found = {row[0]: dict(zip(names, row)) for row in cursor}
+        for entry in found.values():
+            entry['terms'] = list(json.loads(entry['terms']))
+        return [found[topic_id] for topic_id in topic_ids if topic_id in found]
+
+    def history(self, topic_id: int) -> List[Dict]:
+        """Every day a topic was seen on, with the local topic index and match similarity."""
+        cursor = self.conn.execute(
+            "SELECT day, model_key, topic_index, similarity, event FROM lineage WHERE topic_id = ? ORDER BY day",
+            (topic_id,))
+        names = [d[0] for d in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+    def _active(self, day: str, extra_ids: Sequence[int] = ()):
+        """(topic_id, terms) of the topics seen within `retire_after_days` of `day`, plus `extra_ids`."""
+        ordinal = date.fromisoformat(day).toordinal()
+        first = date.fromordinal(ordinal - self.retire_after_days).isoformat()
+        last = date.fromordinal(ordinal + self.retire_after_days).isoformat()
+        placeholders = ', '.join('?' * len(extra_ids))
+        return self.conn.execute(
+            f"SELECT topic_id, terms FROM topics WHERE topic_id IN "
+            f"(SELECT topic_id FROM lineage WHERE day BETWEEN ? AND ?) OR topic_id IN ({placeholders}) "
+            f"ORDER BY topic_id", [first, last, *extra_ids]).fetchall()
+
+    def _refresh(self, topic_ids):
+        """Recount `first_day`, `last_day` and `days_seen` of `topic_ids` from their lineage."""
+        self.conn.executemany(
+            "UPDATE topics SET "
+            "days_seen = (SELECT COUNT(DISTINCT day) FROM lineage WHERE lineage.topic_id = topics.topic_id), "
+            "first_day = COALESCE((SELECT MIN(day) FROM lineage WHERE lineage.topic_id = topics.topic_id), first_day), "
+            "last_day = COALESCE((SELECT MAX(day) FROM lineage WHERE lineage.topic_id = topics.topic_id), last_day) "
+            "WHERE topic_id = ?", [(topic_id,) for topic_id in topic_ids])
@@ -0,0 +1,163 @@
+import json
+import logging
+from typing import Optional
+
+import numpy as np
+import scipy.sparse as sp
+import networkx as nx
+
+from artifact_store import ArtifactStore
+from projection import classical_mds
+
+logger = logging.getLogger(__name__)
+
+METRICS = ('jensenshannon', 'hellinger')
+
+# Every topic keeps an edge to its few most similar topics, so the network stays
+# readable (and the layout cheap) with hundreds of topics
+DEFAULT_TOP_K = 3
+
+NETWORK_SUFFIX = '.network.npz'
+
+# Jensen-Shannon works on (rows x topics x terms) blocks of at most this many values
+_JS_BLOCK_VALUES = 1 << 22
+
+
+def topic_distributions(components) -> np.ndarray:
+    """Rows of a topic-term weight matrix normalized to probability distributions."""
+    components = np.asarray(components, dtype=np.float64)
+    return components / np.maximum(components.sum(axis=1, keepdims=True), 1e-12)
+
+
+def _entropy(p):
+    # Entropy in bits along the last axis; the tiny offset makes 0 * log(0) come out as 0
+    return -np.einsum('...v,...v->...', p, np.log2(p + 1e-30))
+
+
+def topic_distances(topic_term, metric: str = 'jensenshannon') -> np.ndarray:
+    """
+    Pairwise distances between the rows of `topic_term`, both metrics bounded by [0, 1].
+
+    Hellinger is a single matrix product of the square roots (1 minus the Bhattacharyya
+    coefficient). Jensen-Shannon is H(m) - (H(p) + H(q)) / 2 in bits, with the mixture
+    entropies computed a block of rows at a time against every topic at once.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric!r}, expected one of {METRICS}")
+    topic_term = topic_distributions(topic_term)
+    n_topics, n_terms = topic_term.shape
+
+    if metric == 'hellinger':
+        roots = np.sqrt(topic_term)
+        divergence = 1.0 - roots @ roots.T
+    else:
+        # O(k^2 V) logarithms, so the mixtures are done in float32
+        halves = (0.5 * topic_term).astype(np.float32)
+        entropies = _entropy(topic_term)
+        mixture_entropies = np.empty((n_topics, n_topics))
+        block = max(1, _JS_BLOCK_VALUES // max(n_topics * n_terms, 1))
+        for start in range(0, n_topics, block):
+            mixtures = halves[start:start + block, None, :] + halves[None, :, :]
+            mixture_entropies[start:start + block] = _entropy(mixtures)
+        divergence = mixture_entropies - 0.5 * (entropies[:, None] + entropies[None, :])
+
+    distances = np.sqrt(np.clip(divergence, 0.0, 1.0))
+    np.fill_diagonal(distances, 0.0)
+    return distances
+
+
+def similarity_edges(distances, top_k: Optional[int] = DEFAULT_TOP_K, min_similarity: float = 0.0) -> sp.coo_matrix:
+    """
+    Sparse upper-triangular matrix of the edges kept in the similarity network.
+
+    Each topic keeps its `top_k` nearest topics (None keeps every pair); edges with a
+    similarity (1 - distance) below `min_similarity` are dropped.
+    """
+    distances = np.asarray(distances)
+    n = len(distances)
+    if n < 2:
+        return sp.coo_matrix((n, n))
+    masked = distances + np.diag(np.full(n, np.inf))
+    if top_k is None or top_k >= n - 1:
+        rows, cols = np.triu_indices(n, k=1)
+    else:
+        neighbours = np.argpartition(masked, top_k - 1, axis=1)[:, :top_k]
+        rows = np.repeat(np.arange(n), top_k)
+        cols = neighbours.ravel()
+        rows, cols = np.minimum(rows, cols), np.maximum(rows, cols)
+        rows, cols = np.unique(np.stack([rows, cols]), axis=1)
+
+    similarity = 1.0 - distances[rows, cols]
+    keep = similarity >= min_similarity
+    return sp.coo_matrix((similarity[keep], (rows[keep], cols[keep])), shape=(n, n))
+
+
+class TopicNetwork:
+    """Edges and a fixed 2-D layout of the topic similarity network of one model."""
+
+    def __init__(self, edges: sp.coo_matrix, positions: np.ndarray, settings: dict):
+        self.edges = sp.coo_matrix(edges)
+        self.positions = np.asarray(positions, dtype=np.float64)
+        self.settings = settings
+
+    @classmethod
+    def from_distances(cls, distances, metric: str = 'jensenshannon', top_k: Optional[int] = DEFAULT_TOP_K,
+                       min_similarity: float = 0.0, seed: int = 42) -> 'TopicNetwork':
+        """
+        Build the network from pairwise topic distances and lay it out once.
+
+        The spring layout starts from the classical MDS map of the distances and uses a
+        fixed seed, so the same model always gets the same picture.
+        """
+        distances = np.asarray(distances)
+        edges = similarity_edges(distances, top_k, min_similarity)
+        graph = nx.Graph()
+        graph.add_nodes_from(range(len(distances)))
+        graph.add_weighted_edges_from(zip(edges.row.tolist(), edges.col.tolist(), edges.data.tolist()))
+        initial = classical_mds(distances)
+        positions = nx.spring_layout(graph, pos=dict(enumerate(initial)), weight='weight', seed=seed)
+        settings = dict(metric=metric, top_k=top_k, min_similarity=min_similarity, seed=seed)
+        return cls(edges, np.array([positions[i] for i in range(len(distances))]), settings)
+
+    @property
+    def degrees(self) -> np.ndarray:
+        n = self.positions.shape[0]
+        return np.bincount(np.concatenate([self.edges.row, self.edges.col]), minlength=n)
+
+    def save(self, path):
+        np.savez(path, rows=self.edges.row, cols=self.edges.col, similarity=self.edges.data,
+                 positions=self.positions, settings=np.array(json.dumps(self.settings)))
+
+    @classmethod
+    def load(cls, path) -> 'TopicNetwork':
+        with np.load(path, allow_pickle=False) as data:
+            n = data['positions'].shape[0]
+            edges = sp.coo_matrix((data['similarity'], (data['rows'], data['cols'])), shape=(n, n))
+            return cls(edges, data['positions'], json.loads(str(data['settings'])))
+
+
+def topic_network(analysis, metric: str = 'jensenshannon', top_k: Optional[int] = DEFAULT_TOP_K,
+                  min_similarity: float = 0.0, store: Optional[ArtifactStore] = None) -> TopicNetwork:
+    """
+    The similarity network of the analyzed model, cached per model in the artifact store.
+
+    A stored network built with other settings is replaced. Analyses without a model
+    key are computed without caching. Jensen-Shannon distances come from the topic summary.
+    """
+    def build():
+        if metric == 'jensenshannon':
+            distances = analysis.summary.distances
+        else:
+            distances = topic_distances(analysis.model.components_, metric)
+        return TopicNetwork.from_distances(distances, metric, top_k, min_similarity)
+
+    if analysis.key is None:
+        return build()
+
+    def load(path):
+        network = TopicNetwork.load(path)
+        if network.settings == dict(network.settings, metric=metric, top_k=top_k, min_similarity=min_similarity):
+            return network
+        return None
+
+    return (store or ArtifactStore()).load_or_compute(analysis.key, NETWORK_SUFFIX, load, build)
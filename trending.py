@@ -0,0 +1,230 @@
+"""
+Streaming burst detection for terms and bigrams, ahead of any topic model.
+
+Usage:
+    python trending.py --start 2024-10-24 --end 2024-10-26
+"""
+import os
+import json
+import hashlib
+import logging
+import argparse
+from collections import Counter, deque
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRENDS_PATH = os.path.join('data', 'trends.npz')
+
+# 4 x 32768 int32 counters (512 KB) per bucket; with a few hundred thousand distinct
+# terms and bigrams per day the overestimate of a count stays within a few occurrences
+SKETCH_WIDTH = 1 << 15
+SKETCH_DEPTH = 4
+
+# Past buckets the current one is compared with
+BASELINE_BUCKETS = 7
+
+# Heavy-hitter candidates kept for the current bucket
+MAX_CANDIDATES = 2000
+
+
+def term_hashes(terms: Sequence[str]) -> np.ndarray:
+    """Stable 64-bit hashes, the same in every process (unlike the built-in hash)."""
+    return np.array([int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+                     for term in terms], dtype=np.uint64)
+
+
+def count_terms(token_lists: Iterable[Sequence[str]], max_n: int = 2) -> Counter:
+    """Occurrences of every term and, with max_n=2, every pair of adjacent tokens."""
+    counts = Counter()
+    for tokens in token_lists:
+        counts.update(tokens)
+        if max_n >= 2:
+            counts.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    return counts
+
+
+class CountMinSketch:
+    """
+    Count-min sketch: `depth` rows of `width` counters, a term's estimate is the
+    minimum of its counters. Never underestimates; row indices come from double
+    hashing of a single 64-bit hash.
+    """
+
+    def __init__(self, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH, table: Optional[np.ndarray] = None):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int32) if table is None else table
+
+    def _columns(self, hashes: np.ndarray) -> np.ndarray:
+        low, high = hashes & np.uint64(0xFFFFFFFF), hashes >> np.uint64(32)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((low[None, :] + rows * (high[None, :] | np.uint64(1))) % np.uint64(self.width)).astype(np.int64)
+
+    def add(self, hashes: np.ndarray, counts: np.ndarray):
+        columns = self._columns(hashes)
+        for row in range(self.depth):
+            np.add.at(self.table[row], columns[row], counts.astype(np.int32))
+
+    def estimate(self, hashes: np.ndarray) -> np.ndarray:
+        columns = self._columns(hashes)
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+
+class BurstDetector:
+    """
+    Finds terms and bigrams whose share of the current bucket jumps above their recent level.
+
+    Every bucket (e.g. a collection day) gets a count-min sketch of its term and bigram
+    counts; the sketches of the last `baseline_buckets` buckets form the baseline. Only
+    the current bucket's heaviest `max_candidates` terms are tracked by name, so memory
+    is fixed however many articles arrive. A term's burst score is the z-score of its
+    rate (count / n-grams of the same order in the bucket) against its baseline rates,
+    with the Poisson noise of the current count added to the baseline variance so rare
+    terms don't trend on a couple of mentions.
+
+    Batches of one bucket can arrive in any number of `add` calls, but each article must
+    be added once and buckets must arrive in order.
+    """
+
+    def __init__(self, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH,
+                 baseline_buckets: int = BASELINE_BUCKETS, max_candidates: int = MAX_CANDIDATES,
+                 min_count: int = 5):
+        self.width = width
+        self.depth = depth
+        self.max_candidates = max_candidates
+        self.min_count = min_count
+        self.history = deque(maxlen=baseline_buckets)
+        self.bucket = None
+        self._start_bucket(None)
+
+    def _start_bucket(self, bucket):
+        self.bucket = bucket
+        self.sketch = CountMinSketch(self.width, self.depth)
+        self.totals = np.zeros(2, dtype=np.int64)
+        self.candidates: Dict[str, int] = {}
+
+    def add(self, token_lists: Iterable[Sequence[str]], bucket: str) -> 'BurstDetector':
+        """
+        Count a batch of preprocessed articles into `bucket`.
+
+        Starting a new bucket moves the current one into the baseline.
+        """
+        if bucket != self.bucket:
+            if self.bucket is not None:
+                if bucket < self.bucket:
+                    raise ValueError(f"Bucket {bucket} arrived after {self.bucket}")
+                self.history.append((self.bucket, self.sketch.table, self.totals))
+            self._start_bucket(bucket)
+
+        counts = count_terms(token_lists)
+        if not counts:
+            return self
+        terms = list(counts)
+        orders = np.array([term.count(' ') for term in terms])
+        values = np.fromiter(counts.values(), dtype=np.int64, count=len(terms))
+        self.totals += np.bincount(orders, weights=values, minlength=2).astype(np.int64)[:2]
+        self.sketch.add(term_hashes(terms), values)
+
+        self.candidates.update((term, order) for term, order in zip(terms, orders.tolist()))
+        if len(self.candidates) > self.max_candidates:
+            names = list(self.candidates)
+            estimates = self.sketch.estimate(term_hashes(names))
+            keep = np.argpartition(-estimates, self.max_candidates - 1)[:self.max_candidates]
+            self.candidates = {names[i]: self.candidates[names[i]] for i in keep}
+        return self
+
+    def top(self, k: int = 20, order: Optional[int] = None) -> List[Dict]:
+        """
+        The `k` candidates of the current bucket with the highest burst score.
+
+        Args:
+        order (int): 1 for terms only, 2 for bigrams only, None for both
+
+        Returns:
+        list: dicts with term, count, rate, baseline (mean rate) and z, best first
+        """
+        names = [term for term, n in self.candidates.items() if order is None or n + 1 == order]
+        if not names or not self.history:
+            return []
+        hashes = term_hashes(names)
+        orders = np.array([self.candidates[term] for term in names])
+        counts = self.sketch.estimate(hashes)
+        rates = counts / np.maximum(self.totals[orders], 1)
+
+        past = np.stack([CountMinSketch(self.width, self.depth, table).estimate(hashes) / np.maximum(totals[orders], 1)
+                         for _, table, totals in self.history])
+        baseline = past.mean(axis=0)
+        # A term never seen before counts as seen once in the whole baseline
+        baseline_total = sum(totals for _, _, totals in self.history)[orders]
+        floor = 1.0 / np.maximum(baseline_total, 1)
+        noise = np.maximum(baseline, floor) / np.maximum(self.totals[orders], 1)
+        z = (rates - baseline) / np.sqrt(past.var(axis=0) + noise)
+
+        eligible = np.flatnonzero((counts >= self.min_count) & (z > 0))
+        best = eligible[np.argsort(-z[eligible])][:k]
+        return [dict(term=names[i], count=int(counts[i]), rate=float(rates[i]), baseline=float(baseline[i]),
+                     z=float(z[i])) for i in best]
+
+    def save(self, path: str = DEFAULT_TRENDS_PATH):
+        tables = [table for _, table, _ in self.history] + [self.sketch.table]
+        totals = [totals for _, _, totals in self.history] + [self.totals]
+        meta = dict(width=self.width, depth=self.depth, baseline_buckets=self.history.maxlen,
+                    max_candidates=self.max_candidates, min_count=self.min_count,
+                    buckets=[bucket for bucket, _, _ in self.history] + [self.bucket],
+                    candidates=self.candidates)
+        # Sketch tables are mostly zeros, compression shrinks them several times
+        np.savez_compressed(path, tables=np.stack(tables), totals=np.stack(totals), meta=np.array(json.dumps(meta)))
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_TRENDS_PATH) -> 'BurstDetector':
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            detector = cls(meta['width'], meta['depth'], meta['baseline_buckets'], meta['max_candidates'],
+                           meta['min_count'])
+            *past, current = zip(meta['buckets'], data['tables'], data['totals'])
+            detector.history.extend(past)
+            detector.bucket, detector.sketch.table, detector.totals = current[0], current[1], current[2]
+            detector.candidates = meta['candidates']
+        return detector
+
+
+def update_trends(token_lists: Iterable[Sequence[str]], bucket: str, path: str = DEFAULT_TRENDS_PATH) -> BurstDetector:
+    """Add one collection cycle of preprocessed articles to the persisted detector."""
+    detector = BurstDetector.load(path) if os.path.exists(path) else BurstDetector()
+    detector.add(token_lists, bucket)
+    detector.save(path)
+    return detector
+
+
+def main():
+    from article_store import stream_articles
+    from deduplication import deduplicate_articles
+    from preprocessing import preprocess_articles
+    from datetime import date, timedelta
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--start', required=True, help="First day, YYYY-MM-DD")
+    parser.add_argument('--end', help="Last day, defaults to --start")
+    parser.add_argument('--tokenizer', default='regex', help="Preprocessing tokenizer")
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    detector = BurstDetector()
+    day, last = date.fromisoformat(args.start), date.fromisoformat(args.end or args.start)
+    while day <= last:
+        articles = deduplicate_articles(stream_articles(day.isoformat()))
+        if articles:
+            detector.add(preprocess_articles(articles, tokenizer=args.tokenizer), day.isoformat())
+            print(f"\n{day}: {len(articles)} articles")
+            for order, label in ((1, 'terms'), (2, 'bigrams')):
+                trends = detector.top(args.top, order=order)
+                print(f"  emerging {label}: " + (', '.join(f"{t['term']} ({t['count']}, z={t['z']:.1f})"
+                                                         for t in trends) or 'no baseline yet'))
+        day += timedelta(days=1)
+
+
+if __name__ == "__main__":
+    main()
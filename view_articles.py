@@ -1,21 +1,4 @@
-import json
-import csv
-import os
-from datetime import datetime
-
-def load_articles(file_path):
-    """
-    Load articles from either JSON or CSV file.
-    """
-    _, ext = os.path.splitext(file_path)
-    if ext.lower() == '.json':
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    elif ext.lower() == '.csv':
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return list(csv.DictReader(f))
-    else:
-        raise ValueError(f"Unsupported file format: {ext}")
+from article_store import ArticleStore
 
 def display_article_summary(article, index):
     """
@@ -24,24 +7,29 @@ def display_article_summary(article, index):
     print(f"\nArticle {index + 1}:")
     print(f"Title: {article.get('title', 'N/A')}")
     print(f"Source: {article.get('source_name', 'N/A')}")
-    print(f"Published: {article.get('publishedAt', 'N/A')}")
-    print(f"Description: {article.get('description', 'N/A')[:100]}...")  # First 100 characters of description
-
-def main():
-    # Get the most recent file in the data directory
-    data_dir = 'data'
-    files = [f for f in os.listdir(data_dir) if f.startswith('articles_') and (f.endswith('.json') or f.endswith('.csv'))]
-    if not files:
-        print("No article files found.")
-        return
+    print(f"Published: {article.get('pubDate') or article.get('publishedAt', 'N/A')}")
+    print(f"Description: {(article.get('description') or 'N/A')[:100]}...")  # First 100 characters of description
 
-    latest_file = max(files, key=lambda f: os.path.getmtime(os.path.join(data_dir, f)))
-    file_path = os.path.join(data_dir, latest_file)
-
-    print(f"Viewing articles from: {file_path}")
+def load_latest_articles():
+    """
+    Load the most recent day from the article store.
+    """
+    with ArticleStore() as store:
+        dates = store.available_dates()
+        if not dates:
+            return None, []
+        latest_date = dates[-1]
+        columns = ['article_id', 'title', 'source_name', 'pubDate', 'description']
+        return latest_date, store.read_articles(latest_date, columns=columns)
 
+def main():
     try:
-        articles = load_articles(file_path)
+        latest_date, articles = load_latest_articles()
+        if not articles:
+            print("No articles found in the article store.")
+            return
+
+        print(f"Viewing articles from: {latest_date}")
         print(f"\nTotal articles: {len(articles)}")
 
         # Display summaries of the first 5 articles
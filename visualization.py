@@ -1,44 +1,40 @@
+import os
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
-import networkx as nx
-from sklearn.manifold import TSNE
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from wordcloud import WordCloud
+from article_store import ArticleStore
+from projection import document_coordinates
+from word_clouds import WordCloudRenderer
+from topic_similarity import topic_network
+from topic_registry import TopicRegistry
+from trending import BurstDetector
 
-def visualize_topics_sklearn(lda_model, X, feature_names, articles):
+def visualize_topics_sklearn(analysis):
     st.header("Topic Visualization")
 
     # Topic-Term Heatmap
-    topic_term_heatmap(lda_model, feature_names)
+    topic_term_heatmap(analysis)
 
     # Intertopic Distance Map
-    intertopic_distance_map(lda_model)
+    intertopic_distance_map(analysis)
 
     # Word Clouds
-    topic_word_clouds(lda_model, feature_names)
+    topic_word_clouds(analysis)
 
     # Topic Trends Over Time
-    topic_trends_over_time(lda_model, X, articles)
+    topic_trends_over_time(analysis)
 
-def topic_term_heatmap(lda_model, feature_names):
+def topic_term_heatmap(analysis):
     st.subheader("Topic-Term Heatmap")
+    summary = analysis.summary
     
-    # Get top 10 words for each topic
+    # Top 10 words of each topic, already ranked in the summary
     n_top_words = 10
-    topic_words = []
-    for topic_idx, topic in enumerate(lda_model.components_):
-        top_words_idx = topic.argsort()[:-n_top_words - 1:-1]
-        top_words = [feature_names[i] for i in top_words_idx]
-        topic_words.append(top_words)
-    
-    # Create heatmap data
     heatmap_data = []
-    for topic_idx, words in enumerate(topic_words):
-        for word in words:
-            weight = lda_model.components_[topic_idx, list(feature_names).index(word)]
+    for topic_idx in range(summary.n_components):
+        for word, weight in zip(summary.top_words[topic_idx, :n_top_words], summary.top_weights[topic_idx, :n_top_words]):
             heatmap_data.append([f"Topic {topic_idx+1}", word, weight])
 
     # Create heatmap
@@ -58,89 +54,91 @@ def topic_term_heatmap(lda_model, feature_names):
 
     st.plotly_chart(fig, use_container_width=True)
 
-def intertopic_distance_map(lda_model):
+def intertopic_distance_map(analysis):
     st.subheader("Intertopic Distance Map")
     
-    # Apply t-SNE to topic-term matrix
-    n_topics = lda_model.n_components
-    perplexity = min(30, n_topics - 1)  # Adjust perplexity based on number of topics
-    tsne = TSNE(n_components=2, random_state=42, perplexity=perplexity)
-    topic_coord = tsne.fit_transform(lda_model.components_)
+    # Classical MDS on the Jensen-Shannon distances between topics
+    n_topics = analysis.n_components
+    topic_coord = analysis.summary.map_coordinates
     
-    # Create scatter plot
+    # Create scatter plot, marker area proportional to each topic's weight
+    sizes = 10 + 40 * np.sqrt(analysis.summary.topic_weights / analysis.summary.topic_weights.max())
     fig = go.Figure(data=go.Scatter(
         x=topic_coord[:, 0],
         y=topic_coord[:, 1],
         mode='markers+text',
-        marker=dict(size=10, color=list(range(n_topics)), colorscale='Viridis', showscale=True),
+        marker=dict(size=sizes, color=list(range(n_topics)), colorscale='Viridis', showscale=True),
         text=[f"Topic {i+1}" for i in range(n_topics)],
         textposition="top center"
     ))
 
     fig.update_layout(
         title='Intertopic Distance Map',
-        xaxis_title='t-SNE dimension 1',
-        yaxis_title='t-SNE dimension 2',
+        xaxis_title='MDS dimension 1',
+        yaxis_title='MDS dimension 2',
         height=500
     )
 
     st.plotly_chart(fig, use_container_width=True)
 
-def topic_word_clouds(lda_model, feature_names):
+def topic_word_clouds(analysis):
     st.subheader("Topic Word Clouds")
     
-    # Create word cloud for each topic
-    for topic_idx, topic in enumerate(lda_model.components_):
-        word_freq = dict(zip(feature_names, topic))
-        wordcloud = WordCloud(width=800, height=400, background_color='white').generate_from_frequencies(word_freq)
-        
-        fig, ax = plt.subplots(figsize=(10, 5))
-        ax.imshow(wordcloud, interpolation='bilinear')
-        ax.axis('off')
-        ax.set_title(f'Topic {topic_idx + 1}')
-        
-        st.pyplot(fig)
-
-def topic_trends_over_time(lda_model, X, articles):
+    # Expanders rerun the script when toggled, so only open topics get rendered;
+    # the ones not cached yet are rendered together in a process pool
+    renderer = WordCloudRenderer(analysis.summary, analysis.key)
+    expanders = [st.expander(f"Topic {topic_idx + 1}", expanded=topic_idx == 0, key=f"word_cloud_{topic_idx}",
+                             on_change='rerun')
+                 for topic_idx in range(analysis.n_components)]
+    open_topics = [topic_idx for topic_idx, expander in enumerate(expanders) if expander.open]
+    if not open_topics:
+        return
+    with st.spinner("Rendering word clouds..."):
+        images = renderer.render(open_topics)
+    for topic_idx in open_topics:
+        expanders[topic_idx].image(images[topic_idx], caption=f'Topic {topic_idx + 1}')
+
+# Ranges up to this many days are charted by hour, longer ones by day
+HOURLY_TREND_MAX_DAYS = 3
+
+def topic_trends_over_time(analysis):
     st.subheader("Topic Trends Over Time")
     
-    # Get topic distribution for each document
-    doc_topic_dist = lda_model.transform(X)
-    
-    # Create DataFrame with topic distributions and dates
-    df = pd.DataFrame(doc_topic_dist, columns=[f"Topic {i+1}" for i in range(lda_model.n_components)])
-    df['date'] = [article.get('pubDate', article.get('publishedAt')) for article in articles]
-    df['date'] = pd.to_datetime(df['date'])
-    
-    # Group by date and calculate mean topic distribution
-    daily_topic_dist = df.groupby('date').mean()
+    # Mean topic distribution per time bucket, read from the pre-aggregated rollup
+    rollup = analysis.rollup
+    freq = 'hour' if len(rollup.days) <= HOURLY_TREND_MAX_DAYS else 'day'
+    topic_dist = rollup.prevalence(freq)
     
     # Create line plot
     fig = go.Figure()
-    for topic in daily_topic_dist.columns:
-        fig.add_trace(go.Scatter(x=daily_topic_dist.index, y=daily_topic_dist[topic], mode='lines', name=topic))
+    for topic in topic_dist.columns:
+        fig.add_trace(go.Scatter(x=topic_dist.index, y=topic_dist[topic], mode='lines', name=topic))
 
     fig.update_layout(
-        title='Topic Trends Over Time',
+        title=f'Topic Trends Over Time (per {freq})',
         xaxis_title='Date',
         yaxis_title='Topic Prevalence',
         height=500
     )
 
     st.plotly_chart(fig, use_container_width=True)
+    if rollup.merged_keys:
+        # Only the incremental model accumulates its rollup batch by batch
+        st.caption("Each bucket was aggregated with the incremental model as it was when its articles were "
+                   "folded in. Later updates shift the topics, so older buckets of a topic can describe a "
+                   "somewhat different topic than it does today.")
 
-def create_topic_document_map(lda_model, X, articles):
-    # Perform t-SNE for dimensionality reduction
-    tsne = TSNE(n_components=2, random_state=42)
-    doc_topic_dist = lda_model.transform(X)
-    tsne_output = tsne.fit_transform(doc_topic_dist)
+def create_topic_document_map(analysis):
+    # t-SNE coordinates, cached per model; only articles new to the model get placed
+    doc_topic_dist = analysis.doc_topic
+    tsne_output = document_coordinates(analysis)
     
     # Create a DataFrame for plotting
     df = pd.DataFrame({
         'x': tsne_output[:, 0],
         'y': tsne_output[:, 1],
         'topic': doc_topic_dist.argmax(axis=1),
-        'title': [a['title'] for a in articles]
+        'title': analysis.titles
     })
     
     # Create the scatter plot
@@ -148,67 +146,40 @@ def create_topic_document_map(lda_model, X, articles):
                      title='Topic-Document Map')
     st.plotly_chart(fig)
 
-def create_topic_trends(lda_model, articles):
-    # Check if 'date' is available in the articles
-    if 'date' not in articles[0]:
+def create_topic_trends(analysis, n_sources=10):
+    rollup = analysis.rollup
+    if not len(rollup.days):
         st.warning("Date information is not available. Unable to create topic trends visualization.")
         return
 
-    dates = [a['date'] for a in articles]
-    doc_topic_dist = lda_model.transform([a['content'] for a in articles])
-    
-    df = pd.DataFrame({
-        'date': dates,
-        **{f'Topic {i}': doc_topic_dist[:, i] for i in range(lda_model.n_components)}
-    })
-    df = df.groupby('date').mean().reset_index()
-    
-    fig = px.line(df, x='date', y=[f'Topic {i}' for i in range(lda_model.n_components)],
-                  title='Topic Trends Over Time')
+    # Expected number of articles per topic and day
+    volume = rollup.volume('day')
+    fig = px.area(volume, x=volume.index, y=volume.columns, title='Daily Article Volume by Topic',
+                  labels={'x': 'Date', 'value': 'Articles', 'variable': 'Topic'})
     st.plotly_chart(fig)
 
-def create_topic_similarity_network(lda_model, feature_names):
-    # Calculate topic similarity
-    topic_term_dists = lda_model.components_ / lda_model.components_.sum(axis=1)[:, np.newaxis]
-    topic_similarity = np.dot(topic_term_dists, topic_term_dists.T)
-    
-    # Create network graph
-    G = nx.Graph()
-    for i in range(lda_model.n_components):
-        G.add_node(i)
-        for j in range(i+1, lda_model.n_components):
-            if topic_similarity[i, j] > 0.2:  # Adjust threshold as needed
-                G.add_edge(i, j, weight=topic_similarity[i, j])
-    
-    # Get node positions
-    pos = nx.spring_layout(G)
+    # Articles per day of the most active sources
+    sources = rollup.source_volume()
+    sources = sources[sources.sum().nlargest(n_sources).index]
+    fig = px.bar(sources, x=sources.index, y=sources.columns, title=f'Daily Articles of the Top {n_sources} Sources',
+                 labels={'x': 'Date', 'value': 'Articles', 'variable': 'Source'})
+    st.plotly_chart(fig)
+
+def create_topic_similarity_network(analysis):
+    # Jensen-Shannon similarities, top-k edges and a fixed layout, cached per model
+    network = topic_network(analysis)
+    pos = network.positions
     
-    # Create edges trace
-    edge_x, edge_y = [], []
-    for edge in G.edges():
-        x0, y0 = pos[edge[0]]
-        x1, y1 = pos[edge[1]]
-        edge_x.extend([x0, x1, None])
-        edge_y.extend([y0, y1, None])
+    # Create edges trace, one None-separated segment per edge
+    edges = network.edges
+    edge_x = np.column_stack([pos[edges.row, 0], pos[edges.col, 0], np.full(edges.nnz, None)]).ravel()
+    edge_y = np.column_stack([pos[edges.row, 1], pos[edges.col, 1], np.full(edges.nnz, None)]).ravel()
     edge_trace = go.Scatter(x=edge_x, y=edge_y, line=dict(width=0.5, color='#888'), hoverinfo='none', mode='lines')
     
-    # Create nodes trace
-    node_x, node_y = [], []
-    for node in G.nodes():
-        x, y = pos[node]
-        node_x.append(x)
-        node_y.append(y)
-    node_trace = go.Scatter(x=node_x, y=node_y, mode='markers', hoverinfo='text',
-                            marker=dict(showscale=True, colorscale='YlGnBu', size=10))
-    
-    # Add node info
-    node_adjacencies = []
-    node_text = []
-    for node, adjacencies in enumerate(G.adjacency()):
-        node_adjacencies.append(len(adjacencies[1]))
-        node_text.append(f'Topic {node}')
-    node_trace.marker.color = node_adjacencies
-    node_trace.text = node_text
+    # Create nodes trace, colored by number of neighbours
+    node_trace = go.Scatter(x=pos[:, 0], y=pos[:, 1], mode='markers', hoverinfo='text',
+                            text=[f'Topic {node + 1}' for node in range(len(pos))],
+                            marker=dict(showscale=True, colorscale='YlGnBu', size=10, color=network.degrees))
     
     # Create the figure
     fig = go.Figure(data=[edge_trace, node_trace],
@@ -216,19 +187,75 @@ def create_topic_similarity_network(lda_model, feature_names):
                                      hovermode='closest', margin=dict(b=20,l=5,r=5,t=40)))
     st.plotly_chart(fig)
 
-def display_top_articles(lda_model, articles):
-    doc_topic_dist = lda_model.transform([a['content'] for a in articles])
-    for topic in range(lda_model.n_components):
+def display_top_articles(analysis):
+    articles = analysis.articles
+    doc_topic_dist = analysis.doc_topic
+    for topic in range(analysis.n_components):
         st.subheader(f"Top Articles for Topic {topic}")
         top_doc_indices = doc_topic_dist[:, topic].argsort()[-5:][::-1]
         for idx in top_doc_indices:
             st.write(f"- {articles[idx]['title']} (Topic proportion: {doc_topic_dist[idx, topic]:.2f})")
 
-def create_topic_proportion_chart(lda_model, articles):
-    doc_topic_dist = lda_model.transform([a['content'] for a in articles])
-    df = pd.DataFrame(doc_topic_dist, columns=[f'Topic {i}' for i in range(lda_model.n_components)])
-    df['Article'] = [a['title'] for a in articles]
+def create_topic_proportion_chart(analysis):
+    df = pd.DataFrame(analysis.doc_topic, columns=[f'Topic {i}' for i in range(analysis.n_components)])
+    df['Article'] = analysis.titles
     df = df.set_index('Article')
     
     fig = px.bar(df, title='Topic Proportions per Article', barmode='stack')
-    st.plotly_chart(fig)
\ No newline at end of file
+    st.plotly_chart(fig)
+
+def display_related_articles(analysis, related_index, k=5):
+    st.header("Related Articles")
+    titles = analysis.titles
+    choice = st.selectbox("Find stories related to", range(len(titles)), format_func=lambda i: titles[i])
+    article_id = analysis.articles[choice]['article_id']
+    if article_id not in related_index:
+        st.info("This article has no embedding yet.")
+        return
+    
+    # Neighbours can come from any day embedded so far, not only the selected range
+    neighbours = related_index.related(article_id, k)
+    with ArticleStore() as store:
+        found = store.read_by_ids([other for other, _ in neighbours], columns=('title', 'link', 'day'))
+    for other, score in neighbours:
+        article = found.get(other, {})
+        title = article.get('title') or other
+        if article.get('link'):
+            title = f"[{title}]({article['link']})"
+        st.markdown(f"- {title} ({article.get('day', 'unknown day')}, similarity {score:.2f})")
+
+def display_topic_lineage(analysis):
+    if analysis.topic_ids is None:
+        return
+    st.header("Topic Lineage")
+    st.caption("Stable IDs of the selected day's topics across days, matched on their top terms.")
+    with TopicRegistry() as registry:
+        entries = {entry['topic_id']: entry for entry in registry.describe(analysis.topic_ids)}
+    rows = []
+    for topic, topic_id in enumerate(analysis.topic_ids):
+        entry = entries.get(topic_id, {})
+        rows.append({
+            'Topic': f"Topic {topic + 1}",
+            'ID': topic_id,
+            'First seen': entry.get('first_day'),
+            'Days seen': entry.get('days_seen'),
+            'Split from': entry.get('parent_id'),
+            'Top terms': ', '.join(entry.get('terms', [])[:8]),
+        })
+    st.dataframe(pd.DataFrame(rows), hide_index=True)
+
+def display_emerging_terms(path, k=15):
+    if not os.path.exists(path):
+        return
+    detector = BurstDetector.load(path)
+    st.header(f"Emerging Terms ({detector.bucket})")
+    st.caption("Terms and bigrams of the latest collection cycle scored against the previous cycles.")
+    columns = st.columns(2)
+    for column, (order, label) in zip(columns, ((1, 'Terms'), (2, 'Bigrams'))):
+        trends = detector.top(k, order=order)
+        with column:
+            st.subheader(label)
+            if trends:
+                st.dataframe(pd.DataFrame(trends)[['term', 'count', 'z']].round({'z': 1}), hide_index=True)
+            else:
+                st.write("No baseline yet.")
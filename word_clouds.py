@@ -0,0 +1,109 @@
+import io
+import os
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+from wordcloud import WordCloud
+
+from artifact_store import ArtifactStore
+
+logger = logging.getLogger(__name__)
+
+# Terms drawn per cloud; the long tail is too small to read at 800x400 anyway
+WORD_CLOUD_MAX_WORDS = 100
+WORD_CLOUD_SIZE = (800, 400)
+
+WORD_CLOUD_SUFFIX = '.wordcloud-{topic}.png'
+
+
+def render_word_cloud(words: Sequence[str], weights: Sequence[float], size=WORD_CLOUD_SIZE) -> bytes:
+    """PNG bytes of a word cloud of `words`, sized by `weights`."""
+    width, height = size
+    wordcloud = WordCloud(width=width, height=height, background_color='white', max_words=len(words),
+                          random_state=42)
+    image = wordcloud.generate_from_frequencies(dict(zip(words, map(float, weights)))).to_image()
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def _render_topic(args):
+    topic, words, weights, size = args
+    return topic, render_word_cloud(words, weights, size)
+
+
+class WordCloudRenderer:
+    """
+    Word clouds of the topics of one model, rendered on demand and cached as PNG files.
+
+    Each topic is drawn from its `max_words` top terms of the `TopicSummary` and stored
+    in the artifact store as `<key><WORD_CLOUD_SUFFIX>`, so it is rendered once per
+    model and topic. Topics requested together are rendered concurrently in a process
+    pool; WordCloud is pure Python and holds the GIL, so threads would not help.
+    """
+
+    def __init__(self, summary, key: Optional[str] = None, store: Optional[ArtifactStore] = None,
+                 max_words: int = WORD_CLOUD_MAX_WORDS, size=WORD_CLOUD_SIZE, n_jobs: Optional[int] = -1):
+        self.summary = summary
+        self.max_words = min(max_words, summary.top_words.shape[1])
+        self.size = tuple(size)
+        self.key = key or self._summary_key()
+        self.store = store or ArtifactStore()
+        self.n_jobs = (os.cpu_count() or 1) if n_jobs is None or n_jobs < 0 else n_jobs
+
+    def path(self, topic: int) -> str:
+        return self.store.path(self.key, WORD_CLOUD_SUFFIX.format(topic=topic))
+
+    def cached(self, topic: int) -> Optional[bytes]:
+        """The stored PNG of `topic`, or None if it was not rendered yet."""
+        path = self.path(topic)
+        try:
+            with open(path, 'rb') as f:
+                png = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return png
+
+    def get(self, topic: int) -> bytes:
+        return self.render([topic])[topic]
+
+    def render(self, topics: Optional[Iterable[int]] = None) -> Dict[int, bytes]:
+        """
+        PNG bytes of `topics` (every topic by default), rendering only the ones not cached.
+
+        Returns:
+        dict: topic -> PNG bytes
+        """
+        topics = range(self.summary.n_components) if topics is None else topics
+        images = {topic: self.cached(topic) for topic in dict.fromkeys(topics)}
+        missing = [topic for topic, png in images.items() if png is None]
+        if not missing:
+            return images
+
+        jobs = [(topic, tuple(self.summary.top_words[topic, :self.max_words]),
+                 self.summary.top_weights[topic, :self.max_words], self.size) for topic in missing]
+        n_workers = min(self.n_jobs, len(jobs))
+        if n_workers > 1:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                rendered = list(executor.map(_render_topic, jobs))
+        else:
+            rendered = [_render_topic(job) for job in jobs]
+
+        for topic, png in rendered:
+            self.store.write(self.key, lambda f, png=png: f.write(png), suffix=WORD_CLOUD_SUFFIX.format(topic=topic),
+                             evict=False)
+            images[topic] = png
+        # One eviction scan for the whole batch
+        self.store.evict()
+        logger.info(f"Rendered {len(rendered)} word clouds with {n_workers} worker(s)")
+        return images
+
+    def _summary_key(self):
+        # Analyses without a model key are identified by the terms and weights drawn
+        digest = hashlib.sha1(self.summary.top_words[:, :self.max_words].astype(str).tobytes())
+        digest.update(np.ascontiguousarray(self.summary.top_weights[:, :self.max_words]).tobytes())
+        return f"summary-{digest.hexdigest()}"